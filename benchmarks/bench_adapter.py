@@ -0,0 +1,455 @@
+"""Benchmark the adapter operations on synthetic RBAC policies.
+
+Seeds a table per model and size, then measures load_policy, save_policy,
+add_policy and remove_filtered_policy against either the in-process fake
+(--backend fake, with --latency-ms simulated per request) or dynamodb-local
+(--backend local, see docker-compose.yml), and writes the results as JSON.
+
+    python -m benchmarks.bench_adapter --sizes 1000,100000 --output base.json
+"""
+
+import argparse
+import json
+import math
+import platform
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+import casbin
+from casbin import Model
+
+from python_dycasbin.adapter import Adapter
+from python_dycasbin.bucketed import BucketedAdapter
+from python_dycasbin.fake_dynamodb import FakeDynamoDB
+
+MODELS = {
+    "rbac": """
+[request_definition]
+r = sub, obj, act
+
+[policy_definition]
+p = sub, obj, act
+
+[role_definition]
+g = _, _
+
+[policy_effect]
+e = some(where (p.eft == allow))
+
+[matchers]
+m = g(r.sub, p.sub) && r.obj == p.obj && r.act == p.act
+""",
+    "rbac_domains": """
+[request_definition]
+r = sub, dom, obj, act
+
+[policy_definition]
+p = sub, dom, obj, act
+
+[role_definition]
+g = _, _, _
+
+[policy_effect]
+e = some(where (p.eft == allow))
+
+[matchers]
+m = g(r.sub, p.sub, r.dom) && r.dom == p.dom && r.obj == p.obj && r.act == p.act
+""",
+}
+
+# operations whose requests accept ReturnConsumedCapacity
+CAPACITY_OPERATIONS = {
+    "scan",
+    "query",
+    "get_item",
+    "put_item",
+    "delete_item",
+    "batch_write_item",
+    "batch_get_item",
+    "transact_write_items",
+}
+
+
+class InstrumentedClient:
+    """Proxy around a dynamodb client that counts requests and consumed capacity."""
+
+    def __init__(self, client: Any) -> None:
+        self._client = client
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> dict:
+        """Return the counters collected so far and start new ones."""
+        with self._lock:
+            counters = getattr(self, "_counters", None)
+            self._counters = {
+                "requests": {},
+                "consumed_capacity": {"read": 0.0, "write": 0.0, "total": 0.0},
+            }
+
+        return counters
+
+    def _record(self, operation: str, response: dict) -> None:
+        consumed = response.get("ConsumedCapacity") or []
+
+        if isinstance(consumed, dict):
+            consumed = [consumed]
+
+        with self._lock:
+            requests = self._counters["requests"]
+            requests[operation] = requests.get(operation, 0) + 1
+            capacity = self._counters["consumed_capacity"]
+
+            for entry in consumed:
+                capacity["read"] += entry.get("ReadCapacityUnits", 0)
+                capacity["write"] += entry.get("WriteCapacityUnits", 0)
+                capacity["total"] += entry.get("CapacityUnits", 0)
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._client, name)
+
+        if name not in CAPACITY_OPERATIONS:
+            return attribute
+
+        def call(**kwargs: Any) -> dict:
+            kwargs.setdefault("ReturnConsumedCapacity", "TOTAL")
+            response = attribute(**kwargs)
+            self._record(name, response)
+            return response
+
+        return call
+
+
+def generate_rules(model_name: str, size: int) -> dict[str, list[list[str]]]:
+    """Half p rules and half g rules, about 100 users per role and 1000 rules per domain."""
+    roles = max(1, size // 100)
+    domains = max(1, size // 1000)
+    p_count = size // 2
+    g_count = size - p_count
+    acts = ("read", "write")
+
+    if model_name == "rbac":
+        return {
+            "p": [
+                ["role{}".format(i % roles), "data{}".format(i), acts[i % 2]]
+                for i in range(p_count)
+            ],
+            "g": [
+                ["user{}".format(i), "role{}".format(i % roles)] for i in range(g_count)
+            ],
+        }
+
+    return {
+        "p": [
+            [
+                "role{}".format(i % roles),
+                "domain{}".format(i % domains),
+                "data{}".format(i),
+                acts[i % 2],
+            ]
+            for i in range(p_count)
+        ],
+        "g": [
+            [
+                "user{}".format(i),
+                "role{}".format(i % roles),
+                "domain{}".format(i % domains),
+            ]
+            for i in range(g_count)
+        ],
+    }
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def new_model(model_name: str) -> Model:
+    model = Model()
+    model.load_model_from_text(MODELS[model_name])
+    return model
+
+
+def create_adapter(args: argparse.Namespace, table_name: str) -> tuple[Adapter, Any]:
+    adapter_class = BucketedAdapter if args.layout == "packed" else Adapter
+    adapter = adapter_class(
+        table_name,
+        table_create_table=False,
+        aws_endpoint_url=args.endpoint_url,
+        aws_region_name="us-east-1",
+        aws_access_key_id="bench",
+        aws_secret_access_key="bench",
+        scan_segments=args.scan_segments,
+        write_max_workers=args.write_max_workers,
+        save_mode=args.save_mode,
+        table_id_scheme=args.id_scheme,
+    )
+
+    if args.backend == "fake":
+        backend = FakeDynamoDB(latency=args.latency_ms / 1000)
+    else:
+        backend = adapter._get_db_handler()
+
+    adapter._client = InstrumentedClient(backend)
+    adapter._provision_table(
+        adapter._table_definition(table_name, None, "PROVISIONED", 10, 10, 10, 10)
+    )
+    return adapter, backend
+
+
+def seed(adapter: Adapter, backend: Any, rules: dict[str, list[list[str]]]) -> None:
+    for ptype, ptype_rules in rules.items():
+        if isinstance(backend, FakeDynamoDB) and isinstance(adapter, BucketedAdapter):
+            backend.seed(
+                adapter.table_name,
+                [
+                    item
+                    for bucket_id, tails in adapter._group_rules(
+                        ptype, ptype_rules
+                    ).items()
+                    for item in adapter.encode_bucket(bucket_id, tails)
+                ],
+            )
+        elif isinstance(backend, FakeDynamoDB):
+            backend.seed(
+                adapter.table_name,
+                [adapter.convert_to_item(ptype, rule) for rule in ptype_rules],
+            )
+        else:
+            adapter.add_policies(ptype, ptype, ptype_rules)
+
+
+def measure(
+    adapter: Adapter, runs: int, operation: Callable[[int], None]
+) -> tuple[list[float], dict]:
+    """Call operation(run) runs times, return the duration of each call and the counters."""
+    client = adapter._client
+    client.reset()
+    durations = []
+
+    for run in range(runs):
+        started = time.perf_counter()
+        operation(run)
+        durations.append(time.perf_counter() - started)
+
+    return durations, client.reset()
+
+
+def result(
+    model_name: str,
+    size: int,
+    operation: str,
+    durations: list[float],
+    counters: dict,
+    units: int,
+    unit: str,
+) -> dict:
+    total = sum(durations)
+    return {
+        "model": model_name,
+        "size": size,
+        "operation": operation,
+        "runs": len(durations),
+        "seconds": round(total, 6),
+        "throughput": round(units * len(durations) / total, 2) if total else None,
+        "throughput_unit": unit,
+        "p50_ms": round(percentile(durations, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(durations, 0.99) * 1000, 3),
+        "requests": counters["requests"],
+        "consumed_capacity": {
+            name: round(value, 2)
+            for name, value in counters["consumed_capacity"].items()
+        },
+    }
+
+
+def bench_dataset(args: argparse.Namespace, model_name: str, size: int) -> list[dict]:
+    table_name = "bench_{}_{}_{}".format(model_name, size, uuid.uuid4().hex[:8])
+    adapter, backend = create_adapter(args, table_name)
+    rules = generate_rules(model_name, size)
+    results = []
+
+    try:
+        seed(adapter, backend, rules)
+        loaded = {}
+
+        def load(run: int) -> None:
+            loaded["model"] = new_model(model_name)
+            adapter.load_policy(loaded["model"])
+
+        durations, counters = measure(adapter, args.repeat, load)
+        results.append(
+            result(
+                model_name, size, "load_policy", durations, counters, size, "rules/s"
+            )
+        )
+
+        durations, counters = measure(
+            adapter, args.repeat, lambda run: adapter.save_policy(loaded["model"])
+        )
+        results.append(
+            result(
+                model_name, size, "save_policy", durations, counters, size, "rules/s"
+            )
+        )
+
+        # single rule writes on subjects outside the seeded data, removed again below
+        arity = len(rules["g"][0])
+        bench_rules = [
+            ["bench_user{}".format(i), "role0", "domain0"][:arity]
+            for i in range(args.ops)
+        ]
+
+        durations, counters = measure(
+            adapter,
+            args.ops,
+            lambda run: adapter.add_policy("g", "g", bench_rules[run]),
+        )
+        results.append(
+            result(model_name, size, "add_policy", durations, counters, 1, "ops/s")
+        )
+
+        durations, counters = measure(
+            adapter,
+            args.ops,
+            lambda run: adapter.remove_filtered_policy(
+                "g", "g", 0, bench_rules[run][0]
+            ),
+        )
+        results.append(
+            result(
+                model_name,
+                size,
+                "remove_filtered_policy",
+                durations,
+                counters,
+                1,
+                "ops/s",
+            )
+        )
+    finally:
+        if not args.keep_tables:
+            adapter._client.delete_table(TableName=table_name)
+
+    return results
+
+
+def print_results(results: list[dict]) -> None:
+    print(
+        "{:<14} {:>8} {:<24} {:>14} {:>10} {:>10} {:>9} {:>10}".format(
+            "model",
+            "size",
+            "operation",
+            "throughput",
+            "p50 ms",
+            "p99 ms",
+            "requests",
+            "capacity",
+        )
+    )
+
+    for row in results:
+        print(
+            "{:<14} {:>8} {:<24} {:>14} {:>10} {:>10} {:>9} {:>10}".format(
+                row["model"],
+                row["size"],
+                row["operation"],
+                "{} {}".format(row["throughput"], row["throughput_unit"]),
+                row["p50_ms"],
+                row["p99_ms"],
+                sum(row["requests"].values()),
+                row["consumed_capacity"]["total"],
+            )
+        )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["fake", "local"], default="fake")
+    parser.add_argument("--endpoint-url", default="http://localhost:8000")
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=0.0,
+        help="simulated round trip per request of the fake backend",
+    )
+    parser.add_argument(
+        "--models", default="rbac,rbac_domains", help="comma separated models"
+    )
+    parser.add_argument(
+        "--sizes", default="1000,100000,1000000", help="comma separated rule counts"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="runs of load_policy and save_policy"
+    )
+    parser.add_argument(
+        "--ops", type=int, default=100, help="calls of the single rule operations"
+    )
+    parser.add_argument("--scan-segments", type=int, default=1)
+    parser.add_argument("--write-max-workers", type=int, default=4)
+    parser.add_argument("--save-mode", choices=["put", "sync"], default="put")
+    parser.add_argument("--id-scheme", choices=["md5", "blake2b"], default="md5")
+    parser.add_argument(
+        "--layout",
+        choices=["rows", "packed"],
+        default="rows",
+        help="one item per rule (Adapter) or packed buckets (BucketedAdapter)",
+    )
+    parser.add_argument("--keep-tables", action="store_true")
+    parser.add_argument(
+        "--output", default="benchmark-results.json", help="JSON results file"
+    )
+    args = parser.parse_args(argv)
+
+    if args.backend == "fake":
+        args.endpoint_url = None
+
+    return args
+
+
+def run(args: argparse.Namespace) -> dict:
+    results = []
+
+    for model_name in args.models.split(","):
+        for size in (int(size) for size in args.sizes.split(",")):
+            results.extend(bench_dataset(args, model_name, size))
+
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "casbin": getattr(casbin, "__version__", None),
+            "backend": args.backend,
+            "latency_ms": args.latency_ms if args.backend == "fake" else None,
+            "repeat": args.repeat,
+            "ops": args.ops,
+            "scan_segments": args.scan_segments,
+            "write_max_workers": args.write_max_workers,
+            "save_mode": args.save_mode,
+            "id_scheme": args.id_scheme,
+            "layout": args.layout,
+        },
+        "results": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    report = run(args)
+    print_results(report["results"])
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print("results written to {}".format(args.output), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
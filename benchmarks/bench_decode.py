@@ -0,0 +1,112 @@
+"""Benchmark load_policy with and without scan_fast_decode.
+
+A real botocore client is used, with a before-send handler that answers every
+scan with prerecorded raw JSON pages, so the time measured is the client's
+request handling, response parsing and the load into the model, without network.
+
+    python -m benchmarks.bench_decode --rules 400000 --page-items 4000
+"""
+
+import argparse
+import json
+import time
+
+import boto3
+import casbin
+from botocore.awsrequest import AWSResponse
+
+from benchmarks.bench_adapter import MODELS
+from python_dycasbin import adapter, fast_decode
+
+
+class _Raw:
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+def raw_pages(rules: int, page_items: int) -> list[bytes]:
+    """Scan response bodies holding rules RBAC policies, page_items per page."""
+    rows = adapter.Adapter(table_create_table=False)
+    items = [
+        rows.convert_to_item(
+            "p", ["user{}".format(i), "data{}".format(i % 1000), "read"]
+        )
+        for i in range(rules)
+    ]
+    pages = []
+
+    for start in range(0, rules, page_items):
+        page = {"Items": items[start : start + page_items]}
+        page["Count"] = page["ScannedCount"] = len(page["Items"])
+
+        if start + page_items < rules:
+            page["LastEvaluatedKey"] = {"id": items[start + page_items - 1]["id"]}
+
+        pages.append(json.dumps(page).encode("utf-8"))
+
+    return pages
+
+
+def replaying_adapter(pages: list[bytes], fast: bool) -> adapter.Adapter:
+    client = boto3.client(
+        "dynamodb",
+        region_name="us-east-1",
+        aws_access_key_id="bench",
+        aws_secret_access_key="bench",
+    )
+    index = {}
+
+    for i, body in enumerate(pages[:-1]):
+        index[json.loads(body)["LastEvaluatedKey"]["id"]["S"]] = i + 1
+
+    def send(request, **kwargs):
+        params = json.loads(request.body)
+        start = params.get("ExclusiveStartKey", {}).get("id", {}).get("S")
+        body = pages[index[start] if start else 0]
+        return AWSResponse(request.url, 200, {}, _Raw(body))
+
+    client.meta.events.register("before-send.dynamodb.Scan", send)
+
+    if fast:
+        fast_decode.install(client)
+
+    test_adapter = adapter.Adapter(table_create_table=False)
+    test_adapter._client = client
+    return test_adapter
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int, default=100_000)
+    parser.add_argument("--page-items", type=int, default=4000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    pages = raw_pages(args.rules, args.page_items)
+    results = {}
+
+    for fast in (False, True):
+        test_adapter = replaying_adapter(pages, fast)
+        best = float("inf")
+
+        for _ in range(args.repeat):
+            model = casbin.Enforcer.new_model(text=MODELS["rbac"])
+            started = time.perf_counter()
+            test_adapter.load_policy(model)
+            best = min(best, time.perf_counter() - started)
+
+        assert len(model.model["p"]["p"].policy) == args.rules
+        results["fast" if fast else "botocore"] = best
+        print(
+            "{:<9} {:8.3f}s {:>10.0f} rules/s".format(
+                "fast" if fast else "botocore", best, args.rules / best
+            )
+        )
+
+    print("speedup   {:.2f}x".format(results["botocore"] / results["fast"]))
+
+
+if __name__ == "__main__":
+    main()
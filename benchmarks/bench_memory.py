@@ -0,0 +1,90 @@
+"""Benchmark the memory held by a loaded policy with and without string interning.
+
+Synthetic rules (see bench_adapter.generate_rules) are encoded as raw JSON scan
+pages and decoded one page at a time, as a client does, so every value arrives as
+a fresh string. The pages are loaded with load_policy_lines without an interning
+table and with one shared by the whole load, and the memory still allocated once
+the load is done is reported, measured with tracemalloc.
+
+    python -m benchmarks.bench_memory --model rbac_domains --rules 1000000
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+import casbin
+from casbin import Model
+
+from benchmarks.bench_adapter import MODELS, generate_rules
+from python_dycasbin.adapter import Adapter
+
+
+def raw_pages(model_name: str, size: int, page_items: int) -> list[bytes]:
+    rows = Adapter(table_create_table=False)
+    items = [
+        rows.convert_to_item(ptype, rule)
+        for ptype, rules in generate_rules(model_name, size).items()
+        for rule in rules
+    ]
+    return [
+        json.dumps({"Items": items[start : start + page_items]}).encode("utf-8")
+        for start in range(0, len(items), page_items)
+    ]
+
+
+def load(model_name: str, pages: list[bytes], intern: bool) -> Model:
+    rows = Adapter(table_create_table=False)
+    model = casbin.Enforcer.new_model(text=MODELS[model_name])
+    strings = {} if intern else None
+
+    for body in pages:
+        rows.load_policy_lines(json.loads(body), model, strings)
+
+    return model
+
+
+def measure(model_name: str, pages: list[bytes], intern: bool) -> tuple[int, float]:
+    """Return the bytes held by the loaded model and the load time in seconds.
+
+    The time is taken from a separate untraced load, tracemalloc slows loads down.
+    """
+    started = time.perf_counter()
+    load(model_name, pages, intern)
+    elapsed = time.perf_counter() - started
+
+    gc.collect()
+    tracemalloc.start()
+    model = load(model_name, pages, intern)
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del model
+    return held, elapsed
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", choices=sorted(MODELS), default="rbac_domains")
+    parser.add_argument("--rules", type=int, default=200_000)
+    parser.add_argument("--page-items", type=int, default=4000)
+    args = parser.parse_args(argv)
+    pages = raw_pages(args.model, args.rules, args.page_items)
+    held = {}
+
+    for intern in (False, True):
+        name = "interned" if intern else "plain"
+        held[name], elapsed = measure(args.model, pages, intern)
+        print(
+            "{:<9} {:8.1f} MB held {:8.2f}s load".format(
+                name, held[name] / 1e6, elapsed
+            )
+        )
+
+    print("saved     {:.0%}".format(1 - held["interned"] / held["plain"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare two benchmark result files.
+
+    python -m benchmarks.compare base.json new.json --threshold 10
+
+Prints the change in throughput and p99 latency of every operation present in
+both files, and exits with status 1 when a throughput dropped by more than
+--threshold percent.
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict[tuple, dict]:
+    with open(path) as f:
+        report = json.load(f)
+
+    return {
+        (row["model"], row["size"], row["operation"]): row for row in report["results"]
+    }
+
+
+def change(base: float | None, new: float | None) -> float | None:
+    if not base or new is None:
+        return None
+
+    return (new - base) / base * 100
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help="fail when a throughput drops by more than this percentage",
+    )
+    args = parser.parse_args(argv)
+    base = load(args.base)
+    new = load(args.new)
+    regressions = []
+
+    print(
+        "{:<14} {:>8} {:<24} {:>12} {:>12} {:>9} {:>9}".format(
+            "model", "size", "operation", "base", "new", "tput %", "p99 %"
+        )
+    )
+
+    for key in sorted(base.keys() & new.keys()):
+        throughput = change(base[key]["throughput"], new[key]["throughput"])
+        p99 = change(base[key]["p99_ms"], new[key]["p99_ms"])
+        print(
+            "{:<14} {:>8} {:<24} {:>12} {:>12} {:>9} {:>9}".format(
+                *key,
+                base[key]["throughput"],
+                new[key]["throughput"],
+                "-" if throughput is None else "{:+.1f}".format(throughput),
+                "-" if p99 is None else "{:+.1f}".format(p99),
+            )
+        )
+
+        if (
+            args.threshold is not None
+            and throughput is not None
+            and throughput < -args.threshold
+        ):
+            regressions.append(key)
+
+    for key in regressions:
+        print("regression: {} {} {}".format(*key), file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
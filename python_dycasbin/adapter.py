@@ -1,23 +1,141 @@
+import contextlib
+import contextvars
+import functools
 import hashlib
-from typing import Any, Iterable
+import inspect
+import itertools
+import random
+import threading
+import time
+import uuid
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator
 
-import boto3
-from cachetools import TTLCache, cached
+from cachetools import TTLCache
 from casbin import Model, persist
+from casbin.persist.adapter_filtered import FilteredAdapter
 
+from python_dycasbin import fast_decode, metrics, rate_limit
 
-class Adapter(persist.Adapter):
-    """DynamoDB adopter for casbin
+if TYPE_CHECKING:
+    from botocore.config import Config
+
+VERSION_ITEM_ID = "__dycasbin_version__"  # id of the table version marker item
+# (endpoint, region, account, table) of the tables this process found ACTIVE
+_checked_tables: set[tuple] = set()
+_checked_tables_lock = threading.Lock()
+# set while a versioned write runs, so writes made inside it stamp the table once
+_versioning: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "dycasbin_versioning", default=False
+)
+
+
+def versioned(func: Callable) -> Callable:
+    """Stamp the table of the adapter passed first with a new version after a write
+
+    Only adapters with table_version_marker are stamped. The table is stamped once
+    the outermost versioned call returns, also when it raised, since part of the
+    write may have been applied.
+    """
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(adapter: Any, *args: Any, **kwargs: Any) -> Any:
+            if not adapter.table_version_marker or _versioning.get():
+                return await func(adapter, *args, **kwargs)
+
+            token = _versioning.set(True)
+
+            try:
+                return await func(adapter, *args, **kwargs)
+            finally:
+                _versioning.reset(token)
+                await adapter._bump_version()
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(adapter: Any, *args: Any, **kwargs: Any) -> Any:
+        if not adapter.table_version_marker or _versioning.get():
+            return func(adapter, *args, **kwargs)
+
+        token = _versioning.set(True)
+
+        try:
+            return func(adapter, *args, **kwargs)
+        finally:
+            _versioning.reset(token)
+            adapter._bump_version()
+
+    return wrapper
+
+
+def clear_table_cache() -> None:
+    """Forget the tables already checked, so the next adapter describes its table again"""
+    with _checked_tables_lock:
+        _checked_tables.clear()
+
+
+class UnprocessedItemsError(Exception):
+    """Raised when a batch write still has unprocessed items after the last retry."""
+
+    def __init__(self, unprocessed_items: dict) -> None:
+        super().__init__(
+            "batch write gave up with {} unprocessed items".format(
+                sum(len(requests) for requests in unprocessed_items.values())
+            )
+        )
+        self.unprocessed_items = unprocessed_items
+
+
+class UnprocessedKeysError(Exception):
+    """Raised when a batch read still has unprocessed keys after the last retry."""
+
+    def __init__(self, unprocessed_keys: dict) -> None:
+        super().__init__(
+            "batch read gave up with {} unprocessed keys".format(
+                sum(len(request["Keys"]) for request in unprocessed_keys.values())
+            )
+        )
+        self.unprocessed_keys = unprocessed_keys
+
+
+class Filter:
+    """Filter for Adapter.load_filtered_policy
+
+    Each attribute is a list of accepted values, an empty list matches anything.
+    """
+
+    def __init__(
+        self,
+        ptype: Iterable[str] = (),
+        v0: Iterable[str] = (),
+        v1: Iterable[str] = (),
+        v2: Iterable[str] = (),
+        v3: Iterable[str] = (),
+        v4: Iterable[str] = (),
+        v5: Iterable[str] = (),
+    ) -> None:
+        self.ptype = list(ptype)
+        self.v0 = list(v0)
+        self.v1 = list(v1)
+        self.v2 = list(v2)
+        self.v3 = list(v3)
+        self.v4 = list(v4)
+        self.v5 = list(v5)
+
+
+class AdapterCore:
+    """Settings and the I/O free helpers shared by the synchronous and asyncio adapters
+
+    Subclasses define the layout of the table: its default key schema
+    (_default_table_definition), the key of a write request (_request_key), the key
+    of the table version marker (_version_key) and which items hold rules
+    (_is_rule_item).
 
     Args:
-        table_name: Dynamodb table name
-        provision_policy_table: Provision a policy table if it doesnt exist
-        table_definition: (Optional) Dynamodb table defintion. Please review the code to ensure you create a table with the proper structure.
-          also see (https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/create_table.html)
-        table_provisioned_read_capacity: (Optional) Table read capacity units
-        table_provisioned_write_capacity: (Optional) Table write capacity units
-        table_billing_mode: (Optional) Table billing mode
-        kwargs: Additional kwargs are passed to dynamodb client
+        See Adapter
     """
 
     def __init__(
@@ -31,6 +149,13 @@ class Adapter(persist.Adapter):
         table_billing_mode: str = "PROVISIONED",
         table_gsi_read_capacity: int | None = 10,
         table_gsi_write_capacity: int | None = 10,
+        table_stream_view_type: str | None = None,
+        table_id_scheme: str = "md5",
+        table_legacy_id_scheme: str | None = None,
+        table_domain_fields: dict[str, int] | None = None,
+        table_rate_limit: bool = False,
+        table_create_timeout: float = 300.0,
+        table_version_marker: bool = False,
         aws_endpoint_url: str | None = None,
         aws_region_name: str | None = None,
         aws_access_key_id: str | None = None,
@@ -39,10 +164,46 @@ class Adapter(persist.Adapter):
         aws_use_ssl: bool | None = None,
         aws_verify: bool | None = None,
         aws_account_id: str | None = None,
+        aws_max_pool_connections: int = 50,
+        aws_connect_timeout: float | None = None,
+        aws_read_timeout: float | None = None,
+        aws_retry_mode: str | None = None,
+        aws_max_attempts: int | None = None,
+        aws_config: "Config | None" = None,
+        scan_segments: int = 1,
+        scan_max_workers: int | None = None,
+        scan_fast_decode: bool = False,
+        scan_intern_strings: bool = True,
+        lookup_cache_size: int = 0,
+        lookup_cache_ttl: float = 60.0,
+        write_max_workers: int = 4,
+        write_max_attempts: int = 10,
+        write_backoff_base: float = 0.05,
+        write_backoff_max: float = 5.0,
+        save_mode: str = "put",
+        metrics_hook: metrics.MetricsHook | None = None,
+        rate_limiter: rate_limit.RateLimiter | None = None,
     ) -> None:
-        """create connection and dynamodb table"""
+        """store the settings and the definition of the table to provision"""
         self.WRITE_BATCH_SIZE = 25  # dynamodb batch size
+        self.TRANSACT_WRITE_SIZE = 100  # dynamodb transaction size
+        self.BATCH_GET_SIZE = 100  # dynamodb batch get size
+        self.TABLE_POLL_INTERVAL = 1.0  # seconds between checks of a new table
+        # field position -> (GSI partitioned on that field, field used as its sort key)
+        self.FIELD_INDEXES = {0: ("v0-v1-index", 1), 1: ("v1-v0-index", 0)}
+        self.FIELD_NAMES = tuple("v{}".format(i) for i in range(6))  # v0..v5 attributes
+        self.DOMAIN_INDEX = "domain-index"  # GSI partitioned on dom, sorted by ptype
         self.table_name = table_name
+        self.table_domain_fields = table_domain_fields
+        self.table_create_timeout = table_create_timeout
+        self.table_version_marker = table_version_marker
+
+        for scheme in (table_id_scheme, table_legacy_id_scheme):
+            if scheme not in ("md5", "blake2b", None):
+                raise ValueError("unknown id scheme {}".format(scheme))
+
+        self.table_id_scheme = table_id_scheme
+        self.table_legacy_id_scheme = table_legacy_id_scheme
         self.aws_endpoint_url = aws_endpoint_url
         self.aws_region_name = aws_region_name
         self.aws_access_key_id = aws_access_key_id
@@ -52,9 +213,55 @@ class Adapter(persist.Adapter):
         self.aws_use_ssl = aws_use_ssl
         self.aws_verify = aws_verify
         self.aws_account_id = aws_account_id
+        self.aws_max_pool_connections = aws_max_pool_connections
+        self.aws_connect_timeout = aws_connect_timeout
+        self.aws_read_timeout = aws_read_timeout
+        self.aws_retry_mode = aws_retry_mode
+        self.aws_max_attempts = aws_max_attempts
+        self.aws_config = aws_config
+        self.metrics_hook = metrics_hook
+
+        if rate_limiter is None and table_rate_limit:
+            rate_limiter = rate_limit.RateLimiter(
+                self._capacity_rate(table_read_capacity, table_gsi_read_capacity),
+                self._capacity_rate(table_write_capacity, table_gsi_write_capacity),
+            )
+
+        self.rate_limiter = rate_limiter
+        self._client = None
+        self.scan_segments = max(1, scan_segments)
+        self.scan_max_workers = scan_max_workers or self.scan_segments
+        self.scan_fast_decode = scan_fast_decode
+        self.scan_intern_strings = scan_intern_strings
+        self._lookup_cache = (
+            TTLCache(lookup_cache_size, lookup_cache_ttl)
+            if lookup_cache_size > 0
+            else None
+        )
+        self._lookup_cache_lock = threading.Lock()
+        self._filtered = False
+        self.write_max_workers = max(1, write_max_workers)
+        self.write_max_attempts = max(1, write_max_attempts)
+        self.write_backoff_base = write_backoff_base
+        self.write_backoff_max = write_backoff_max
+
+        if save_mode not in ("put", "sync"):
+            raise ValueError("save_mode must be put or sync, got {}".format(save_mode))
+
+        self.save_mode = save_mode
+        self._write_stats_lock = threading.Lock()
+        self._write_stats = {
+            "batches": 0,
+            "requests": 0,
+            "retries": 0,
+            "unprocessed_items": 0,
+            "failed_batches": 0,
+        }
+
+        self._pending_table_definition = None
 
         if table_create_table:
-            self._provision_table(
+            self._pending_table_definition = self._table_definition(
                 table_name,
                 table_definition,
                 table_billing_mode,
@@ -62,25 +269,101 @@ class Adapter(persist.Adapter):
                 table_write_capacity,
                 table_gsi_read_capacity,
                 table_gsi_write_capacity,
+                table_stream_view_type,
             )
 
-    @cached(cache=TTLCache(maxsize=1, ttl=300))
-    def _get_db_handler(self):
-        """Cache the dynamodb handler"""
-        dynamodb = boto3.client(
-            "dynamodb",
-            region_name=self.aws_region_name,
-            use_ssl=self.aws_use_ssl,
-            verify=self.aws_verify,
-            endpoint_url=self.aws_endpoint_url,
-            aws_access_key_id=self.aws_access_key_id,
-            aws_secret_access_key=self.aws_secret_access_key,
-            aws_session_token=self.aws_session_token,
-            aws_account_id=self.aws_account_id,
+    def _client_config_kwargs(self) -> dict[str, Any]:
+        """botocore Config settings shared by the clients this adapter creates."""
+        config = {"max_pool_connections": self.aws_max_pool_connections}
+
+        if self.aws_connect_timeout is not None:
+            config["connect_timeout"] = self.aws_connect_timeout
+        if self.aws_read_timeout is not None:
+            config["read_timeout"] = self.aws_read_timeout
+
+        retries = {}
+
+        if self.aws_retry_mode is not None:
+            retries["mode"] = self.aws_retry_mode
+        if self.aws_max_attempts is not None:
+            retries["total_max_attempts"] = self.aws_max_attempts
+        if retries:
+            config["retries"] = retries
+
+        return config
+
+    def _client_config(self, config_class: type | None = None) -> "Config":
+        """Config of the clients this adapter creates, aws_config merged over the settings.
+
+        config_class is botocore's Config by default, AsyncAdapter passes AioConfig.
+        """
+        if config_class is None:
+            from botocore.config import Config as config_class
+
+        config = config_class(**self._client_config_kwargs())
+
+        if self.aws_config is not None:
+            config = config.merge(self.aws_config)
+
+        return config
+
+    def _client_kwargs(self) -> dict[str, Any]:
+        """Connection settings shared by the clients this adapter creates."""
+        return {
+            "region_name": self.aws_region_name,
+            "use_ssl": self.aws_use_ssl,
+            "verify": self.aws_verify,
+            "endpoint_url": self.aws_endpoint_url,
+            "aws_access_key_id": self.aws_access_key_id,
+            "aws_secret_access_key": self.aws_secret_access_key,
+            "aws_session_token": self.aws_session_token,
+            "aws_account_id": self.aws_account_id,
+        }
+
+    def _table_cache_key(self) -> tuple:
+        return (
+            self.aws_endpoint_url,
+            self.aws_region_name,
+            self.aws_account_id,
+            self.table_name,
         )
-        return dynamodb
 
-    def _provision_table(
+    def _table_active(self, description: dict, created: bool) -> bool:
+        """Whether the table can be used, with its indexes built too when just created.
+
+        An existing table is used as it is, even while a GSI added later is backfilled.
+        """
+        statuses = [description.get("TableStatus")]
+
+        if created:
+            statuses += [
+                index.get("IndexStatus")
+                for index in description.get("GlobalSecondaryIndexes") or []
+            ]
+
+        return "CREATING" not in statuses
+
+    def _check_indexes(self, description: dict, table_definition: dict) -> None:
+        """Warn about the GSIs of the table definition the table lacks."""
+        present = {
+            index["IndexName"]
+            for index in description.get("GlobalSecondaryIndexes") or []
+        }
+        missing = [
+            index["IndexName"]
+            for index in table_definition.get("GlobalSecondaryIndexes", [])
+            if index["IndexName"] not in present
+        ]
+
+        if missing:
+            warnings.warn(
+                "table {} lacks the indexes {}, queries on them fail until they are added".format(
+                    table_definition["TableName"], ", ".join(missing)
+                ),
+                stacklevel=4,
+            )
+
+    def _table_definition(
         self,
         table_name: str,
         table_definition: dict | None,
@@ -89,45 +372,13 @@ class Adapter(persist.Adapter):
         table_provisioned_write_capacity: int | None,
         gsi_read_capacity: int | None = -1,
         gsi_write_capacity: int | None = -1,
-    ) -> None:
-        """Provision the dynamodb table"""
+        stream_view_type: str | None = None,
+    ) -> dict:
+        """Build the create_table arguments of the policy table"""
         if table_definition is None:
-            # Table definition
-            # see (https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/create_table.html)
-            table_definition = {
-                "TableName": table_name,
-                "BillingMode": table_billing_mode,
-                "KeySchema": [
-                    {"AttributeName": "id", "KeyType": "HASH"},
-                ],
-                "AttributeDefinitions": [
-                    {"AttributeName": "id", "AttributeType": "S"},
-                    {"AttributeName": "v0", "AttributeType": "S"},
-                    {"AttributeName": "v1", "AttributeType": "S"},
-                ],
-                "GlobalSecondaryIndexes": [
-                    {
-                        "IndexName": "v0-v1-index",
-                        "KeySchema": [
-                            {"AttributeName": "v0", "KeyType": "HASH"},
-                            {"AttributeName": "v1", "KeyType": "RANGE"},
-                        ],
-                        "Projection": {
-                            "ProjectionType": "ALL",
-                        },
-                    },
-                    {
-                        "IndexName": "v1-v0-index",
-                        "KeySchema": [
-                            {"AttributeName": "v1", "KeyType": "HASH"},
-                            {"AttributeName": "v0", "KeyType": "RANGE"},
-                        ],
-                        "Projection": {
-                            "ProjectionType": "ALL",
-                        },
-                    },
-                ],
-            }
+            table_definition = self._default_table_definition(
+                table_name, table_billing_mode
+            )
 
         # Set table ProvisionedThroughput
         if (
@@ -138,14 +389,11 @@ class Adapter(persist.Adapter):
                 "ReadCapacityUnits": table_provisioned_read_capacity,
                 "WriteCapacityUnits": table_provisioned_write_capacity,
             }
-            table_definition["GlobalSecondaryIndexes"][0]["ProvisionedThroughput"] = {
-                "ReadCapacityUnits": gsi_read_capacity,
-                "WriteCapacityUnits": gsi_write_capacity,
-            }
-            table_definition["GlobalSecondaryIndexes"][1]["ProvisionedThroughput"] = {
-                "ReadCapacityUnits": gsi_read_capacity,
-                "WriteCapacityUnits": gsi_write_capacity,
-            }
+            for index in table_definition.get("GlobalSecondaryIndexes", []):
+                index["ProvisionedThroughput"] = {
+                    "ReadCapacityUnits": gsi_read_capacity,
+                    "WriteCapacityUnits": gsi_write_capacity,
+                }
 
         # Set gsi ProvisionedThroughput
         elif (
@@ -156,106 +404,691 @@ class Adapter(persist.Adapter):
                 "MaxReadRequestUnits": table_provisioned_read_capacity,
                 "MaxWriteRequestUnits": table_provisioned_write_capacity,
             }
-            table_definition["GlobalSecondaryIndexes"][0]["OnDemandThroughput"] = {
-                "MaxReadRequestUnits": gsi_read_capacity,
-                "MaxWriteRequestUnits": gsi_write_capacity,
-            }
-            table_definition["GlobalSecondaryIndexes"][1]["OnDemandThroughput"] = {
-                "MaxReadRequestUnits": gsi_read_capacity,
-                "MaxWriteRequestUnits": gsi_write_capacity,
+            for index in table_definition.get("GlobalSecondaryIndexes", []):
+                index["OnDemandThroughput"] = {
+                    "MaxReadRequestUnits": gsi_read_capacity,
+                    "MaxWriteRequestUnits": gsi_write_capacity,
+                }
+
+        if stream_view_type is not None:
+            table_definition["StreamSpecification"] = {
+                "StreamEnabled": True,
+                "StreamViewType": stream_view_type,
             }
 
+        return table_definition
+
+    def _count_write(self, **counts: int) -> None:
+        with self._write_stats_lock:
+            for name, count in counts.items():
+                self._write_stats[name] += count
+
+    def get_write_stats(self) -> dict[str, int]:
+        """Return a copy of the batch write counters.
+
+        batches: batches written, requests: BatchWriteItem calls, retries: calls
+        repeated for unprocessed items, unprocessed_items: items DynamoDB handed back,
+        failed_batches: batches abandoned after write_max_attempts.
+        """
+        with self._write_stats_lock:
+            return dict(self._write_stats)
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter exponential backoff delay for a retry attempt."""
+        return random.uniform(
+            0, min(self.write_backoff_max, self.write_backoff_base * 2**attempt)
+        )
+
+    def _capacity_rate(self, *capacities: int | None) -> float | None:
+        """Units per second the table and its indexes all sustain, None if unlimited."""
+        limits = [capacity for capacity in capacities if capacity and capacity > 0]
+        return min(limits) if limits else None
+
+    def _split_write_requests(self, write_requests: Iterable[dict]) -> list[list[dict]]:
+        """Split write requests into WRITE_BATCH_SIZE batches.
+
+        BatchWriteItem rejects a batch that touches the same key twice, so requests are
+        de-duplicated by id first, keeping the last request for each id.
+        """
+        requests_by_id = {}
+
+        for request in write_requests:
+            item_id = self._request_key(request)
+            requests_by_id.pop(item_id, None)
+            requests_by_id[item_id] = request
+
+        requests = list(requests_by_id.values())
+        return [
+            requests[i : i + self.WRITE_BATCH_SIZE]
+            for i in range(0, len(requests), self.WRITE_BATCH_SIZE)
+        ]
+
+    def _split_transactions(self, groups: Iterable[list[dict]]) -> list[list[dict]]:
+        """Pack groups of transact items into TRANSACT_WRITE_SIZE transactions.
+
+        A group is never split across transactions, so each group is applied atomically.
+        """
+        transactions = []
+        transaction = []
+
+        for group in groups:
+            if len(transaction) + len(group) > self.TRANSACT_WRITE_SIZE:
+                transactions.append(transaction)
+                transaction = []
+
+            transaction.extend(group)
+
+        if transaction:
+            transactions.append(transaction)
+
+        return transactions
+
+    @contextlib.contextmanager
+    def _writing(self, requests: list[dict]) -> Iterator[None]:
+        """Keep the lookup cache in step with the write requests sent by the block."""
+        try:
+            yield
+        except BaseException:
+            self._record_writes(requests, written=False)
+            raise
+
+        self._record_writes(requests, written=True)
+
+    def _record_writes(self, requests: list[dict], written: bool) -> None:
+        pass
+
+    def _interning_table(self) -> dict[str, str] | None:
+        """A fresh interning table for one load, None when interning is off."""
+        return {} if self.scan_intern_strings else None
+
+    def _add_rules(
+        self,
+        model: Model,
+        ptype: str,
+        rules: list[list[str]],
+        strings: dict[str, str] | None = None,
+    ) -> None:
+        """Append rules to the model's policy of ptype and to its policy map.
+
+        Values are stripped of surrounding whitespace in place, as casbin's
+        load_policy_line does. strings is the interning table of the current load:
+        every value is replaced by the first equal string seen during the load, so
+        the roles, domains and actions repeated across rules are held in memory once.
+        """
+        sec = ptype[0]
+
+        if sec not in model.model or ptype not in model.model[sec]:
+            return
+
+        if strings is not None:
+            intern = strings.setdefault
+
+            for rule in rules:
+                rule[:] = [intern(value, value) for value in map(str.strip, rule)]
+        else:
+            for rule in rules:
+                rule[:] = map(str.strip, rule)
+
+        assertion = model.model[sec][ptype]
+        start = len(assertion.policy)
+        assertion.policy.extend(rules)
+        assertion.policy_map.update(
+            zip(map(",".join, rules), range(start, start + len(rules)), strict=True)
+        )
+
+    def is_filtered(self) -> bool:
+        """return True if the last load into the model was filtered"""
+        return self._filtered
+
+    def _default_table_definition(self, table_name: str, billing_mode: str) -> dict:
+        """create_table arguments of the table's key schema and indexes"""
+        raise NotImplementedError
+
+    def _request_key(self, request: dict) -> Any:
+        """key of the item a write request targets"""
+        raise NotImplementedError
+
+    def _version_key(self) -> dict[str, dict]:
+        raise NotImplementedError
+
+    def _is_rule_item(self, item: dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+
+class BaseAdapter(AdapterCore):
+    """Client, table provisioning, scans and batched writes of the synchronous adapters
+
+    Args:
+        See Adapter
+    """
+
+    def __init__(self, table_name: str = "casbin_rule", **kwargs: Any) -> None:
+        """create connection and dynamodb table"""
+        super().__init__(table_name, **kwargs)
+        self._client_lock = threading.Lock()
+
+        if self._pending_table_definition is not None:
+            self._provision_table(self._pending_table_definition)
+            self._pending_table_definition = None
+
+    def _get_db_handler(self):
+        """Return the adapter's dynamodb client, creating it on first use
+
+        The client is kept for the lifetime of the adapter and shared by all threads
+        (botocore clients are thread safe), so its connection pool stays warm.
+        Refreshable credentials (assumed roles, instance or container metadata, SSO)
+        are renewed by botocore inside the same client.
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    # boto3 takes a large share of the import time, import it on use
+                    import boto3
+
+                    client = boto3.client(
+                        "dynamodb",
+                        config=self._client_config(),
+                        **self._client_kwargs(),
+                    )
+
+                    # installed first, so the latency metrics leave the pacing out
+                    if self.rate_limiter is not None:
+                        rate_limit.install(client, self.rate_limiter)
+
+                    if self.metrics_hook is not None:
+                        metrics.instrument_client(client, self.metrics_hook)
+
+                    if self.scan_fast_decode:
+                        fast_decode.install(client)
+
+                    self._client = client
+
+        return self._client
+
+    def _provision_table(self, table_definition: dict) -> None:
+        """Provision the dynamodb table
+
+        The table is described first and only created when it does not exist, then
+        waited for until it and its indexes are ACTIVE. Once a table is found ACTIVE,
+        later adapters of the process skip the check, see clear_table_cache.
+        """
+        if self._table_cache_key() in _checked_tables:
+            return
+
+        table_name = table_definition["TableName"]
         dynamodb = self._get_db_handler()
 
+        created = False
+
         try:
-            dynamodb.create_table(**table_definition)
-        except dynamodb.exceptions.ResourceInUseException:
-            pass
+            description = dynamodb.describe_table(TableName=table_name)["Table"]
+        except dynamodb.exceptions.ResourceNotFoundException:
+            created = True
+
+            try:
+                response = dynamodb.create_table(**table_definition)
+                description = response["TableDescription"]
+            except dynamodb.exceptions.ResourceInUseException:
+                # created meanwhile by another process
+                description = {"TableStatus": "CREATING"}
+
+        deadline = time.monotonic() + self.table_create_timeout
+
+        while not self._table_active(description, created):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(
+                    "table {} is not ACTIVE after {}s".format(
+                        table_name, self.table_create_timeout
+                    )
+                )
+
+            time.sleep(self.TABLE_POLL_INTERVAL)
+            description = dynamodb.describe_table(TableName=table_name)["Table"]
+
+        self._check_indexes(description, table_definition)
+
+        with _checked_tables_lock:
+            _checked_tables.add(self._table_cache_key())
 
     def _write_batch(self, batch: list) -> None:
-        """Batch multiple writes to improve performance."""
+        """Batch multiple writes to improve performance.
+
+        Unprocessed items are retried with exponential backoff and full jitter, up to
+        write_max_attempts calls in total.
+        """
         dynamodb = self._get_db_handler()
         request_items = {self.table_name: batch}
+        self._count_write(batches=1)
 
-        while request_items:
-            response = dynamodb.batch_write_item(RequestItems=request_items)
-            request_items = response.get("UnprocessedItems", {})
+        with self._writing(batch):
+            for attempt in range(self.write_max_attempts):
+                if attempt:
+                    self._count_write(retries=1)
+                    time.sleep(self._backoff(attempt))
 
-    def update_policy(
-        self, sec: str, ptype: str, old_rule: Iterable, new_rule: Iterable
-    ) -> bool:
-        self.add_policy(sec, ptype, new_rule)
-        self.remove_policy(sec, ptype, old_rule)
-        return True
+                response = dynamodb.batch_write_item(RequestItems=request_items)
+                self._count_write(requests=1)
+                request_items = response.get("UnprocessedItems", {})
 
-    def get_filtered_item(self, ptype: str, rules: Iterable) -> dict:
-        dynamodb = self._get_db_handler()
-        exp_attr = {":ptype": {"S": ptype}}
-        filter_exp_list = []
-        filter_exp_list.append("ptype = :ptype")
+                if not request_items:
+                    return
 
-        for i, rule in enumerate(rules):
-            exp_attr[":v{}".format(i)] = {"S": rule}
-            filter_exp_list.append("v{} = :v{}".format(i, i))
+                self._count_write(
+                    unprocessed_items=sum(len(r) for r in request_items.values())
+                )
 
-        filter_exp = " and ".join(filter_exp_list)
+            self._count_write(failed_batches=1)
+            raise UnprocessedItemsError(request_items)
 
-        response = dynamodb.scan(
-            ExpressionAttributeValues=exp_attr,
-            FilterExpression=filter_exp,
-            TableName=self.table_name,
+    def _write_batches(self, write_requests: Iterable[dict]) -> None:
+        """Split write requests into WRITE_BATCH_SIZE batches and write them concurrently."""
+        self._map_concurrently(
+            self._write_batch,
+            self._split_write_requests(write_requests),
+            self.write_max_workers,
         )
 
-        data = response.get("Items", {})
+    def _paginate(self, dynamodb, operation: str, **kwargs) -> Iterator[dict]:
+        """Yield every page of a scan or query, following LastEvaluatedKey."""
+        while True:
+            response = getattr(dynamodb, operation)(**kwargs)
+            yield response
 
-        while "LastEvaluatedKey" in response:
-            response = dynamodb.scan(ExclusiveStartKey=response["LastEvaluatedKey"])
-            data.extend(response["Items"])
+            if "LastEvaluatedKey" not in response:
+                return
 
-        return data
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
 
-    def load_policy_lines(self, response: dict, model: Model) -> None:
-        for i in response["Items"]:
-            persist.load_policy_line(self.get_line_from_item(i), model)
+    def _map_concurrently(
+        self, func: Callable, args: Iterable, max_workers: int
+    ) -> list:
+        """Call func for every arg on a thread pool and return the results in order.
 
-    def load_policy(self, model: Model):
-        """load all policies from database"""
-        dynamodb = self._get_db_handler()
-        response = dynamodb.scan(TableName=self.table_name)
-        self.load_policy_lines(response, model)
+        Each call runs in a copy of the caller's context, so metrics keep their caller.
+        """
+        args = list(args)
 
-    def load_filtered_policy_by_sub(self, model: Model, sub: str) -> None:
+        if max_workers <= 1 or len(args) <= 1:
+            return [func(arg) for arg in args]
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(args))) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, func, arg)
+                for arg in args
+            ]
+            return [future.result() for future in futures]
+
+    def _parallel_scan(self, on_page: Callable[[dict], None], **kwargs) -> None:
+        """Scan every segment of the table to the end, handing each page to on_page.
+
+        on_page is called under a lock, so it may safely mutate shared state.
+        """
         dynamodb = self._get_db_handler()
-        response = dynamodb.query(
-            TableName=self.table_name,
-            IndexName="v0-v1-index",
-            Select="ALL_ATTRIBUTES",
-            KeyConditionExpression="v0 = :v0",
-            ExpressionAttributeValues={":v0": {"S": sub}},
+        total_segments = self.scan_segments
+        lock = threading.Lock()
+
+        def scan_segment(segment: int) -> None:
+            scan_kwargs = dict(kwargs, TableName=self.table_name)
+
+            if total_segments > 1:
+                scan_kwargs["Segment"] = segment
+                scan_kwargs["TotalSegments"] = total_segments
+
+            for page in self._paginate(dynamodb, "scan", **scan_kwargs):
+                with lock:
+                    on_page(page)
+
+        self._map_concurrently(
+            scan_segment, range(total_segments), self.scan_max_workers
         )
-        self.load_policy_lines(response, model)
 
-    def load_filtered_policy_by_obj(self, model: Model, obj: str) -> None:
+    def _transact_write(self, groups: Iterable[list[dict]]) -> None:
+        """Write groups of transact items in as few TransactWriteItems calls as possible."""
         dynamodb = self._get_db_handler()
-        response = dynamodb.query(
+
+        for transaction in self._split_transactions(groups):
+            with self._writing(transaction):
+                dynamodb.transact_write_items(TransactItems=transaction)
+
+    def _table_version(self) -> str | None:
+        """Read the table version marker, None if the table has never been stamped."""
+        response = self._get_db_handler().get_item(
+            TableName=self.table_name, Key=self._version_key(), ConsistentRead=True
+        )
+
+        if "Item" not in response:
+            return None
+
+        return response["Item"]["version"]["S"]
+
+    def _bump_version(self) -> str:
+        """Stamp the table with a new version marker."""
+        version = uuid.uuid4().hex
+        self._get_db_handler().put_item(
             TableName=self.table_name,
-            IndexName="v1-v0-index",
-            Select="ALL_ATTRIBUTES",
-            KeyConditionExpression="v1 = :v1",
-            ExpressionAttributeValues={":v1": {"S": obj}},
+            Item=dict(self._version_key(), version={"S": version}),
+        )
+        return version
+
+    def _table_changed(self) -> None:
+        """stamp the table after a write made outside the versioned methods"""
+        if self.table_version_marker and not _versioning.get():
+            self._bump_version()
+
+
+class RuleLayout:
+    """Item mapping and request planning of the per-rule table, one item per rule
+
+    Shared by Adapter and AsyncAdapter, so both read and write the same items.
+    """
+
+    def _default_table_definition(self, table_name: str, billing_mode: str) -> dict:
+        """create_table arguments of the per-rule table and its indexes"""
+        # Table definition
+        # see (https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/create_table.html)
+        table_definition = {
+            "TableName": table_name,
+            "BillingMode": billing_mode,
+            "KeySchema": [
+                {"AttributeName": "id", "KeyType": "HASH"},
+            ],
+            "AttributeDefinitions": [
+                {"AttributeName": "id", "AttributeType": "S"},
+                {"AttributeName": "v0", "AttributeType": "S"},
+                {"AttributeName": "v1", "AttributeType": "S"},
+            ],
+            "GlobalSecondaryIndexes": [
+                {
+                    "IndexName": "v0-v1-index",
+                    "KeySchema": [
+                        {"AttributeName": "v0", "KeyType": "HASH"},
+                        {"AttributeName": "v1", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {
+                        "ProjectionType": "ALL",
+                    },
+                },
+                {
+                    "IndexName": "v1-v0-index",
+                    "KeySchema": [
+                        {"AttributeName": "v1", "KeyType": "HASH"},
+                        {"AttributeName": "v0", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {
+                        "ProjectionType": "ALL",
+                    },
+                },
+            ],
+        }
+
+        if self.table_domain_fields:
+            table_definition["AttributeDefinitions"] += [
+                {"AttributeName": "dom", "AttributeType": "S"},
+                {"AttributeName": "ptype", "AttributeType": "S"},
+            ]
+            table_definition["GlobalSecondaryIndexes"].append(
+                {
+                    "IndexName": self.DOMAIN_INDEX,
+                    "KeySchema": [
+                        {"AttributeName": "dom", "KeyType": "HASH"},
+                        {"AttributeName": "ptype", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {
+                        "ProjectionType": "ALL",
+                    },
+                }
+            )
+
+        return table_definition
+
+    def _request_key(self, request: dict) -> Any:
+        """Primary key of the item a PutRequest or DeleteRequest writes."""
+        if "PutRequest" in request:
+            return request["PutRequest"]["Item"]["id"]["S"]
+
+        return request["DeleteRequest"]["Key"]["id"]["S"]
+
+    def _update_groups(
+        self, ptype: str, old_rules: Iterable[Iterable], new_rules: Iterable[Iterable]
+    ) -> list[list[dict]]:
+        """Build one group of Put/Delete transact items per (old_rule, new_rule) pair.
+
+        A transaction may only touch an item once, so a rule that is both removed and
+        written is only put, and repeated ids are dropped.
+        """
+        old_ids = [self._rule_ids(ptype, rule) for rule in old_rules]
+        new_items = [self.convert_to_item(ptype, rule) for rule in new_rules]
+        new_ids = {item["id"]["S"] for item in new_items}
+        seen = set()
+        groups = []
+
+        for index in range(max(len(old_ids), len(new_items))):
+            group = []
+
+            if index < len(new_items) and new_items[index]["id"]["S"] not in seen:
+                seen.add(new_items[index]["id"]["S"])
+                group.append(
+                    {"Put": {"TableName": self.table_name, "Item": new_items[index]}}
+                )
+
+            for old_id in old_ids[index] if index < len(old_ids) else []:
+                if old_id not in new_ids and old_id not in seen:
+                    seen.add(old_id)
+                    group.append(
+                        {
+                            "Delete": {
+                                "TableName": self.table_name,
+                                "Key": {"id": {"S": old_id}},
+                            }
+                        }
+                    )
+
+            if group:
+                groups.append(group)
+
+        return groups
+
+    def _match_expression(
+        self, name: str, values: list[str], exp_attr: dict[str, dict]
+    ) -> str:
+        """Build an equality (one value) or IN (several values) condition on name."""
+        if len(values) == 1:
+            exp_attr[":{}".format(name)] = {"S": values[0]}
+            return "{} = :{}".format(name, name)
+
+        placeholders = []
+
+        for i, value in enumerate(values):
+            exp_attr[":{}_{}".format(name, i)] = {"S": value}
+            placeholders.append(":{}_{}".format(name, i))
+
+        return "{} IN ({})".format(name, ", ".join(placeholders))
+
+    def _filtered_requests(
+        self, ptypes: list[str], fields: dict[int, list[str]]
+    ) -> tuple[str, list[dict]]:
+        """Plan the cheapest reads for the rules whose ptype and v{i} are in the given lists.
+
+        When a field is the partition key of one of FIELD_INDEXES the lookup is one Query
+        per key value on that index, otherwise it falls back to a single filtered Scan.
+        """
+        fields = {i: values for i, values in fields.items() if values}
+        domain_field = (
+            self.table_domain_fields.get(ptypes[0])
+            if self.table_domain_fields and len(ptypes) == 1
+            else None
         )
-        self.load_policy_lines(response, model)
+
+        # subjects are more selective than domains, so the v0 index still wins
+        if domain_field in fields and 0 not in fields:
+            domains = fields.pop(domain_field)
+            return "query", self._domain_requests(domains, ptypes, fields)
+
+        key_fields = []
+
+        for i in sorted(fields, key=lambda i: len(fields[i])):
+            if i in self.FIELD_INDEXES:
+                index_name, range_field = self.FIELD_INDEXES[i]
+                key_fields = [i]
+
+                if range_field in fields:
+                    key_fields.append(range_field)
+
+                break
+
+        exp_attr = {}
+        filter_exp_list = []
+
+        if ptypes:
+            filter_exp_list.append(self._match_expression("ptype", ptypes, exp_attr))
+
+        for i, values in sorted(fields.items()):
+            if i not in key_fields:
+                filter_exp_list.append(
+                    self._match_expression("v{}".format(i), values, exp_attr)
+                )
+
+        request = {"TableName": self.table_name}
+
+        if filter_exp_list:
+            request["FilterExpression"] = " and ".join(filter_exp_list)
+
+        if not key_fields:
+            if exp_attr:
+                request["ExpressionAttributeValues"] = exp_attr
+
+            return "scan", [request]
+
+        requests = []
+
+        for key_values in itertools.product(*(fields[i] for i in key_fields)):
+            key_attr = dict(exp_attr)
+
+            for i, value in zip(key_fields, key_values, strict=True):
+                key_attr[":v{}".format(i)] = {"S": value}
+
+            requests.append(
+                dict(
+                    request,
+                    IndexName=index_name,
+                    KeyConditionExpression=" and ".join(
+                        "v{} = :v{}".format(i, i) for i in key_fields
+                    ),
+                    ExpressionAttributeValues=key_attr,
+                )
+            )
+
+        return "query", requests
+
+    def _domain_requests(
+        self,
+        domains: Iterable[str],
+        ptypes: Iterable[str] | None = None,
+        fields: dict[int, list[str]] | None = None,
+    ) -> list[dict]:
+        """One domain-index Query per (ptype, domain), other fields become filters.
+
+        ptypes defaults to every ptype of table_domain_fields.
+        """
+        if not self.table_domain_fields:
+            raise ValueError("domain queries need table_domain_fields")
+
+        requests = []
+
+        for ptype in self.table_domain_fields if ptypes is None else ptypes:
+            for domain in domains:
+                exp_attr = {":dom": {"S": domain}, ":ptype": {"S": ptype}}
+                request = {
+                    "TableName": self.table_name,
+                    "IndexName": self.DOMAIN_INDEX,
+                    "KeyConditionExpression": "dom = :dom and ptype = :ptype",
+                    "ExpressionAttributeValues": exp_attr,
+                }
+                filter_exp_list = [
+                    self._match_expression("v{}".format(i), values, exp_attr)
+                    for i, values in sorted((fields or {}).items())
+                ]
+
+                if filter_exp_list:
+                    request["FilterExpression"] = " and ".join(filter_exp_list)
+
+                requests.append(request)
+
+        return requests
+
+    def load_policy_lines(
+        self, response: dict, model: Model, strings: dict[str, str] | None = None
+    ) -> None:
+        """Load the items of a scan or query page straight into the model.
+
+        Rules are built from the item attributes without going through casbin's
+        policy line format, so values may contain commas. See _add_rules for strings.
+        """
+        rules = {}
+
+        for item in response.get("Items", []):
+            if self._is_rule_item(item):
+                rules.setdefault(item["ptype"]["S"], []).append(
+                    self.get_rule_from_item(item)
+                )
+
+        for ptype, ptype_rules in rules.items():
+            self._add_rules(model, ptype, ptype_rules, strings)
+
+    def _filter_requests(
+        self, filter: Any, ptype: str | None = None, page_size: int | None = None
+    ) -> tuple[str, list[dict]]:
+        """Plan the reads of the rules matching a filter object, optionally of one ptype."""
+        ptypes = list(getattr(filter, "ptype", None) or [])
+        fields = {
+            i: list(getattr(filter, "v{}".format(i), None) or []) for i in range(6)
+        }
+
+        if ptype is not None:
+            ptypes = [ptype] if not ptypes or ptype in ptypes else []
+
+            if not ptypes:
+                return "query", []
+
+        operation, requests = self._filtered_requests(ptypes, fields)
+
+        if page_size is not None:
+            requests = [dict(request, Limit=page_size) for request in requests]
+
+        return operation, requests
+
+    def _rules_from_page(self, page: dict) -> list[tuple[str, list[str]]]:
+        return [
+            (item["ptype"]["S"], self.get_rule_from_item(item))
+            for item in page.get("Items", [])
+            if self._is_rule_item(item)
+        ]
+
+    def _is_rule_item(self, item: dict[str, Any]) -> bool:
+        """tell rule items from the table version marker, which carries no ptype"""
+        return "ptype" in item
+
+    def _version_key(self) -> dict[str, dict]:
+        return {"id": {"S": VERSION_ITEM_ID}}
 
     def get_line_from_item(self, item: dict[str, Any]) -> str:
         """make casbin policy string from dynamodb item"""
-        line = item["ptype"]["S"]
-        i = 0
+        return ", ".join([item["ptype"]["S"], *self.get_rule_from_item(item)])
 
-        while i < len(item) - 2:
-            line = "{}, {}".format(line, item["v{}".format(i)]["S"])
-            i = i + 1
+    def get_rule_from_item(self, item: dict[str, Any]) -> list[str]:
+        """make casbin rule values from dynamodb item"""
+        rule = []
 
-        return line
+        for name in self.FIELD_NAMES:
+            if name not in item:
+                return rule
+
+            rule.append(item[name]["S"])
+
+        while "v{}".format(len(rule)) in item:
+            rule.append(item["v{}".format(len(rule))]["S"])
+
+        return rule
 
     def get_md5(self, line: Iterable):
         """convert policy line to MD5 hash to be used as "id" """
@@ -263,21 +1096,68 @@ class Adapter(persist.Adapter):
         m.update(str(line).encode("utf-8"))
         return m.hexdigest()
 
+    def get_id(self, ptype: str, rule: Iterable, scheme: str | None = None) -> str:
+        """return the item id of a rule under scheme, the adapter's table_id_scheme by default
+
+        blake2b ids hash the length prefixed UTF-8 fields of (ptype, v0, ..., vN), so
+        no separator inside a value can make two rules collide.
+        """
+        if (scheme or self.table_id_scheme) == "md5":
+            line = {"ptype": {"S": ptype}}
+
+            for i, v in enumerate(rule):
+                line["v{}".format(i)] = {"S": v}
+
+            return self.get_md5(line)
+
+        fields = [field.encode("utf-8") for field in (ptype, *rule)]
+        data = b"".join(len(field).to_bytes(4, "big") + field for field in fields)
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def _rule_ids(self, ptype: str, rule: Iterable) -> list[str]:
+        """ids a rule may be stored under, the legacy scheme's too while migrating"""
+        rule = list(rule)
+        ids = [self.get_id(ptype, rule)]
+
+        if self.table_legacy_id_scheme not in (None, self.table_id_scheme):
+            ids.append(self.get_id(ptype, rule, self.table_legacy_id_scheme))
+
+        return ids
+
     def convert_to_item(self, ptype: str, rule: Iterable):
         """change casbin policy string to dynamodb item"""
+        rule = list(rule)
         line = {"ptype": {"S": ptype}}
 
         for i, v in enumerate(rule):
             line["v{}".format(i)] = {}
             line["v{}".format(i)]["S"] = v
 
-        line["id"] = {"S": self.get_md5(line)}
+        if self.table_id_scheme == "md5":
+            line["id"] = {"S": self.get_md5(line)}
+        else:
+            line["id"] = {"S": self.get_id(ptype, rule)}
+
+        # the domain copy is added after the id, so ids do not depend on it
+        if self.table_domain_fields and ptype in self.table_domain_fields:
+            if self.table_domain_fields[ptype] < len(rule):
+                line["dom"] = {"S": rule[self.table_domain_fields[ptype]]}
 
         return line
 
-    def save_policy(self, model: Model) -> bool:
-        """Save all policy rules to DynamoDB."""
-        write_requests = []
+    def _save_requests(
+        self,
+        model: Model,
+        stored_ids: set[str] | None,
+        domains: set[str] | None = None,
+    ) -> list[dict]:
+        """Write requests that store the model's rules, only those of domains if given.
+
+        With stored_ids only the difference is written: puts for the rules the table
+        lacks and deletes for the stored ids the model no longer has. Ids are hashes
+        of the whole rule, so a rule whose id is stored is stored unchanged.
+        """
+        items = {}
 
         for sec in ["p", "g"]:
             if sec not in model.model:
@@ -286,35 +1166,502 @@ class Adapter(persist.Adapter):
             for ptype, ast in model.model[sec].items():
                 for rule in ast.policy:
                     item = self.convert_to_item(ptype, rule)
-                    write_requests.append({"PutRequest": {"Item": item}})
 
-                    if len(write_requests) == self.WRITE_BATCH_SIZE:
-                        self._write_batch(write_requests)
-                        write_requests = []
+                    if (
+                        domains is not None
+                        and item.get("dom", {}).get("S") not in domains
+                    ):
+                        continue
+
+                    items[item["id"]["S"]] = item
+
+        if stored_ids is None:
+            return [{"PutRequest": {"Item": item}} for item in items.values()]
+
+        return [
+            {"PutRequest": {"Item": item}}
+            for item_id, item in items.items()
+            if item_id not in stored_ids
+        ] + [
+            {"DeleteRequest": {"Key": {"id": {"S": item_id}}}}
+            for item_id in stored_ids - items.keys()
+        ]
+
+    def _cached_lookups(
+        self, rules: Iterable[tuple[str, Iterable]]
+    ) -> tuple[list[list[str]], dict[str, bool]]:
+        """ids of every (ptype, rule) pair, and the cached answers for any of them"""
+        rule_ids = [self._rule_ids(ptype, rule) for ptype, rule in rules]
+        known = {}
+
+        if self._lookup_cache is not None:
+            with self._lookup_cache_lock:
+                for ids in rule_ids:
+                    for item_id in ids:
+                        stored = self._lookup_cache.get(item_id)
+
+                        if stored is not None:
+                            known[item_id] = stored
+
+        return rule_ids, known
+
+    def _remember_lookups(self, stored: dict[str, bool]) -> None:
+        if self._lookup_cache is not None:
+            with self._lookup_cache_lock:
+                self._lookup_cache.update(stored)
 
-        if write_requests:
-            self._write_batch(write_requests)
+    def _record_writes(self, requests: list[dict], written: bool) -> None:
+        """Cache the outcome of write requests or transact items for has_rules.
 
+        Written puts are cached as stored and deletes as missing. The ids of a write
+        that failed are evicted, since part of it may have been applied.
+        """
+        if self._lookup_cache is None:
+            return
+
+        with self._lookup_cache_lock:
+            for request in requests:
+                put = request.get("PutRequest") or request.get("Put")
+
+                if put is not None:
+                    item_id, stored = put["Item"]["id"]["S"], True
+                else:
+                    delete = request.get("DeleteRequest") or request["Delete"]
+                    item_id, stored = delete["Key"]["id"]["S"], False
+
+                if written:
+                    self._lookup_cache[item_id] = stored
+                else:
+                    self._lookup_cache.pop(item_id, None)
+
+    def clear_lookup_cache(self) -> None:
+        """forget the cached has_rules answers"""
+        if self._lookup_cache is not None:
+            with self._lookup_cache_lock:
+                self._lookup_cache.clear()
+
+    def _batch_get_requests(self, ids: list[str]) -> list[dict]:
+        """BatchGetItem RequestItems reading the ids, BATCH_GET_SIZE keys each."""
+        return [
+            {
+                self.table_name: {
+                    "Keys": [
+                        {"id": {"S": item_id}}
+                        for item_id in ids[i : i + self.BATCH_GET_SIZE]
+                    ],
+                    "ProjectionExpression": "id",
+                }
+            }
+            for i in range(0, len(ids), self.BATCH_GET_SIZE)
+        ]
+
+
+class Adapter(
+    RuleLayout,
+    BaseAdapter,
+    persist.BatchAdapter,
+    persist.UpdateAdapter,
+    FilteredAdapter,
+):
+    """DynamoDB adopter for casbin
+
+    Args:
+        table_name: Dynamodb table name
+        provision_policy_table: Provision a policy table if it doesnt exist
+        table_definition: (Optional) Dynamodb table defintion. Please review the code to ensure you create a table with the proper structure.
+          also see (https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/create_table.html)
+        table_provisioned_read_capacity: (Optional) Table read capacity units
+        table_provisioned_write_capacity: (Optional) Table write capacity units
+        table_billing_mode: (Optional) Table billing mode
+        table_stream_view_type: (Optional) Enable a DynamoDB Stream with this view type, StreamWatcher needs NEW_AND_OLD_IMAGES
+        table_id_scheme: (Optional) How item ids are derived from rules: "md5" (the original ids) or "blake2b"
+        table_legacy_id_scheme: (Optional) Scheme of ids still in the table while migrate_ids runs, deletes target both ids
+        table_domain_fields: (Optional) Position of the domain in the rules of each ptype, such as {"p": 1, "g": 2}.
+          Items then carry the domain in a dom attribute, indexed with ptype by the domain-index GSI
+        table_rate_limit: (Optional) Pace reads and writes to the table and GSI capacities above,
+          or to the on-demand maximums, with an adaptive rate_limit.RateLimiter
+        table_create_timeout: (Optional) Seconds to wait for a table created by the adapter to become ACTIVE
+        table_version_marker: (Optional) Replace a version marker item in the table after every write,
+          so SnapshotAdapter can tell its snapshot is stale. Every writer of the table must set it
+        aws_max_pool_connections: (Optional) Size of the client's HTTP connection pool
+        aws_connect_timeout: (Optional) Connection timeout in seconds
+        aws_read_timeout: (Optional) Read timeout in seconds
+        aws_retry_mode: (Optional) botocore retry mode: legacy, standard or adaptive
+        aws_max_attempts: (Optional) botocore total attempts per request, including the first
+        aws_config: (Optional) botocore Config merged over the settings above
+        scan_segments: (Optional) Number of parallel scan segments used by load_policy
+        scan_max_workers: (Optional) Thread pool size for parallel scans, defaults to scan_segments
+        scan_fast_decode: (Optional) Take the items of scan and query pages straight from a fast
+          JSON parse instead of botocore's output parser, see fast_decode
+        scan_intern_strings: (Optional) Hold each distinct value of a load in memory once,
+          at the cost of some load time
+        lookup_cache_size: (Optional) Number of rule ids whose has_rules answer is cached, 0 disables the cache
+        lookup_cache_ttl: (Optional) Seconds a cached has_rules answer is used
+        write_max_workers: (Optional) Number of BatchWriteItem calls allowed in flight at once
+        write_max_attempts: (Optional) Attempts per batch before UnprocessedItemsError is raised
+        write_backoff_base: (Optional) Base delay in seconds of the exponential retry backoff
+        write_backoff_max: (Optional) Upper bound in seconds of a single retry delay
+        save_mode: (Optional) "put" rewrites every rule on save_policy, "sync" writes only the
+          rules missing from the table and deletes the rules missing from the model
+        metrics_hook: (Optional) MetricsHook receiving the latency and consumed capacity of every call
+        rate_limiter: (Optional) RateLimiter pacing the calls, may be shared by several adapters
+        kwargs: Additional kwargs are passed to dynamodb client
+    """
+
+    @metrics.tracked
+    @versioned
+    def update_policy(
+        self, sec: str, ptype: str, old_rule: Iterable, new_rule: Iterable
+    ) -> bool:
+        """updates a policy rule in a single transaction."""
+        self._transact_write(self._update_groups(ptype, [old_rule], [new_rule]))
         return True
 
+    @metrics.tracked
+    @versioned
+    def update_policies(
+        self,
+        sec: str,
+        ptype: str,
+        old_rules: Iterable[Iterable],
+        new_rules: Iterable[Iterable],
+    ) -> bool:
+        """updates policy rules in TRANSACT_WRITE_SIZE transactions."""
+        old_rules = list(old_rules)
+        new_rules = list(new_rules)
+
+        if len(old_rules) != len(new_rules):
+            return False
+
+        self._transact_write(self._update_groups(ptype, old_rules, new_rules))
+        return True
+
+    @metrics.tracked
+    @versioned
+    def update_filtered_policies(
+        self,
+        sec: str,
+        ptype: str,
+        new_rules: Iterable[Iterable],
+        field_index: int,
+        *field_values: str,
+    ) -> list[list[str]]:
+        """replaces the rules that match the filter with new_rules and returns the old rules."""
+        old_rules = [
+            self.get_rule_from_item(item)
+            for item in self.get_filtered_item(ptype, list(field_values), field_index)
+        ]
+        self._transact_write(self._update_groups(ptype, old_rules, list(new_rules)))
+        return old_rules
+
+    def get_filtered_item(
+        self, ptype: str, rules: Iterable, field_index: int = 0
+    ) -> list[dict]:
+        """return the raw items of ptype whose fields match rules, starting at v{field_index}
+
+        Empty values match any field, as in casbin's filtered policy functions.
+        """
+        dynamodb = self._get_db_handler()
+        fields = {
+            i: [rule] for i, rule in enumerate(rules, start=field_index) if rule != ""
+        }
+        operation, requests = self._filtered_requests([ptype], fields)
+        data = []
+
+        for request in requests:
+            for page in self._paginate(dynamodb, operation, **request):
+                data.extend(page.get("Items", []))
+
+        return data
+
+    @metrics.tracked
+    def load_policy(self, model: Model):
+        """load all policies from database
+
+        The table is read with a parallel scan of scan_segments segments, and every
+        page is loaded into the model as soon as it arrives.
+        """
+        strings = self._interning_table()
+        self._parallel_scan(lambda page: self.load_policy_lines(page, model, strings))
+        self._filtered = False
+
+    def _load_requests(
+        self, model: Model, operation: str, requests: list[dict]
+    ) -> None:
+        """Run scan or query requests concurrently and load every page into the model."""
+        strings = self._interning_table()
+
+        if operation == "scan":
+            for request in requests:
+                self._parallel_scan(
+                    lambda page: self.load_policy_lines(page, model, strings),
+                    **request,
+                )
+            return
+
+        dynamodb = self._get_db_handler()
+        lock = threading.Lock()
+
+        def load(request: dict) -> None:
+            for page in self._paginate(dynamodb, operation, **request):
+                with lock:
+                    self.load_policy_lines(page, model, strings)
+
+        self._map_concurrently(load, requests, self.scan_max_workers)
+
+    @metrics.tracked
+    def load_filtered_policy(self, model: Model, filter: Any) -> None:
+        """load the policies that match the filter from database
+
+        filter is any object with ptype and v0..v5 attributes holding lists of accepted
+        values, such as Filter. Filters on v0 or v1 are answered with parallel queries
+        on the matching GSI, anything else with a filtered parallel scan.
+        """
+        if filter is None:
+            self.load_policy(model)
+            return
+
+        self._load_requests(model, *self._filter_requests(filter))
+        self._filtered = True
+
+    def iter_policies(
+        self,
+        ptype: str | None = None,
+        filter: Any = None,
+        page_size: int | None = None,
+    ) -> Iterator[tuple[str, list[str]]]:
+        """Yield the stored (ptype, values) rules page by page
+
+        Rules can be restricted to one ptype and to a filter, like load_filtered_policy.
+        page_size is passed as Limit, it defaults to DynamoDB's 1 MB pages. The next page
+        is fetched in the background while the current one is consumed, so at most two
+        pages are held in memory.
+        """
+        dynamodb = self._get_db_handler()
+        operation, requests = self._filter_requests(filter, ptype, page_size)
+        # calls made while the generator is consumed are attributed to iter_policies
+        context = contextvars.copy_context()
+
+        if context.get(metrics.current_caller) is None:
+            context.run(metrics.current_caller.set, "iter_policies")
+
+        def fetch(request: dict) -> dict:
+            return context.run(getattr(dynamodb, operation), **request)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            for request in requests:
+                page = fetch(request)
+
+                while True:
+                    prefetched = None
+
+                    if "LastEvaluatedKey" in page:
+                        request = dict(
+                            request, ExclusiveStartKey=page["LastEvaluatedKey"]
+                        )
+                        prefetched = executor.submit(fetch, request)
+
+                    yield from self._rules_from_page(page)
+
+                    if prefetched is None:
+                        break
+
+                    page = prefetched.result()
+
+    @metrics.tracked
+    def load_filtered_policy_by_sub(self, model: Model, sub: str) -> None:
+        self._load_requests(model, *self._filtered_requests([], {0: [sub]}))
+
+    @metrics.tracked
+    def load_filtered_policy_by_obj(self, model: Model, obj: str) -> None:
+        self._load_requests(model, *self._filtered_requests([], {1: [obj]}))
+
+    def _stored_ids(self) -> set[str]:
+        """Read the ids of every rule in the table with a keys-only parallel scan."""
+        ids = set()
+
+        def on_page(page: dict) -> None:
+            ids.update(
+                i["id"]["S"] for i in page.get("Items", []) if self._is_rule_item(i)
+            )
+
+        self._parallel_scan(on_page, ProjectionExpression="id, ptype")
+        return ids
+
+    @metrics.tracked
+    @versioned
+    def save_policy(self, model: Model) -> bool:
+        """Save all policy rules to DynamoDB.
+
+        In sync mode the stored ids are read first and only the changes are written.
+        """
+        stored_ids = self._stored_ids() if self.save_mode == "sync" else None
+        self._write_batches(self._save_requests(model, stored_ids))
+
+        return True
+
+    def _domain_ids(self, domains: Iterable[str]) -> set[str]:
+        """Read the ids of every rule of the domains with parallel domain-index queries."""
+        dynamodb = self._get_db_handler()
+        ids = set()
+        lock = threading.Lock()
+
+        def read(request: dict) -> None:
+            for page in self._paginate(dynamodb, "query", **request):
+                with lock:
+                    ids.update(item["id"]["S"] for item in page.get("Items", []))
+
+        requests = [
+            dict(request, ProjectionExpression="id")
+            for request in self._domain_requests(domains)
+        ]
+        self._map_concurrently(read, requests, self.scan_max_workers)
+        return ids
+
+    @metrics.tracked
+    def load_domain_policy(self, model: Model, domains: Iterable[str]) -> None:
+        """load the rules of the domains with parallel queries on the domain index"""
+        self._load_requests(model, "query", self._domain_requests(list(domains)))
+        self._filtered = True
+
+    @metrics.tracked
+    @versioned
+    def save_domain_policy(self, model: Model, domains: Iterable[str]) -> bool:
+        """Store the model's rules of the domains and delete their stored rules the model lacks.
+
+        Rules of other domains are neither read nor written.
+        """
+        domains = set(domains)
+        stored_ids = self._domain_ids(domains)
+        self._write_batches(self._save_requests(model, stored_ids, domains))
+        return True
+
+    @metrics.tracked
+    @versioned
+    def remove_domain_policy(self, domains: Iterable[str]) -> bool:
+        """removes every rule of the domains from the storage."""
+        self._write_batches(
+            {"DeleteRequest": {"Key": {"id": {"S": item_id}}}}
+            for item_id in self._domain_ids(list(domains))
+        )
+        return True
+
+    def _batch_get_ids(self, request_items: dict) -> set[str]:
+        """Return the stored ids among the keys of one BatchGetItem request.
+
+        Unprocessed keys are retried with the backoff of batch writes, up to
+        write_max_attempts calls in total.
+        """
+        dynamodb = self._get_db_handler()
+        ids = set()
+
+        for attempt in range(self.write_max_attempts):
+            if attempt:
+                time.sleep(self._backoff(attempt))
+
+            response = dynamodb.batch_get_item(RequestItems=request_items)
+            ids.update(
+                item["id"]["S"]
+                for item in response.get("Responses", {}).get(self.table_name, [])
+            )
+            request_items = response.get("UnprocessedKeys", {})
+
+            if not request_items:
+                return ids
+
+        raise UnprocessedKeysError(request_items)
+
+    def _stored_among(self, ids: list[str]) -> set[str]:
+        """Return which of the ids are stored, with GetItem for a single id."""
+        if len(ids) == 1:
+            response = self._get_db_handler().get_item(
+                TableName=self.table_name,
+                Key={"id": {"S": ids[0]}},
+                ProjectionExpression="id",
+            )
+            return set(ids) if "Item" in response else set()
+
+        found = self._map_concurrently(
+            self._batch_get_ids, self._batch_get_requests(ids), self.scan_max_workers
+        )
+        return set().union(*found)
+
+    @metrics.tracked
+    def has_rules(self, rules: Iterable[tuple[str, Iterable]]) -> list[bool]:
+        """Tell for each (ptype, rule) pair whether the rule is stored, without loading the policy.
+
+        The rules are looked up by id, BATCH_GET_SIZE per BatchGetItem call with the
+        calls spread over scan_max_workers threads. With lookup_cache_size the answers
+        are cached for lookup_cache_ttl seconds. Writes made through this adapter
+        update the cache, a rule added or removed by another writer is seen once its
+        cached answer expires.
+        """
+        rule_ids, known = self._cached_lookups(rules)
+        missing = list(
+            dict.fromkeys(
+                item_id for ids in rule_ids for item_id in ids if item_id not in known
+            )
+        )
+
+        if missing:
+            found = self._stored_among(missing)
+            stored = {item_id: item_id in found for item_id in missing}
+            self._remember_lookups(stored)
+            known.update(stored)
+
+        return [any(known[item_id] for item_id in ids) for ids in rule_ids]
+
+    def has_rule(self, ptype: str, rule: Iterable) -> bool:
+        """tell whether a single rule is stored, see has_rules"""
+        return self.has_rules([(ptype, rule)])[0]
+
+    @metrics.tracked
+    @versioned
     def add_policy(self, _: str, ptype: str, rule: Iterable) -> None:
         """adds a single policy rule to the storage."""
         dynamodb = self._get_db_handler()
         line = self.convert_to_item(ptype, rule)
-        dynamodb.put_item(TableName=self.table_name, Item=line)
 
+        with self._writing([{"PutRequest": {"Item": line}}]):
+            dynamodb.put_item(TableName=self.table_name, Item=line)
+
+    @metrics.tracked
+    @versioned
     def remove_policy(self, _: str, ptype: str, rule: Iterable) -> bool:
         """removes a single policy rule from the storage."""
         dynamodb = self._get_db_handler()
-        line = self.convert_to_item(ptype, rule)
 
-        dynamodb.delete_item(
-            Key={"id": {"S": line["id"]["S"]}},
-            TableName=self.table_name,
+        for item_id in self._rule_ids(ptype, rule):
+            key = {"id": {"S": item_id}}
+
+            with self._writing([{"DeleteRequest": {"Key": key}}]):
+                dynamodb.delete_item(Key=key, TableName=self.table_name)
+
+        return True
+
+    @metrics.tracked
+    @versioned
+    def add_policies(self, _: str, ptype: str, rules: Iterable[Iterable]) -> bool:
+        """adds policy rules to the storage in batches."""
+        self._write_batches(
+            {"PutRequest": {"Item": self.convert_to_item(ptype, rule)}}
+            for rule in rules
         )
+        return True
 
+    @metrics.tracked
+    @versioned
+    def remove_policies(self, _: str, ptype: str, rules: Iterable[Iterable]) -> bool:
+        """removes policy rules from the storage in batches."""
+        self._write_batches(
+            {"DeleteRequest": {"Key": {"id": {"S": item_id}}}}
+            for rule in rules
+            for item_id in self._rule_ids(ptype, rule)
+        )
         return True
 
+    @metrics.tracked
+    @versioned
     def remove_filtered_policy(
         self, _: str, ptype: str, field_index: int, *field_values: Iterable
     ) -> bool:
@@ -325,20 +1672,12 @@ class Adapter(persist.Adapter):
         if not (1 <= field_index + len(field_values) <= 6):
             return False
 
-        matched_rules = self.get_filtered_item(ptype, list(field_values))
+        matched_rules = self.get_filtered_item(ptype, list(field_values), field_index)
         if not matched_rules:
             return True
 
-        batch = []
-
-        for rule in matched_rules:
-            batch.append({"DeleteRequest": {"Key": {"id": rule["id"]}}})
-
-            if len(batch) == self.WRITE_BATCH_SIZE:
-                self._write_batch(batch)
-                batch = []
-
-        if batch:
-            self._write_batch(batch)
+        self._write_batches(
+            {"DeleteRequest": {"Key": {"id": rule["id"]}}} for rule in matched_rules
+        )
 
         return True
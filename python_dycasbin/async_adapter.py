@@ -0,0 +1,587 @@
+import asyncio
+import contextlib
+import contextvars
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable
+
+from casbin import Model
+from casbin.persist.adapters.asyncio import AsyncAdapter as BaseAsyncAdapter
+from casbin.persist.adapters.asyncio import (
+    AsyncBatchAdapter,
+    AsyncFilteredAdapter,
+    AsyncUpdateAdapter,
+)
+
+from python_dycasbin import fast_decode, metrics, rate_limit
+from python_dycasbin.adapter import (
+    AdapterCore,
+    RuleLayout,
+    UnprocessedItemsError,
+    UnprocessedKeysError,
+    _checked_tables,
+    _checked_tables_lock,
+    versioned,
+)
+
+
+class AsyncAdapter(
+    RuleLayout,
+    AdapterCore,
+    BaseAsyncAdapter,
+    AsyncBatchAdapter,
+    AsyncUpdateAdapter,
+    AsyncFilteredAdapter,
+):
+    """Asyncio DynamoDB adopter for casbin, for use with casbin.AsyncEnforcer
+
+    Uses an aiobotocore client (pip install python-dycasbin[async]) that is created on
+    first use and shared by every call, so all requests reuse one connection pool.
+    Items are mapped exactly like Adapter does, so both adapters share a table.
+    The table is provisioned on first use; call close() or use the adapter as an
+    async context manager to release the pool.
+
+    Args:
+        table_name: Dynamodb table name
+        aws_max_pool_connections: (Optional) Size of the shared HTTP connection pool
+        aws_connect_timeout, aws_read_timeout, aws_retry_mode, aws_max_attempts: see Adapter
+        aws_config: (Optional) botocore Config merged over the settings above into an AioConfig
+        Other arguments: see Adapter
+    """
+
+    def __init__(self, table_name: str = "casbin_rule", **kwargs: Any) -> None:
+        super().__init__(table_name, **kwargs)
+        self._client_lock = asyncio.Lock()
+        self._exit_stack = contextlib.AsyncExitStack()
+
+    async def __aenter__(self) -> "AsyncAdapter":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def _get_db_handler(self):
+        """Create the shared aiobotocore client and provision the table on first use"""
+        if self._client is not None:
+            return self._client
+
+        async with self._client_lock:
+            if self._client is None:
+                from aiobotocore.config import AioConfig
+                from aiobotocore.session import get_session
+
+                client = await self._exit_stack.enter_async_context(
+                    get_session().create_client(
+                        "dynamodb",
+                        config=self._client_config(AioConfig),
+                        **self._client_kwargs(),
+                    )
+                )
+
+                # installed first, so the latency metrics leave the pacing out
+                if self.rate_limiter is not None:
+                    rate_limit.install(client, self.rate_limiter, asynchronous=True)
+
+                if self.metrics_hook is not None:
+                    metrics.instrument_client(client, self.metrics_hook)
+
+                if self.scan_fast_decode:
+                    fast_decode.install(client)
+
+                if self._pending_table_definition is not None:
+                    await self._provision_table(client, self._pending_table_definition)
+                    self._pending_table_definition = None
+
+                self._client = client
+
+        return self._client
+
+    async def _provision_table(self, client: Any, table_definition: dict) -> None:
+        """Describe the table, create it when missing and wait for it, see Adapter"""
+        if self._table_cache_key() in _checked_tables:
+            return
+
+        table_name = table_definition["TableName"]
+        created = False
+
+        try:
+            description = (await client.describe_table(TableName=table_name))["Table"]
+        except client.exceptions.ResourceNotFoundException:
+            created = True
+
+            try:
+                response = await client.create_table(**table_definition)
+                description = response["TableDescription"]
+            except client.exceptions.ResourceInUseException:
+                # created meanwhile by another process
+                description = {"TableStatus": "CREATING"}
+
+        deadline = time.monotonic() + self.table_create_timeout
+
+        while not self._table_active(description, created):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(
+                    "table {} is not ACTIVE after {}s".format(
+                        table_name, self.table_create_timeout
+                    )
+                )
+
+            await asyncio.sleep(self.TABLE_POLL_INTERVAL)
+            description = (await client.describe_table(TableName=table_name))["Table"]
+
+        self._check_indexes(description, table_definition)
+
+        with _checked_tables_lock:
+            _checked_tables.add(self._table_cache_key())
+
+    async def close(self) -> None:
+        """Close the shared client and its connection pool"""
+        await self._exit_stack.aclose()
+        self._client = None
+
+    async def _gather_limited(
+        self, func: Callable[[Any], Awaitable], args: Iterable, limit: int
+    ) -> list:
+        """Await func for every arg with at most limit calls in flight."""
+        semaphore = asyncio.Semaphore(max(1, limit))
+
+        async def run(arg: Any) -> Any:
+            async with semaphore:
+                return await func(arg)
+
+        return await asyncio.gather(*(run(arg) for arg in args))
+
+    async def _paginate(
+        self, dynamodb, operation: str, **kwargs
+    ) -> AsyncIterator[dict]:
+        """Yield every page of a scan or query, following LastEvaluatedKey."""
+        while True:
+            response = await getattr(dynamodb, operation)(**kwargs)
+            yield response
+
+            if "LastEvaluatedKey" not in response:
+                return
+
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    async def _parallel_scan(self, on_page: Callable[[dict], None], **kwargs) -> None:
+        """Scan every segment of the table to the end, handing each page to on_page."""
+        dynamodb = await self._get_db_handler()
+        total_segments = self.scan_segments
+
+        async def scan_segment(segment: int) -> None:
+            scan_kwargs = dict(kwargs, TableName=self.table_name)
+
+            if total_segments > 1:
+                scan_kwargs["Segment"] = segment
+                scan_kwargs["TotalSegments"] = total_segments
+
+            async for page in self._paginate(dynamodb, "scan", **scan_kwargs):
+                on_page(page)
+
+        await self._gather_limited(
+            scan_segment, range(total_segments), self.scan_max_workers
+        )
+
+    async def _write_batch(self, batch: list) -> None:
+        """Write one batch, retrying unprocessed items with full jitter backoff."""
+        dynamodb = await self._get_db_handler()
+        request_items = {self.table_name: batch}
+        self._count_write(batches=1)
+
+        with self._writing(batch):
+            for attempt in range(self.write_max_attempts):
+                if attempt:
+                    self._count_write(retries=1)
+                    await asyncio.sleep(self._backoff(attempt))
+
+                response = await dynamodb.batch_write_item(RequestItems=request_items)
+                self._count_write(requests=1)
+                request_items = response.get("UnprocessedItems", {})
+
+                if not request_items:
+                    return
+
+                self._count_write(
+                    unprocessed_items=sum(len(r) for r in request_items.values())
+                )
+
+            self._count_write(failed_batches=1)
+            raise UnprocessedItemsError(request_items)
+
+    async def _write_batches(self, write_requests: Iterable[dict]) -> None:
+        await self._gather_limited(
+            self._write_batch,
+            self._split_write_requests(write_requests),
+            self.write_max_workers,
+        )
+
+    async def _transact_write(self, groups: Iterable[list[dict]]) -> None:
+        dynamodb = await self._get_db_handler()
+
+        for transaction in self._split_transactions(groups):
+            with self._writing(transaction):
+                await dynamodb.transact_write_items(TransactItems=transaction)
+
+    async def _load_requests(
+        self, model: Model, operation: str, requests: list[dict]
+    ) -> None:
+        strings = self._interning_table()
+
+        if operation == "scan":
+            for request in requests:
+                await self._parallel_scan(
+                    lambda page: self.load_policy_lines(page, model, strings),
+                    **request,
+                )
+            return
+
+        dynamodb = await self._get_db_handler()
+
+        async def load(request: dict) -> None:
+            async for page in self._paginate(dynamodb, operation, **request):
+                self.load_policy_lines(page, model, strings)
+
+        await self._gather_limited(load, requests, self.scan_max_workers)
+
+    async def get_filtered_item(
+        self, ptype: str, rules: Iterable, field_index: int = 0
+    ) -> list[dict]:
+        """return the raw items of ptype whose fields match rules, starting at v{field_index}"""
+        dynamodb = await self._get_db_handler()
+        fields = {
+            i: [rule] for i, rule in enumerate(rules, start=field_index) if rule != ""
+        }
+        operation, requests = self._filtered_requests([ptype], fields)
+        data = []
+
+        for request in requests:
+            async for page in self._paginate(dynamodb, operation, **request):
+                data.extend(page.get("Items", []))
+
+        return data
+
+    @metrics.tracked
+    async def load_policy(self, model: Model) -> None:
+        """load all policies from database"""
+        strings = self._interning_table()
+        await self._parallel_scan(
+            lambda page: self.load_policy_lines(page, model, strings)
+        )
+        self._filtered = False
+
+    @metrics.tracked
+    async def load_filtered_policy(self, model: Model, filter: Any) -> None:
+        """load the policies that match the filter from database, see Adapter"""
+        if filter is None:
+            await self.load_policy(model)
+            return
+
+        await self._load_requests(model, *self._filter_requests(filter))
+        self._filtered = True
+
+    async def iter_policies(
+        self,
+        ptype: str | None = None,
+        filter: Any = None,
+        page_size: int | None = None,
+    ) -> AsyncIterator[tuple[str, list[str]]]:
+        """Yield the stored (ptype, values) rules page by page, see Adapter
+
+        The next page is requested in a task while the current one is consumed.
+        """
+        dynamodb = await self._get_db_handler()
+        operation, requests = self._filter_requests(filter, ptype, page_size)
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+
+        if context.get(metrics.current_caller) is None:
+            context.run(metrics.current_caller.set, "iter_policies")
+
+        def fetch(request: dict) -> asyncio.Task:
+            return loop.create_task(
+                getattr(dynamodb, operation)(**request), context=context
+            )
+
+        for request in requests:
+            page = await fetch(request)
+
+            while True:
+                prefetched = None
+
+                if "LastEvaluatedKey" in page:
+                    request = dict(request, ExclusiveStartKey=page["LastEvaluatedKey"])
+                    prefetched = fetch(request)
+
+                try:
+                    for rule in self._rules_from_page(page):
+                        yield rule
+                except BaseException:
+                    if prefetched is not None:
+                        prefetched.cancel()
+                    raise
+
+                if prefetched is None:
+                    break
+
+                page = await prefetched
+
+    async def _table_version(self) -> str | None:
+        """Read the table version marker, see Adapter"""
+        dynamodb = await self._get_db_handler()
+        response = await dynamodb.get_item(
+            TableName=self.table_name, Key=self._version_key(), ConsistentRead=True
+        )
+
+        if "Item" not in response:
+            return None
+
+        return response["Item"]["version"]["S"]
+
+    async def _bump_version(self) -> str:
+        """Stamp the table with a new version marker."""
+        version = uuid.uuid4().hex
+        dynamodb = await self._get_db_handler()
+        await dynamodb.put_item(
+            TableName=self.table_name,
+            Item=dict(self._version_key(), version={"S": version}),
+        )
+        return version
+
+    async def _stored_ids(self) -> set[str]:
+        """Read the ids of every rule in the table with a keys-only parallel scan."""
+        ids = set()
+
+        def on_page(page: dict) -> None:
+            ids.update(
+                i["id"]["S"] for i in page.get("Items", []) if self._is_rule_item(i)
+            )
+
+        await self._parallel_scan(on_page, ProjectionExpression="id, ptype")
+        return ids
+
+    @metrics.tracked
+    @versioned
+    async def save_policy(self, model: Model) -> bool:
+        """Save all policy rules to DynamoDB, only the changes in sync mode."""
+        stored_ids = await self._stored_ids() if self.save_mode == "sync" else None
+        await self._write_batches(self._save_requests(model, stored_ids))
+
+        return True
+
+    async def _domain_ids(self, domains: Iterable[str]) -> set[str]:
+        """Read the ids of every rule of the domains with domain-index queries."""
+        dynamodb = await self._get_db_handler()
+        ids = set()
+
+        async def read(request: dict) -> None:
+            async for page in self._paginate(dynamodb, "query", **request):
+                ids.update(item["id"]["S"] for item in page.get("Items", []))
+
+        requests = [
+            dict(request, ProjectionExpression="id")
+            for request in self._domain_requests(domains)
+        ]
+        await self._gather_limited(read, requests, self.scan_max_workers)
+        return ids
+
+    @metrics.tracked
+    async def load_domain_policy(self, model: Model, domains: Iterable[str]) -> None:
+        """load the rules of the domains, see Adapter"""
+        await self._load_requests(model, "query", self._domain_requests(list(domains)))
+        self._filtered = True
+
+    @metrics.tracked
+    @versioned
+    async def save_domain_policy(self, model: Model, domains: Iterable[str]) -> bool:
+        """store the model's rules of the domains, see Adapter"""
+        domains = set(domains)
+        stored_ids = await self._domain_ids(domains)
+        await self._write_batches(self._save_requests(model, stored_ids, domains))
+        return True
+
+    @metrics.tracked
+    @versioned
+    async def remove_domain_policy(self, domains: Iterable[str]) -> bool:
+        """removes every rule of the domains from the storage."""
+        await self._write_batches(
+            {"DeleteRequest": {"Key": {"id": {"S": item_id}}}}
+            for item_id in await self._domain_ids(list(domains))
+        )
+        return True
+
+    async def _batch_get_ids(self, request_items: dict) -> set[str]:
+        """Return the stored ids among the keys of one BatchGetItem request."""
+        dynamodb = await self._get_db_handler()
+        ids = set()
+
+        for attempt in range(self.write_max_attempts):
+            if attempt:
+                await asyncio.sleep(self._backoff(attempt))
+
+            response = await dynamodb.batch_get_item(RequestItems=request_items)
+            ids.update(
+                item["id"]["S"]
+                for item in response.get("Responses", {}).get(self.table_name, [])
+            )
+            request_items = response.get("UnprocessedKeys", {})
+
+            if not request_items:
+                return ids
+
+        raise UnprocessedKeysError(request_items)
+
+    async def _stored_among(self, ids: list[str]) -> set[str]:
+        if len(ids) == 1:
+            dynamodb = await self._get_db_handler()
+            response = await dynamodb.get_item(
+                TableName=self.table_name,
+                Key={"id": {"S": ids[0]}},
+                ProjectionExpression="id",
+            )
+            return set(ids) if "Item" in response else set()
+
+        found = await self._gather_limited(
+            self._batch_get_ids, self._batch_get_requests(ids), self.scan_max_workers
+        )
+        return set().union(*found)
+
+    @metrics.tracked
+    async def has_rules(self, rules: Iterable[tuple[str, Iterable]]) -> list[bool]:
+        """tell for each (ptype, rule) pair whether the rule is stored, see Adapter"""
+        rule_ids, known = self._cached_lookups(rules)
+        missing = list(
+            dict.fromkeys(
+                item_id for ids in rule_ids for item_id in ids if item_id not in known
+            )
+        )
+
+        if missing:
+            found = await self._stored_among(missing)
+            stored = {item_id: item_id in found for item_id in missing}
+            self._remember_lookups(stored)
+            known.update(stored)
+
+        return [any(known[item_id] for item_id in ids) for ids in rule_ids]
+
+    async def has_rule(self, ptype: str, rule: Iterable) -> bool:
+        """tell whether a single rule is stored, see Adapter"""
+        return (await self.has_rules([(ptype, rule)]))[0]
+
+    @metrics.tracked
+    @versioned
+    async def add_policy(self, _: str, ptype: str, rule: Iterable) -> bool:
+        """adds a single policy rule to the storage."""
+        dynamodb = await self._get_db_handler()
+        item = self.convert_to_item(ptype, rule)
+
+        with self._writing([{"PutRequest": {"Item": item}}]):
+            await dynamodb.put_item(TableName=self.table_name, Item=item)
+
+        return True
+
+    @metrics.tracked
+    @versioned
+    async def remove_policy(self, _: str, ptype: str, rule: Iterable) -> bool:
+        """removes a single policy rule from the storage."""
+        dynamodb = await self._get_db_handler()
+
+        for item_id in self._rule_ids(ptype, rule):
+            key = {"id": {"S": item_id}}
+
+            with self._writing([{"DeleteRequest": {"Key": key}}]):
+                await dynamodb.delete_item(TableName=self.table_name, Key=key)
+
+        return True
+
+    @metrics.tracked
+    @versioned
+    async def add_policies(self, _: str, ptype: str, rules: Iterable[Iterable]) -> bool:
+        """adds policy rules to the storage in batches."""
+        await self._write_batches(
+            {"PutRequest": {"Item": self.convert_to_item(ptype, rule)}}
+            for rule in rules
+        )
+        return True
+
+    @metrics.tracked
+    @versioned
+    async def remove_policies(
+        self, _: str, ptype: str, rules: Iterable[Iterable]
+    ) -> bool:
+        """removes policy rules from the storage in batches."""
+        await self._write_batches(
+            {"DeleteRequest": {"Key": {"id": {"S": item_id}}}}
+            for rule in rules
+            for item_id in self._rule_ids(ptype, rule)
+        )
+        return True
+
+    @metrics.tracked
+    @versioned
+    async def remove_filtered_policy(
+        self, _: str, ptype: str, field_index: int, *field_values: str
+    ) -> bool:
+        """Removes policy rules that match the filter from the storage."""
+        if not (0 <= field_index <= 5):
+            return False
+        if not (1 <= field_index + len(field_values) <= 6):
+            return False
+
+        matched_rules = await self.get_filtered_item(
+            ptype, list(field_values), field_index
+        )
+        await self._write_batches(
+            {"DeleteRequest": {"Key": {"id": rule["id"]}}} for rule in matched_rules
+        )
+        return True
+
+    @metrics.tracked
+    @versioned
+    async def update_policy(
+        self, sec: str, ptype: str, old_rule: Iterable, new_rule: Iterable
+    ) -> bool:
+        """updates a policy rule in a single transaction."""
+        await self._transact_write(self._update_groups(ptype, [old_rule], [new_rule]))
+        return True
+
+    @metrics.tracked
+    @versioned
+    async def update_policies(
+        self,
+        sec: str,
+        ptype: str,
+        old_rules: Iterable[Iterable],
+        new_rules: Iterable[Iterable],
+    ) -> bool:
+        """updates policy rules in TRANSACT_WRITE_SIZE transactions."""
+        old_rules = list(old_rules)
+        new_rules = list(new_rules)
+
+        if len(old_rules) != len(new_rules):
+            return False
+
+        await self._transact_write(self._update_groups(ptype, old_rules, new_rules))
+        return True
+
+    @metrics.tracked
+    @versioned
+    async def update_filtered_policies(
+        self,
+        sec: str,
+        ptype: str,
+        new_rules: Iterable[Iterable],
+        field_index: int,
+        *field_values: str,
+    ) -> list[list[str]]:
+        """replaces the rules that match the filter with new_rules and returns the old rules."""
+        old_rules = [
+            self.get_rule_from_item(item)
+            for item in await self.get_filtered_item(
+                ptype, list(field_values), field_index
+            )
+        ]
+        await self._transact_write(
+            self._update_groups(ptype, old_rules, list(new_rules))
+        )
+        return old_rules
@@ -0,0 +1,685 @@
+import contextvars
+import json
+import threading
+import time
+import uuid
+import zlib
+from typing import Any, Callable, Iterable, Iterator
+
+from casbin import Model, persist
+from casbin.persist.adapter_filtered import FilteredAdapter
+
+from python_dycasbin import metrics
+from python_dycasbin.adapter import (
+    VERSION_ITEM_ID,
+    Adapter,
+    BaseAdapter,
+    Filter,
+    versioned,
+)
+
+
+class BucketConflictError(Exception):
+    """Raised when a bucket kept changing under an update until the last retry."""
+
+    def __init__(self, bucket_id: str) -> None:
+        super().__init__("bucket {} kept changing, update abandoned".format(bucket_id))
+        self.bucket_id = bucket_id
+
+
+class BucketedAdapter(
+    BaseAdapter, persist.BatchAdapter, persist.UpdateAdapter, FilteredAdapter
+):
+    """DynamoDB adopter for casbin storing the rules packed by (ptype, v0) bucket
+
+    Every rule sharing a ptype and v0 is kept in one item, as a zlib compressed
+    JSON list of the remaining fields, and a bucket is split over several items
+    (chunks) when it grows past BUCKET_CHUNK_BYTES. A full load reads a few dense
+    items instead of one item per rule, and the rules of a subject are one Query.
+
+    Writes rewrite the chunks of the buckets they touch in one transaction, guarded
+    by a per-bucket stamp so that concurrent writers retry instead of overwriting
+    each other. Changes spanning several buckets are atomic per bucket only.
+
+    The table uses its own key schema (bucket_id, chunk_no) and cannot be shared
+    with Adapter, see pack_table and unpack_table to convert a table between the
+    two layouts. Only the methods that fit the packed layout are provided: there
+    are no per-rule items (get_filtered_item) and no domain index (the domain
+    methods), and StreamWatcher expects the per-rule layout.
+
+    Args:
+        table_name: Dynamodb table name
+        Other arguments: see Adapter
+    """
+
+    def __init__(self, table_name: str = "casbin_rule_packed", **kwargs: Any) -> None:
+        self.BUCKET_CHUNK_BYTES = 350_000  # below the 400 KB item size limit
+        self.TRANSACT_WRITE_BYTES = 4_000_000  # dynamodb transaction size limit
+
+        if kwargs.get("table_domain_fields"):
+            raise ValueError("BucketedAdapter does not support table_domain_fields")
+
+        super().__init__(table_name, **kwargs)
+
+    def _default_table_definition(self, table_name: str, billing_mode: str) -> dict:
+        """create_table arguments of the packed table, keyed by bucket and chunk"""
+        return {
+            "TableName": table_name,
+            "BillingMode": billing_mode,
+            "KeySchema": [
+                {"AttributeName": "bucket_id", "KeyType": "HASH"},
+                {"AttributeName": "chunk_no", "KeyType": "RANGE"},
+            ],
+            "AttributeDefinitions": [
+                {"AttributeName": "bucket_id", "AttributeType": "S"},
+                {"AttributeName": "chunk_no", "AttributeType": "N"},
+            ],
+        }
+
+    def _request_key(self, request: dict) -> Any:
+        if "PutRequest" in request:
+            item = request["PutRequest"]["Item"]
+        else:
+            item = request["DeleteRequest"]["Key"]
+
+        return item["bucket_id"]["S"], item["chunk_no"]["N"]
+
+    def _is_rule_item(self, item: dict[str, Any]) -> bool:
+        return "packed_rules" in item
+
+    def _version_key(self) -> dict[str, dict]:
+        return {"bucket_id": {"S": VERSION_ITEM_ID}, "chunk_no": {"N": "0"}}
+
+    def get_bucket_id(self, ptype: str, v0: str) -> str:
+        """return the partition key of the bucket holding the rules of ptype and v0"""
+        return json.dumps([ptype, v0], separators=(",", ":"))
+
+    def encode_bucket(self, bucket_id: str, rules: Iterable[list[str]]) -> list[dict]:
+        """pack the rules of a bucket, without their ptype and v0, into chunk items"""
+        stamp = uuid.uuid4().hex
+        chunks = []
+        encoded = []
+        size = 0
+
+        for rule in rules:
+            field = json.dumps(rule, separators=(",", ":"))
+
+            if encoded and size + len(field) > self.BUCKET_CHUNK_BYTES:
+                chunks.append(encoded)
+                encoded = []
+                size = 0
+
+            encoded.append(field)
+            size += len(field) + 1
+
+        if encoded:
+            chunks.append(encoded)
+
+        return [
+            {
+                "bucket_id": {"S": bucket_id},
+                "chunk_no": {"N": str(i)},
+                "stamp": {"S": stamp},
+                "packed_rules": {
+                    "B": zlib.compress("[{}]".format(",".join(chunk)).encode("utf-8"))
+                },
+            }
+            for i, chunk in enumerate(chunks)
+        ]
+
+    def decode_item(self, item: dict) -> tuple[str, list[list[str]]]:
+        """return the ptype and full rules stored in a chunk item"""
+        ptype, v0 = json.loads(item["bucket_id"]["S"])
+        packed = item["packed_rules"]["B"]
+        rules = json.loads(zlib.decompress(packed).decode("utf-8"))
+        return ptype, [[v0, *rule] for rule in rules]
+
+    def _group_rules(
+        self, ptype: str, rules: Iterable[Iterable[str]]
+    ) -> dict[str, list[list[str]]]:
+        """Split the rules of ptype into the tails stored by each bucket."""
+        buckets = {}
+
+        for rule in rules:
+            rule = list(rule)
+
+            if not rule:
+                raise ValueError(
+                    "an empty {} rule has no v0 to be bucketed by".format(ptype)
+                )
+
+            buckets.setdefault(self.get_bucket_id(ptype, rule[0]), []).append(rule[1:])
+
+        return buckets
+
+    def _read_bucket(self, bucket_id: str) -> list[dict]:
+        """Read every chunk of a bucket with a consistent Query, in chunk order."""
+        dynamodb = self._get_db_handler()
+        items = []
+
+        for page in self._paginate(
+            dynamodb,
+            "query",
+            TableName=self.table_name,
+            KeyConditionExpression="bucket_id = :bucket_id",
+            ExpressionAttributeValues={":bucket_id": {"S": bucket_id}},
+            ConsistentRead=True,
+        ):
+            items.extend(page.get("Items", []))
+
+        return sorted(items, key=lambda item: int(item["chunk_no"]["N"]))
+
+    def _bucket_transaction(
+        self, bucket_id: str, old_items: list[dict], rules: list[list[str]]
+    ) -> list[dict]:
+        """Transact items replacing the chunks of a bucket with rules.
+
+        The first write is conditioned on the stamp read with old_items, so the
+        transaction fails if the bucket changed in between.
+        """
+        new_items = self.encode_bucket(bucket_id, rules)
+        transaction = [
+            {"Put": {"TableName": self.table_name, "Item": item}} for item in new_items
+        ] + [
+            {
+                "Delete": {
+                    "TableName": self.table_name,
+                    "Key": {
+                        "bucket_id": item["bucket_id"],
+                        "chunk_no": item["chunk_no"],
+                    },
+                }
+            }
+            for item in old_items[len(new_items) :]
+        ]
+
+        if not transaction:
+            return []
+
+        if old_items:
+            transaction[0][next(iter(transaction[0]))].update(
+                ConditionExpression="stamp = :stamp",
+                ExpressionAttributeValues={":stamp": old_items[0]["stamp"]},
+            )
+        else:
+            transaction[0]["Put"]["ConditionExpression"] = (
+                "attribute_not_exists(bucket_id)"
+            )
+
+        size = sum(len(item["packed_rules"]["B"]) for item in new_items)
+
+        if (
+            len(transaction) > self.TRANSACT_WRITE_SIZE
+            or size > self.TRANSACT_WRITE_BYTES
+        ):
+            raise ValueError("bucket {} is too large to update".format(bucket_id))
+
+        return transaction
+
+    def _update_bucket(
+        self, bucket_id: str, change: Callable[[list[list[str]]], list[list[str]]]
+    ) -> list[list[str]]:
+        """Apply change to the rule tails of a bucket with optimistic concurrency.
+
+        change receives the stored tails and returns the new ones. The bucket is read
+        again and the change reapplied when another writer got in first, up to
+        write_max_attempts times. Returns the tails the bucket held before.
+        """
+        dynamodb = self._get_db_handler()
+
+        for attempt in range(self.write_max_attempts):
+            if attempt:
+                time.sleep(self._backoff(attempt))
+
+            old_items = self._read_bucket(bucket_id)
+            old_rules = [
+                rule[1:] for item in old_items for rule in self.decode_item(item)[1]
+            ]
+            new_rules = []
+            seen = set()
+
+            for rule in change(old_rules):
+                if tuple(rule) not in seen:
+                    seen.add(tuple(rule))
+                    new_rules.append(rule)
+
+            if new_rules == old_rules:
+                return old_rules
+
+            transaction = self._bucket_transaction(bucket_id, old_items, new_rules)
+
+            try:
+                dynamodb.transact_write_items(TransactItems=transaction)
+                return old_rules
+            except dynamodb.exceptions.TransactionCanceledException:
+                continue
+
+        raise BucketConflictError(bucket_id)
+
+    def _update_buckets(
+        self, changes: dict[str, Callable[[list[list[str]]], list[list[str]]]]
+    ) -> dict[str, list[list[str]]]:
+        """Update several buckets concurrently, return the tails each held before."""
+        bucket_ids = list(changes)
+        old_rules = self._map_concurrently(
+            lambda bucket_id: self._update_bucket(bucket_id, changes[bucket_id]),
+            bucket_ids,
+            self.write_max_workers,
+        )
+        return dict(zip(bucket_ids, old_rules, strict=True))
+
+    def _change_rules(
+        self,
+        ptype: str,
+        added: Iterable[Iterable[str]] = (),
+        removed: Iterable[Iterable[str]] = (),
+    ) -> None:
+        """Add and remove rules of ptype, touching each bucket once."""
+        added = self._group_rules(ptype, added)
+        removed = self._group_rules(ptype, removed)
+
+        def change_for(bucket_id: str) -> Callable:
+            removed_rules = {tuple(rule) for rule in removed.get(bucket_id, [])}
+            added_rules = added.get(bucket_id, [])
+
+            def change(rules: list[list[str]]) -> list[list[str]]:
+                return [
+                    rule for rule in rules if tuple(rule) not in removed_rules
+                ] + added_rules
+
+            return change
+
+        self._update_buckets(
+            {bucket_id: change_for(bucket_id) for bucket_id in {*added, *removed}}
+        )
+
+    def _scan_rules(self, on_rules: Callable[[str, list[list[str]]], None]) -> None:
+        """Parallel scan of the table, handing the rules of every chunk to on_rules."""
+
+        def on_page(page: dict) -> None:
+            for item in page.get("Items", []):
+                if self._is_rule_item(item):
+                    on_rules(*self.decode_item(item))
+
+        self._parallel_scan(on_page)
+
+    @metrics.tracked
+    def load_policy(self, model: Model) -> None:
+        """load all policies from database with a parallel scan of the buckets"""
+        strings = self._interning_table()
+        self._scan_rules(
+            lambda ptype, rules: self._add_rules(model, ptype, rules, strings)
+        )
+        self._filtered = False
+
+    def _rule_filter(self, filter: Any) -> Callable[[str, list[str]], bool]:
+        ptypes = set(getattr(filter, "ptype", None) or [])
+        fields = {
+            i: set(values)
+            for i in range(6)
+            if (values := getattr(filter, "v{}".format(i), None))
+        }
+
+        def matches(ptype: str, rule: list[str]) -> bool:
+            return (not ptypes or ptype in ptypes) and all(
+                i < len(rule) and rule[i] in values for i, values in fields.items()
+            )
+
+        return matches
+
+    def _load_matching(self, model: Model, filter: Any) -> None:
+        """Load the rules matching filter, by bucket when v0 is given, else by scan."""
+        matches = self._rule_filter(filter)
+        strings = self._interning_table()
+
+        def on_rules(ptype: str, rules: list[list[str]]) -> None:
+            self._add_rules(
+                model, ptype, [rule for rule in rules if matches(ptype, rule)], strings
+            )
+
+        subjects = list(getattr(filter, "v0", None) or [])
+
+        if not subjects:
+            self._scan_rules(on_rules)
+            return
+
+        ptypes = list(getattr(filter, "ptype", None) or [])
+
+        if not ptypes:
+            ptypes = [
+                ptype
+                for sec in ["p", "g"]
+                if sec in model.model
+                for ptype in model.model[sec]
+            ]
+
+        lock = threading.Lock()
+
+        def load(bucket_id: str) -> None:
+            items = self._read_bucket(bucket_id)
+
+            with lock:
+                for item in items:
+                    on_rules(*self.decode_item(item))
+
+        self._map_concurrently(
+            load,
+            [self.get_bucket_id(p, v0) for p in ptypes for v0 in subjects],
+            self.scan_max_workers,
+        )
+
+    @metrics.tracked
+    def load_filtered_policy(self, model: Model, filter: Any) -> None:
+        """load the policies that match the filter, see Adapter.load_filtered_policy
+
+        Filters on v0 read only the matching buckets, other filters scan the table.
+        """
+        if filter is None:
+            self.load_policy(model)
+            return
+
+        self._load_matching(model, filter)
+        self._filtered = True
+
+    @metrics.tracked
+    def load_filtered_policy_by_sub(self, model: Model, sub: str) -> None:
+        self._load_matching(model, Filter(v0=[sub]))
+
+    @metrics.tracked
+    def load_filtered_policy_by_obj(self, model: Model, obj: str) -> None:
+        self._load_matching(model, Filter(v1=[obj]))
+
+    def iter_policies(
+        self,
+        ptype: str | None = None,
+        filter: Any = None,
+        page_size: int | None = None,
+    ) -> Iterator[tuple[str, list[str]]]:
+        """Yield the stored (ptype, values) rules page by page, see Adapter.iter_policies
+
+        The table is scanned whatever the filter, page_size counts chunk items.
+        """
+        dynamodb = self._get_db_handler()
+        matches = self._rule_filter(filter)
+        request = {"TableName": self.table_name}
+        context = contextvars.copy_context()
+
+        if context.get(metrics.current_caller) is None:
+            context.run(metrics.current_caller.set, "iter_policies")
+
+        if page_size is not None:
+            request["Limit"] = page_size
+
+        while True:
+            page = context.run(dynamodb.scan, **request)
+
+            for item in page.get("Items", []):
+                if not self._is_rule_item(item):
+                    continue
+
+                item_ptype, rules = self.decode_item(item)
+
+                if ptype is None or item_ptype == ptype:
+                    for rule in rules:
+                        if matches(item_ptype, rule):
+                            yield item_ptype, rule
+
+            if "LastEvaluatedKey" not in page:
+                return
+
+            request["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+    @metrics.tracked
+    def has_rules(self, rules: Iterable[tuple[str, Iterable]]) -> list[bool]:
+        """Tell for each (ptype, rule) pair whether the rule is stored, see Adapter.has_rules
+
+        Every bucket involved is read once with a consistent Query, the lookup cache
+        is not used. Empty rules cannot be stored and are never found.
+        """
+        rules = [(ptype, list(rule)) for ptype, rule in rules]
+        bucket_ids = list(
+            dict.fromkeys(
+                self.get_bucket_id(ptype, rule[0]) for ptype, rule in rules if rule
+            )
+        )
+
+        def read(bucket_id: str) -> set[tuple]:
+            return {
+                tuple(rule)
+                for item in self._read_bucket(bucket_id)
+                for rule in self.decode_item(item)[1]
+            }
+
+        stored = dict(
+            zip(
+                bucket_ids,
+                self._map_concurrently(read, bucket_ids, self.scan_max_workers),
+                strict=True,
+            )
+        )
+        return [
+            bool(rule) and tuple(rule) in stored[self.get_bucket_id(ptype, rule[0])]
+            for ptype, rule in rules
+        ]
+
+    def has_rule(self, ptype: str, rule: Iterable) -> bool:
+        """tell whether a single rule is stored, see has_rules"""
+        return self.has_rules([(ptype, rule)])[0]
+
+    def _stored_rules(self) -> list[tuple[str, list[str]]]:
+        """Read (ptype, rule) for every stored rule."""
+        collected = []
+        self._scan_rules(
+            lambda ptype, rules: collected.extend((ptype, rule) for rule in rules)
+        )
+        return collected
+
+    def _put_buckets(self, buckets: dict[str, list[list[str]]]) -> set[tuple]:
+        """Write fresh chunk items for buckets, return the keys written."""
+        requests = [
+            {"PutRequest": {"Item": item}}
+            for bucket_id, rules in buckets.items()
+            for item in self.encode_bucket(bucket_id, rules)
+        ]
+        self._write_batches(requests)
+        return {self._request_key(request) for request in requests}
+
+    @metrics.tracked
+    @versioned
+    def save_policy(self, model: Model) -> bool:
+        """Replace the stored policy with the model's, deleting the chunks it no longer uses."""
+        buckets = {}
+
+        for sec in ["p", "g"]:
+            if sec not in model.model:
+                continue
+
+            for ptype, ast in model.model[sec].items():
+                for bucket_id, rules in self._group_rules(ptype, ast.policy).items():
+                    buckets.setdefault(bucket_id, []).extend(rules)
+
+        stored = set()
+
+        def on_page(page: dict) -> None:
+            for item in page.get("Items", []):
+                # the version marker is shared with the other adapters of the table
+                if item["bucket_id"]["S"] != VERSION_ITEM_ID:
+                    stored.add((item["bucket_id"]["S"], item["chunk_no"]["N"]))
+
+        self._parallel_scan(on_page, ProjectionExpression="bucket_id, chunk_no")
+        written = self._put_buckets(buckets)
+        self._write_batches(
+            {
+                "DeleteRequest": {
+                    "Key": {"bucket_id": {"S": bucket_id}, "chunk_no": {"N": chunk_no}}
+                }
+            }
+            for bucket_id, chunk_no in stored - written
+        )
+        return True
+
+    @metrics.tracked
+    @versioned
+    def add_policy(self, sec: str, ptype: str, rule: Iterable) -> bool:
+        """adds a single policy rule to the storage."""
+        self._change_rules(ptype, added=[rule])
+        return True
+
+    @metrics.tracked
+    @versioned
+    def remove_policy(self, sec: str, ptype: str, rule: Iterable) -> bool:
+        """removes a single policy rule from the storage."""
+        self._change_rules(ptype, removed=[rule])
+        return True
+
+    @metrics.tracked
+    @versioned
+    def add_policies(self, sec: str, ptype: str, rules: Iterable[Iterable]) -> bool:
+        """adds policy rules to the storage, one transaction per bucket."""
+        self._change_rules(ptype, added=rules)
+        return True
+
+    @metrics.tracked
+    @versioned
+    def remove_policies(self, sec: str, ptype: str, rules: Iterable[Iterable]) -> bool:
+        """removes policy rules from the storage, one transaction per bucket."""
+        self._change_rules(ptype, removed=rules)
+        return True
+
+    def _remove_matching(
+        self, ptype: str, field_index: int, field_values: Iterable[str]
+    ) -> list[list[str]]:
+        """Remove the rules of ptype matching the filter and return them."""
+        fields = {
+            i: value
+            for i, value in enumerate(field_values, start=field_index)
+            if value != ""
+        }
+
+        def matches(rule: list[str]) -> bool:
+            return all(i < len(rule) and rule[i] == v for i, v in fields.items())
+
+        if 0 in fields:
+            bucket_ids = [self.get_bucket_id(ptype, fields[0])]
+        else:
+            found = set()
+
+            def on_rules(rule_ptype: str, rules: list[list[str]]) -> None:
+                for rule in rules:
+                    if rule_ptype == ptype and rule and matches(rule):
+                        found.add(self.get_bucket_id(ptype, rule[0]))
+
+            self._scan_rules(on_rules)
+            bucket_ids = sorted(found)
+
+        def change_for(bucket_id: str) -> Callable:
+            v0 = json.loads(bucket_id)[1]
+
+            def change(rules: list[list[str]]) -> list[list[str]]:
+                return [rule for rule in rules if not matches([v0, *rule])]
+
+            return change
+
+        old = self._update_buckets({b: change_for(b) for b in bucket_ids})
+        removed = []
+
+        for bucket_id, rules in old.items():
+            v0 = json.loads(bucket_id)[1]
+            removed.extend([v0, *rule] for rule in rules if matches([v0, *rule]))
+
+        return removed
+
+    @metrics.tracked
+    @versioned
+    def remove_filtered_policy(
+        self, sec: str, ptype: str, field_index: int, *field_values: str
+    ) -> bool:
+        """Removes policy rules that match the filter from the storage."""
+        if not (0 <= field_index <= 5):
+            return False
+        if not (1 <= field_index + len(field_values) <= 6):
+            return False
+
+        self._remove_matching(ptype, field_index, field_values)
+        return True
+
+    @metrics.tracked
+    @versioned
+    def update_policy(
+        self, sec: str, ptype: str, old_rule: Iterable, new_rule: Iterable
+    ) -> bool:
+        """updates a policy rule, atomically when both rules share a bucket."""
+        self._change_rules(ptype, added=[new_rule], removed=[old_rule])
+        return True
+
+    @metrics.tracked
+    @versioned
+    def update_policies(
+        self,
+        sec: str,
+        ptype: str,
+        old_rules: Iterable[Iterable],
+        new_rules: Iterable[Iterable],
+    ) -> bool:
+        """updates policy rules, one transaction per bucket."""
+        old_rules = list(old_rules)
+        new_rules = list(new_rules)
+
+        if len(old_rules) != len(new_rules):
+            return False
+
+        self._change_rules(ptype, added=new_rules, removed=old_rules)
+        return True
+
+    @metrics.tracked
+    @versioned
+    def update_filtered_policies(
+        self,
+        sec: str,
+        ptype: str,
+        new_rules: Iterable[Iterable],
+        field_index: int,
+        *field_values: str,
+    ) -> list[list[str]]:
+        """replaces the rules that match the filter with new_rules and returns the old rules."""
+        old_rules = self._remove_matching(ptype, field_index, field_values)
+        self._change_rules(ptype, added=new_rules)
+        return old_rules
+
+
+def pack_table(source: Adapter, target: BucketedAdapter) -> int:
+    """Copy every rule of a per-rule table into a packed table, return the rule count."""
+    buckets = {}
+    count = 0
+
+    def on_page(page: dict) -> None:
+        nonlocal count
+
+        for item in page.get("Items", []):
+            if not source._is_rule_item(item):
+                continue
+
+            rule = source.get_rule_from_item(item)
+
+            for bucket_id, tails in target._group_rules(
+                item["ptype"]["S"], [rule]
+            ).items():
+                buckets.setdefault(bucket_id, []).extend(tails)
+
+            count += 1
+
+    source._parallel_scan(on_page)
+    target._put_buckets(buckets)
+    target._table_changed()
+    return count
+
+
+def unpack_table(source: BucketedAdapter, target: Adapter) -> int:
+    """Copy every rule of a packed table into a per-rule table, return the rule count."""
+    requests = [
+        {"PutRequest": {"Item": target.convert_to_item(ptype, rule)}}
+        for ptype, rule in source._stored_rules()
+    ]
+    target._write_batches(requests)
+    target._table_changed()
+    return len(requests)
@@ -0,0 +1,253 @@
+import atexit
+import logging
+import threading
+from typing import Any, Iterable
+
+from casbin import Model, persist
+
+from python_dycasbin import metrics
+from python_dycasbin.adapter import Adapter
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindAdapter(persist.BatchAdapter, persist.UpdateAdapter):
+    """Wrap an Adapter so rule adds and removes are written behind in batches
+
+    add_policy, add_policies, remove_policy and remove_policies only queue write
+    requests, keyed by item id so the last request for an id wins. Removing a rule
+    whose add is still queued drops both: casbin only adds rules missing from the
+    model, so such a rule was never stored, unless the add replaced a queued remove,
+    in which case the remove is kept. A background thread writes the queue
+    through the adapter's batch writes once flush_max_items requests are queued or
+    flush_interval seconds have passed, and flush writes it immediately. Loads,
+    saves, filtered removes and updates flush first, so they see every queued
+    write. The queue is flushed when the wrapper is closed or the interpreter exits.
+
+    A queued write is lost if the process dies before it is flushed. A background
+    flush that fails is logged and its requests are queued again for the next one.
+
+    Args:
+        adapter: The wrapped Adapter
+        flush_max_items: (Optional) Queued requests that trigger a flush
+        flush_interval: (Optional) Seconds a request may wait before it is flushed
+        start: (Optional) Start the flush thread immediately
+    """
+
+    def __init__(
+        self,
+        adapter: Adapter,
+        *,
+        flush_max_items: int = 100,
+        flush_interval: float = 0.5,
+        start: bool = True,
+    ) -> None:
+        self.adapter = adapter
+        self.flush_max_items = max(1, flush_max_items)
+        self.flush_interval = flush_interval
+        self._pending: dict[str, dict] = {}
+        # ids whose queued put replaced a queued delete, the rule may still be stored
+        self._replaced: set[str] = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        atexit.register(self.close)
+
+        if start:
+            self.start()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="dycasbin-write-behind", daemon=True
+        )
+        self._thread.start()
+
+    def close(self) -> None:
+        """Stop the flush thread and write everything still queued."""
+        self._stop.set()
+        self._wakeup.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        atexit.unregister(self.close)
+        # thread pools refuse new work once the interpreter is exiting
+        self._flush(max_workers=1)
+
+    def pending(self) -> int:
+        """return the number of queued write requests"""
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+
+            if self._stop.is_set():
+                return
+
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("writing queued policy changes failed")
+
+    def _queue(self, requests: Iterable[dict]) -> None:
+        with self._lock:
+            for request in requests:
+                item_id = self.adapter._request_key(request)
+                queued = self._pending.pop(item_id, None)
+
+                if "PutRequest" in request:
+                    if queued is not None and "DeleteRequest" in queued:
+                        self._replaced.add(item_id)
+                elif queued is not None and "PutRequest" in queued:
+                    if item_id not in self._replaced:
+                        continue
+
+                    self._replaced.discard(item_id)
+
+                self._pending[item_id] = request
+
+            full = len(self._pending) >= self.flush_max_items
+
+        if full:
+            self._wakeup.set()
+
+    def _flush(self, max_workers: int | None = None) -> int:
+        """Write the queued requests, queue them again if the write fails."""
+        with self._flush_lock:
+            with self._lock:
+                requests = self._pending
+                self._pending = {}
+                self._replaced = set()
+
+            if not requests:
+                return 0
+
+            try:
+                self.adapter._map_concurrently(
+                    self.adapter._write_batch,
+                    self.adapter._split_write_requests(requests.values()),
+                    max_workers or self.adapter.write_max_workers,
+                )
+            except BaseException:
+                with self._lock:
+                    # writes are idempotent, so everything is retried unless
+                    # a newer request for the same id was queued meanwhile; a failed
+                    # put may have been written, so a later remove must be kept
+                    self._replaced.update(
+                        item_id
+                        for item_id, request in requests.items()
+                        if "PutRequest" in request and item_id not in self._pending
+                    )
+                    requests.update(self._pending)
+                    self._pending = requests
+                raise
+            finally:
+                self.adapter._table_changed()
+
+            return len(requests)
+
+    @metrics.tracked
+    def flush(self) -> int:
+        """Write every queued request now and return how many were written."""
+        return self._flush()
+
+    @metrics.tracked
+    def add_policy(self, sec: str, ptype: str, rule: Iterable) -> bool:
+        """queues a single policy rule to be added."""
+        self._queue(
+            [{"PutRequest": {"Item": self.adapter.convert_to_item(ptype, rule)}}]
+        )
+        return True
+
+    @metrics.tracked
+    def add_policies(self, sec: str, ptype: str, rules: Iterable[Iterable]) -> bool:
+        """queues policy rules to be added."""
+        self._queue(
+            {"PutRequest": {"Item": self.adapter.convert_to_item(ptype, rule)}}
+            for rule in rules
+        )
+        return True
+
+    @metrics.tracked
+    def remove_policy(self, sec: str, ptype: str, rule: Iterable) -> bool:
+        """queues a single policy rule to be removed."""
+        return self.remove_policies(sec, ptype, [rule])
+
+    @metrics.tracked
+    def remove_policies(self, sec: str, ptype: str, rules: Iterable[Iterable]) -> bool:
+        """queues policy rules to be removed."""
+        self._queue(
+            {"DeleteRequest": {"Key": {"id": {"S": item_id}}}}
+            for rule in rules
+            for item_id in self.adapter._rule_ids(ptype, rule)
+        )
+        return True
+
+    @metrics.tracked
+    def load_policy(self, model: Model) -> None:
+        self.flush()
+        self.adapter.load_policy(model)
+
+    @metrics.tracked
+    def load_filtered_policy(self, model: Model, filter: Any) -> None:
+        self.flush()
+        self.adapter.load_filtered_policy(model, filter)
+
+    def is_filtered(self) -> bool:
+        return self.adapter.is_filtered()
+
+    @metrics.tracked
+    def save_policy(self, model: Model) -> bool:
+        self.flush()
+        return self.adapter.save_policy(model)
+
+    @metrics.tracked
+    def remove_filtered_policy(
+        self, sec: str, ptype: str, field_index: int, *field_values: str
+    ) -> Any:
+        self.flush()
+        return self.adapter.remove_filtered_policy(
+            sec, ptype, field_index, *field_values
+        )
+
+    @metrics.tracked
+    def update_policy(
+        self, sec: str, ptype: str, old_rule: Iterable, new_rule: Iterable
+    ) -> Any:
+        self.flush()
+        return self.adapter.update_policy(sec, ptype, old_rule, new_rule)
+
+    @metrics.tracked
+    def update_policies(
+        self,
+        sec: str,
+        ptype: str,
+        old_rules: Iterable[Iterable],
+        new_rules: Iterable[Iterable],
+    ) -> Any:
+        self.flush()
+        return self.adapter.update_policies(sec, ptype, old_rules, new_rules)
+
+    @metrics.tracked
+    def update_filtered_policies(
+        self,
+        sec: str,
+        ptype: str,
+        new_rules: Iterable[Iterable],
+        field_index: int,
+        *field_values: str,
+    ) -> Any:
+        self.flush()
+        return self.adapter.update_filtered_policies(
+            sec, ptype, new_rules, field_index, *field_values
+        )
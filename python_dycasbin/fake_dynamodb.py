@@ -0,0 +1,552 @@
+"""In-process stand-in for the DynamoDB client calls made by the adapter.
+
+Implements just enough of the low-level client API (tables, GSIs, scans with
+segments, queries, batch and transactional writes, pagination at 1 MB and
+ConsumedCapacity) to run the adapter without a network. An optional latency is
+slept on every call to model round trips. Shared by the tests and the benchmarks.
+"""
+
+import math
+import re
+import threading
+import time
+import zlib
+from typing import Any
+
+PAGE_BYTES = 1024 * 1024
+
+
+class ClientError(Exception):
+    def __init__(self, code: str, message: str = "") -> None:
+        super().__init__("{}: {}".format(code, message))
+        self.response = {"Error": {"Code": code, "Message": message}}
+
+
+class ResourceInUseException(ClientError):
+    def __init__(self, message: str = "") -> None:
+        super().__init__("ResourceInUseException", message)
+
+
+class ResourceNotFoundException(ClientError):
+    def __init__(self, message: str = "") -> None:
+        super().__init__("ResourceNotFoundException", message)
+
+
+class ConditionalCheckFailedException(ClientError):
+    def __init__(self, message: str = "") -> None:
+        super().__init__("ConditionalCheckFailedException", message)
+
+
+class TransactionCanceledException(ClientError):
+    def __init__(self, message: str = "") -> None:
+        super().__init__("TransactionCanceledException", message)
+
+
+class FakeExceptions:
+    ClientError = ClientError
+    ResourceInUseException = ResourceInUseException
+    ResourceNotFoundException = ResourceNotFoundException
+    ConditionalCheckFailedException = ConditionalCheckFailedException
+    TransactionCanceledException = TransactionCanceledException
+
+
+def item_size(item: dict) -> int:
+    """Approximate DynamoDB item size: attribute names plus string values."""
+    size = 0
+
+    for name, value in item.items():
+        size += len(name)
+
+        for typed in value.values():
+            size += len(typed) if isinstance(typed, (str, bytes)) else 8
+
+    return size
+
+
+def _read_units(size: int, consistent: bool = False) -> float:
+    units = math.ceil(size / 4096) or 1
+    return units if consistent else units / 2
+
+
+def _write_units(size: int) -> float:
+    return math.ceil(size / 1024) or 1
+
+
+_CONDITION = re.compile(r"^\s*(\w+)\s*(=|IN)\s*(.+?)\s*$")
+_EXISTS = re.compile(r"^\s*(attribute_exists|attribute_not_exists)\((\w+)\)\s*$")
+
+
+def _value(attribute: dict) -> Any:
+    return next(iter(attribute.values()))
+
+
+def _conditions(expression: str | None, values: dict) -> list[tuple[str, str, set]]:
+    """Parse 'a = :x and b IN (:y, :z) and attribute_not_exists(c)' into
+    [(name, operator, accepted values)]."""
+    if not expression:
+        return []
+
+    conditions = []
+
+    for part in re.split(r"\s+and\s+", expression, flags=re.IGNORECASE):
+        exists = _EXISTS.match(part)
+
+        if exists is not None:
+            conditions.append((exists.group(2), exists.group(1), set()))
+            continue
+
+        match = _CONDITION.match(part)
+
+        if match is None:
+            raise ClientError("ValidationException", "unsupported: " + part)
+
+        name, operator, operand = match.groups()
+
+        if operator == "=":
+            accepted = {_value(values[operand])}
+        else:
+            placeholders = operand.strip("()").split(",")
+            accepted = {_value(values[p.strip()]) for p in placeholders}
+
+        conditions.append((name, "in", accepted))
+
+    return conditions
+
+
+def _matches(item: dict | None, conditions: list[tuple[str, str, set]]) -> bool:
+    item = item or {}
+
+    for name, operator, accepted in conditions:
+        if operator == "attribute_exists":
+            matched = name in item
+        elif operator == "attribute_not_exists":
+            matched = name not in item
+        else:
+            matched = name in item and _value(item[name]) in accepted
+
+        if not matched:
+            return False
+
+    return True
+
+
+def _project(item: dict, projection: str | None) -> dict:
+    if not projection:
+        return item
+
+    names = [name.strip() for name in projection.split(",")]
+    return {name: item[name] for name in names if name in item}
+
+
+def _sort_value(attribute: dict) -> Any:
+    if "N" in attribute:
+        return float(attribute["N"])
+
+    return _value(attribute)
+
+
+class FakeTable:
+    def __init__(self, definition: dict) -> None:
+        self.definition = definition
+        self.key_names = [k["AttributeName"] for k in definition["KeySchema"]]
+        self.indexes = {
+            index["IndexName"]: [k["AttributeName"] for k in index["KeySchema"]]
+            for index in definition.get("GlobalSecondaryIndexes", [])
+        }
+        # the table itself is partitioned on its hash key, under the name None
+        self.indexes[None] = self.key_names
+        self.items: dict[tuple, dict] = {}
+        # index name -> partition key value -> item keys, so queries skip a full pass
+        self.partitions: dict[str | None, dict[Any, set[tuple]]] = {
+            name: {} for name in self.indexes
+        }
+        self._segments: dict[tuple[int, int], list[dict]] = {}
+
+    def key(self, item: dict) -> tuple:
+        """Primary key of an item or of a Key argument."""
+        return tuple(_value(item[name]) for name in self.key_names)
+
+    def key_attributes(self, item: dict) -> dict:
+        return {name: item[name] for name in self.key_names}
+
+    def segment(self, segment: int, total: int) -> list[dict]:
+        """Items of a scan segment, cached until the next write."""
+        if (segment, total) not in self._segments:
+            self._segments[(segment, total)] = [
+                item
+                for key, item in self.items.items()
+                if zlib.crc32(str(key[0]).encode()) % total == segment
+            ]
+
+        return self._segments[(segment, total)]
+
+    def put(self, item: dict) -> None:
+        key = self.key(item)
+        self.delete(key)
+        self._segments.clear()
+        self.items[key] = item
+
+        for name, keys in self.indexes.items():
+            # GSIs are sparse, items without every key attribute are not indexed
+            if all(k in item for k in keys):
+                partition = self.partitions[name].setdefault(
+                    _value(item[keys[0]]), set()
+                )
+                partition.add(key)
+
+    def delete(self, key: tuple) -> dict | None:
+        item = self.items.pop(key, None)
+
+        if item is not None:
+            self._segments.clear()
+
+            for name, keys in self.indexes.items():
+                if all(k in item for k in keys):
+                    self.partitions[name][_value(item[keys[0]])].discard(key)
+
+        return item
+
+
+class FakeDynamoDB:
+    """Fake low-level DynamoDB client
+
+    Args:
+        latency: Seconds slept on every call
+    """
+
+    exceptions = FakeExceptions
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.tables: dict[str, FakeTable] = {}
+        self.lock = threading.RLock()
+
+    def _call(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _table(self, name: str) -> FakeTable:
+        if name not in self.tables:
+            raise ResourceNotFoundException("table {} not found".format(name))
+
+        return self.tables[name]
+
+    def _consumed(
+        self, kwargs: dict, table: str, read: float = 0, write: float = 0
+    ) -> dict:
+        if kwargs.get("ReturnConsumedCapacity", "NONE") == "NONE":
+            return {}
+
+        return {
+            "ConsumedCapacity": {
+                "TableName": table,
+                "CapacityUnits": read + write,
+                "ReadCapacityUnits": read,
+                "WriteCapacityUnits": write,
+            }
+        }
+
+    def seed(self, table: str, items: list[dict]) -> None:
+        """Insert items directly, without latency or capacity accounting."""
+        with self.lock:
+            fake_table = self._table(table)
+
+            for item in items:
+                fake_table.put(item)
+
+    def create_table(self, **kwargs: Any) -> dict:
+        self._call()
+
+        with self.lock:
+            if kwargs["TableName"] in self.tables:
+                raise ResourceInUseException("table exists")
+
+            self.tables[kwargs["TableName"]] = FakeTable(kwargs)
+
+        return {"TableDescription": self._description(kwargs["TableName"])}
+
+    def _description(self, name: str) -> dict:
+        table = self._table(name)
+        return {
+            "TableName": name,
+            "TableStatus": "ACTIVE",
+            "ItemCount": len(table.items),
+            "KeySchema": table.definition["KeySchema"],
+            "BillingModeSummary": {
+                "BillingMode": table.definition.get("BillingMode", "PROVISIONED")
+            },
+            "ProvisionedThroughput": table.definition.get("ProvisionedThroughput", {}),
+            "GlobalSecondaryIndexes": [
+                dict(index, IndexStatus="ACTIVE")
+                for index in table.definition.get("GlobalSecondaryIndexes", [])
+            ],
+        }
+
+    def describe_table(self, **kwargs: Any) -> dict:
+        self._call()
+
+        with self.lock:
+            return {"Table": self._description(kwargs["TableName"])}
+
+    def delete_table(self, **kwargs: Any) -> dict:
+        self._call()
+
+        with self.lock:
+            self._table(kwargs["TableName"])
+            del self.tables[kwargs["TableName"]]
+
+        return {}
+
+    def _page(self, kwargs: dict, table: FakeTable, candidates: list[dict]) -> dict:
+        """Apply ExclusiveStartKey, Limit, the 1 MB page size and filters."""
+        start = kwargs.get("ExclusiveStartKey")
+        position = 0
+
+        if start is not None:
+            # pages end at the previous page's last item, resume right after it
+            start_key = table.key(start)
+            position = len(candidates)
+
+            for index, item in enumerate(candidates):
+                if table.key(item) == start_key:
+                    position = index + 1
+                    break
+
+        limit = kwargs.get("Limit")
+        conditions = _conditions(
+            kwargs.get("FilterExpression"), kwargs.get("ExpressionAttributeValues", {})
+        )
+        items = []
+        read_bytes = 0
+        evaluated = 0
+        last = None
+
+        for item in candidates[position:]:
+            if read_bytes >= PAGE_BYTES or (limit is not None and evaluated >= limit):
+                break
+
+            evaluated += 1
+            read_bytes += item_size(item)
+            last = item
+
+            if _matches(item, conditions):
+                items.append(_project(item, kwargs.get("ProjectionExpression")))
+
+        response = {"Items": items, "Count": len(items), "ScannedCount": evaluated}
+
+        if last is not None and position + evaluated < len(candidates):
+            response["LastEvaluatedKey"] = table.key_attributes(last)
+
+        response.update(
+            self._consumed(
+                kwargs,
+                kwargs["TableName"],
+                read=_read_units(read_bytes, kwargs.get("ConsistentRead", False)),
+            )
+        )
+        return response
+
+    def scan(self, **kwargs: Any) -> dict:
+        self._call()
+
+        with self.lock:
+            table = self._table(kwargs["TableName"])
+            candidates = table.segment(
+                kwargs.get("Segment", 0), kwargs.get("TotalSegments", 1)
+            )
+
+        return self._page(kwargs, table, candidates)
+
+    def query(self, **kwargs: Any) -> dict:
+        self._call()
+        key_conditions = _conditions(
+            kwargs["KeyConditionExpression"], kwargs["ExpressionAttributeValues"]
+        )
+
+        with self.lock:
+            table = self._table(kwargs["TableName"])
+            index_name = kwargs.get("IndexName")
+            index_keys = table.indexes[index_name]
+            hash_values = next(
+                accepted
+                for name, _, accepted in key_conditions
+                if name == index_keys[0]
+            )
+            keys = table.partitions[index_name].get(next(iter(hash_values)), ())
+            candidates = [table.items[key] for key in keys]
+
+        sort_keys = index_keys[1:] + table.key_names
+        candidates = [item for item in candidates if _matches(item, key_conditions)]
+        candidates.sort(
+            key=lambda item: tuple(_sort_value(item[name]) for name in sort_keys)
+        )
+        return self._page(kwargs, table, candidates)
+
+    def _check(self, table: FakeTable, request: dict, key: tuple) -> None:
+        conditions = _conditions(
+            request.get("ConditionExpression"),
+            request.get("ExpressionAttributeValues", {}),
+        )
+
+        if not _matches(table.items.get(key), conditions):
+            raise ConditionalCheckFailedException("the conditional request failed")
+
+    def get_item(self, **kwargs: Any) -> dict:
+        self._call()
+
+        with self.lock:
+            table = self._table(kwargs["TableName"])
+            item = table.items.get(table.key(kwargs["Key"]))
+
+        response = {}
+
+        if item is not None:
+            response["Item"] = _project(item, kwargs.get("ProjectionExpression"))
+
+        response.update(
+            self._consumed(
+                kwargs,
+                kwargs["TableName"],
+                read=_read_units(
+                    item_size(item) if item else 0, kwargs.get("ConsistentRead", False)
+                ),
+            )
+        )
+        return response
+
+    def put_item(self, **kwargs: Any) -> dict:
+        self._call()
+
+        with self.lock:
+            table = self._table(kwargs["TableName"])
+            self._check(table, kwargs, table.key(kwargs["Item"]))
+            table.put(kwargs["Item"])
+
+        return self._consumed(
+            kwargs, kwargs["TableName"], write=_write_units(item_size(kwargs["Item"]))
+        )
+
+    def delete_item(self, **kwargs: Any) -> dict:
+        self._call()
+
+        with self.lock:
+            table = self._table(kwargs["TableName"])
+            self._check(table, kwargs, table.key(kwargs["Key"]))
+            item = table.delete(table.key(kwargs["Key"]))
+
+        return self._consumed(
+            kwargs,
+            kwargs["TableName"],
+            write=_write_units(item_size(item) if item else 0),
+        )
+
+    def batch_write_item(self, **kwargs: Any) -> dict:
+        self._call()
+        consumed = []
+
+        with self.lock:
+            for name, requests in kwargs["RequestItems"].items():
+                table = self._table(name)
+                units = 0
+
+                if len(requests) > 25:
+                    raise ClientError("ValidationException", "too many items")
+
+                for request in requests:
+                    if "PutRequest" in request:
+                        item = request["PutRequest"]["Item"]
+                        table.put(item)
+                    else:
+                        item = table.delete(table.key(request["DeleteRequest"]["Key"]))
+
+                    units += _write_units(item_size(item) if item else 0)
+
+                consumed.append(
+                    self._consumed(kwargs, name, write=units).get("ConsumedCapacity")
+                )
+
+        response = {"UnprocessedItems": {}}
+
+        if kwargs.get("ReturnConsumedCapacity", "NONE") != "NONE":
+            response["ConsumedCapacity"] = consumed
+
+        return response
+
+    def batch_get_item(self, **kwargs: Any) -> dict:
+        self._call()
+        responses = {}
+        consumed = []
+
+        with self.lock:
+            for name, request in kwargs["RequestItems"].items():
+                table = self._table(name)
+                items = []
+                units = 0
+
+                for key in request["Keys"]:
+                    item = table.items.get(table.key(key))
+
+                    if item is not None:
+                        units += _read_units(item_size(item))
+                        items.append(
+                            _project(item, request.get("ProjectionExpression"))
+                        )
+
+                responses[name] = items
+                consumed.append(
+                    self._consumed(kwargs, name, read=units).get("ConsumedCapacity")
+                )
+
+        response = {"Responses": responses, "UnprocessedKeys": {}}
+
+        if kwargs.get("ReturnConsumedCapacity", "NONE") != "NONE":
+            response["ConsumedCapacity"] = consumed
+
+        return response
+
+    def transact_write_items(self, **kwargs: Any) -> dict:
+        self._call()
+        units = {}
+
+        with self.lock:
+            writes = []
+
+            for transact_item in kwargs["TransactItems"]:
+                operation, request = next(iter(transact_item.items()))
+                table = self._table(request["TableName"])
+                key = table.key(
+                    request["Item"] if operation == "Put" else request["Key"]
+                )
+
+                try:
+                    self._check(table, request, key)
+                except ConditionalCheckFailedException as e:
+                    raise TransactionCanceledException(
+                        "transaction cancelled, a condition failed"
+                    ) from e
+
+                writes.append((operation, request, table, key))
+
+            for operation, request, table, key in writes:
+                if operation == "Put":
+                    table.put(request["Item"])
+                    size = item_size(request["Item"])
+                elif operation == "Delete":
+                    item = table.delete(key)
+                    size = item_size(item) if item else 0
+                else:
+                    size = 0
+
+                name = request["TableName"]
+                # transactional writes cost twice a standard write
+                units[name] = units.get(name, 0) + 2 * _write_units(size)
+
+        if kwargs.get("ReturnConsumedCapacity", "NONE") == "NONE":
+            return {}
+
+        return {
+            "ConsumedCapacity": [
+                self._consumed(kwargs, name, write=value)["ConsumedCapacity"]
+                for name, value in units.items()
+            ]
+        }
@@ -0,0 +1,256 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from casbin.model.assertion import Assertion
+from casbin.model.policy_op import PolicyOp
+
+from python_dycasbin import metrics
+from python_dycasbin.adapter import Adapter, Filter
+
+
+class _Node:
+    """The rules stored under one v0 value, a subject or a role, and its users."""
+
+    def __init__(self, rules: list[tuple[str, list[str]]]) -> None:
+        self.rules = rules
+        self.refs = 0
+
+    def roles(self, role_ptype: str) -> list[str]:
+        return [rule[1] for ptype, rule in self.rules if ptype == role_ptype]
+
+
+class LazyPolicyLoader:
+    """Load the policy of an enforcer one subject at a time, on first use
+
+    ensure(subject) reads the rules whose v0 is the subject with a query on the
+    v0-v1-index, then follows the roles of its role_ptype rules and reads the rules
+    of every reachable role the same way, so the subject's p rules, its role links
+    and the p rules of its roles end up in the enforcer's model. Roles shared by
+    several subjects are loaded once and unloaded with the last subject using them.
+
+    At most max_subjects subjects are kept, the least recently used is unloaded
+    to make room, and with a ttl a subject loaded longer ago is read again, together
+    with every role it reaches, including the roles other subjects share. Rules
+    changed in the table reach a loaded subject only when it is read again.
+
+    The enforcer must be created without an adapter, or it loads the whole policy,
+    and its model should only be changed through this loader. enforce holds lock
+    around loading and enforcing, pass a lock also held by other users of the
+    enforcer when there are any.
+
+    Args:
+        enforcer: Enforcer whose model is filled
+        adapter: Adapter reading the table
+        max_subjects: (Optional) Number of subjects kept loaded
+        ttl: (Optional) Seconds after which a loaded subject is read again
+        role_ptype: (Optional) ptype of the rules linking a subject to its roles
+        lock: (Optional) Lock held while the model is changed and enforce runs
+    """
+
+    def __init__(
+        self,
+        enforcer: Any,
+        adapter: Adapter,
+        *,
+        max_subjects: int = 10_000,
+        ttl: float | None = None,
+        role_ptype: str = "g",
+        lock: Any | None = None,
+    ) -> None:
+        self.enforcer = enforcer
+        self.adapter = adapter
+        self.max_subjects = max(1, max_subjects)
+        self.ttl = ttl
+        self.role_ptype = role_ptype
+        self.lock = lock if lock is not None else threading.RLock()
+        # subject -> (load time, names of the nodes it uses), least recent first
+        self._subjects: OrderedDict[str, tuple[float, list[str]]] = OrderedDict()
+        self._nodes: dict[str, _Node] = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def enforce(self, *rvals: Any) -> bool:
+        """Load the subject, the first request value, and enforce the request."""
+        with self.lock:
+            self.ensure(rvals[0])
+            return self.enforcer.enforce(*rvals)
+
+    @metrics.tracked
+    def ensure(self, subject: str) -> None:
+        """Make sure the rules of subject and of its roles are in the model."""
+        with self.lock:
+            entry = self._subjects.get(subject)
+            stale = set()
+
+            if entry is not None:
+                if self.ttl is None or time.monotonic() - entry[0] < self.ttl:
+                    self._subjects.move_to_end(subject)
+                    self._stats["hits"] += 1
+                    return
+
+                self._stats["expirations"] += 1
+                self._unload(subject)
+                stale.update(entry[1])
+
+            self._stats["misses"] += 1
+
+            while len(self._subjects) >= self.max_subjects:
+                self._stats["evictions"] += 1
+                self._unload(next(iter(self._subjects)))
+
+            self._subjects[subject] = (
+                time.monotonic(),
+                self._load_closure(subject, stale),
+            )
+
+    def unload(self, subject: str) -> None:
+        """Drop subject from the model, with the roles no other subject uses."""
+        with self.lock:
+            if subject in self._subjects:
+                self._unload(subject)
+
+    def clear(self) -> None:
+        with self.lock:
+            while self._subjects:
+                self._unload(next(iter(self._subjects)))
+
+    def get_stats(self) -> dict[str, int]:
+        """Return the cache counters and the size of what is loaded.
+
+        hits, misses: ensure calls that found the subject loaded or not, evictions:
+        subjects unloaded to make room, expirations: subjects read again after ttl,
+        subjects, nodes and rules: loaded subjects, loaded subjects and roles, and
+        their rules in the model.
+        """
+        with self.lock:
+            return dict(
+                self._stats,
+                subjects=len(self._subjects),
+                nodes=len(self._nodes),
+                rules=sum(len(node.rules) for node in self._nodes.values()),
+            )
+
+    def _fetch(self, name: str) -> list[tuple[str, list[str]]]:
+        return list(self.adapter.iter_policies(filter=Filter(v0=[name])))
+
+    def _load_closure(self, subject: str, stale: set[str]) -> list[str]:
+        """Load subject and its reachable roles, level by level, return their names.
+
+        Loaded nodes named in stale are read again. When a read fails, the nodes
+        this call added are removed before the error is raised.
+        """
+        closure = []
+        seen = {subject}
+        level = [subject]
+        added = []
+
+        try:
+            while level:
+                missing = [
+                    name for name in level if name not in self._nodes or name in stale
+                ]
+                fetched = self.adapter._map_concurrently(
+                    self._fetch, missing, self.adapter.scan_max_workers
+                )
+
+                for name, rules in zip(missing, fetched, strict=True):
+                    node = self._nodes.get(name)
+
+                    if node is None:
+                        self._nodes[name] = _Node(rules)
+                        added.append(name)
+                    else:
+                        self._apply(PolicyOp.Policy_remove, node.rules)
+                        node.rules = rules
+
+                    self._apply(PolicyOp.Policy_add, rules)
+
+                closure.extend(level)
+                next_level = []
+
+                for name in level:
+                    for role in self._nodes[name].roles(self.role_ptype):
+                        if role not in seen:
+                            seen.add(role)
+                            next_level.append(role)
+
+                level = next_level
+        except BaseException:
+            dropped = []
+
+            for name in added:
+                dropped.extend(self._nodes.pop(name).rules)
+
+            self._apply(PolicyOp.Policy_remove, dropped)
+            raise
+
+        for name in closure:
+            self._nodes[name].refs += 1
+
+        return closure
+
+    def _unload(self, subject: str) -> None:
+        _, closure = self._subjects.pop(subject)
+        dropped = []
+
+        for name in closure:
+            node = self._nodes[name]
+            node.refs -= 1
+
+            if node.refs == 0:
+                del self._nodes[name]
+                dropped.extend(node.rules)
+
+        self._apply(PolicyOp.Policy_remove, dropped)
+
+    @staticmethod
+    def _remove_rules(assertion: Assertion, rules: list[list[str]]) -> None:
+        """Remove rules from the assertion's policy through its policy map.
+
+        Each rule is replaced by the last rule of the policy, so an unload costs the
+        number of dropped rules rather than the number of loaded ones. The order of
+        the lazily loaded policy follows the order of the loads and has no meaning.
+        """
+        policy = assertion.policy
+        policy_map = assertion.policy_map
+
+        for rule in rules:
+            index = policy_map.pop(",".join(rule), None)
+
+            if index is None:
+                continue
+
+            last = policy.pop()
+
+            if index < len(policy):
+                policy[index] = last
+                policy_map[",".join(last)] = index
+
+    def _apply(self, op: PolicyOp, rules: list[tuple[str, list[str]]]) -> None:
+        """Add or remove (ptype, rule) pairs in the model and its role links."""
+        model = self.enforcer.get_model()
+        by_ptype = {}
+
+        for ptype, rule in rules:
+            by_ptype.setdefault(ptype, []).append(rule)
+
+        for ptype, ptype_rules in by_ptype.items():
+            sec = ptype[0]
+
+            if sec not in model.model or ptype not in model.model[sec]:
+                continue
+
+            if op == PolicyOp.Policy_add:
+                self.adapter._add_rules(model, ptype, ptype_rules)
+            else:
+                self._remove_rules(model.model[sec][ptype], ptype_rules)
+
+            if sec == "g" and ptype in self.enforcer.rm_map:
+                model.build_incremental_role_links(
+                    self.enforcer.get_named_role_manager(ptype),
+                    op,
+                    sec,
+                    ptype,
+                    ptype_rules,
+                )
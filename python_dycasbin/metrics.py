@@ -0,0 +1,526 @@
+"""Latency and consumed capacity instrumentation of the adapter's DynamoDB calls
+
+A MetricsHook given to an adapter (metrics_hook=...) receives one CallRecord per
+API call. Records are collected from the client's botocore events, so every call
+is covered, including retries done inside botocore, and ReturnConsumedCapacity is
+requested on the operations that support it.
+"""
+
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from typing import Any, Callable
+
+# enforcer facing adapter method that issued the calls of the current context
+current_caller: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "dycasbin_caller", default=None
+)
+
+READ_OPERATIONS = {"Scan", "Query", "GetItem", "BatchGetItem", "TransactGetItems"}
+THROTTLE_CODES = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+}
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_STATE = "dycasbin_metrics"
+
+
+class CallRecord:
+    """One DynamoDB API call
+
+    Attributes:
+        operation: API operation name, e.g. Query
+        table: Table named in the request, if any
+        caller: Adapter method that made the call, e.g. load_policy
+        started: time.time() when the call was made
+        latency: Seconds until the response, botocore retries included
+        capacity: Consumed capacity units by (table, index), index is None for the table itself
+        items: Items returned by reads or written by writes
+        scanned_items: Items evaluated by scans and queries
+        unprocessed_items: Items handed back by batch operations
+        retries: Attempts retried by botocore
+        throttles: Attempts rejected with a throttling error
+        error: Error code when the call failed
+    """
+
+    def __init__(
+        self,
+        operation: str,
+        table: str | None,
+        caller: str | None,
+        started: float,
+        latency: float,
+        capacity: dict[tuple[str, str | None], float] | None = None,
+        items: int = 0,
+        scanned_items: int = 0,
+        unprocessed_items: int = 0,
+        retries: int = 0,
+        throttles: int = 0,
+        error: str | None = None,
+    ) -> None:
+        self.operation = operation
+        self.table = table
+        self.caller = caller
+        self.started = started
+        self.latency = latency
+        self.capacity = capacity or {}
+        self.items = items
+        self.scanned_items = scanned_items
+        self.unprocessed_items = unprocessed_items
+        self.retries = retries
+        self.throttles = throttles
+        self.error = error
+
+    @property
+    def is_read(self) -> bool:
+        return self.operation in READ_OPERATIONS
+
+    @property
+    def capacity_units(self) -> float:
+        return sum(self.capacity.values())
+
+
+class MetricsHook:
+    """Receiver of CallRecords, subclass it to forward calls to a metrics or tracing system
+
+    record is called from the thread that made the call, so it must be thread safe
+    and should return quickly.
+    """
+
+    def record(self, call: CallRecord) -> None:
+        pass
+
+
+class CompositeHook(MetricsHook):
+    """Hand every record to several hooks"""
+
+    def __init__(self, *hooks: MetricsHook) -> None:
+        self.hooks = hooks
+
+    def record(self, call: CallRecord) -> None:
+        for hook in self.hooks:
+            hook.record(call)
+
+
+class InMemoryMetrics(MetricsHook):
+    """Aggregate records in memory, by caller and operation and by table and index"""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._calls: dict[tuple[str | None, str], dict] = {}
+            self._capacity: dict[tuple[str, str | None, str], float] = {}
+            self._caller_capacity: dict[tuple[str | None, str], float] = {}
+
+    def record(self, call: CallRecord) -> None:
+        kind = "read" if call.is_read else "write"
+
+        with self._lock:
+            stats = self._calls.get((call.caller, call.operation))
+
+            if stats is None:
+                stats = self._calls[(call.caller, call.operation)] = {
+                    "calls": 0,
+                    "errors": 0,
+                    "throttles": 0,
+                    "retries": 0,
+                    "items": 0,
+                    "scanned_items": 0,
+                    "unprocessed_items": 0,
+                    "latency_sum": 0.0,
+                    "latency_max": 0.0,
+                    "latency_buckets": [0] * len(self.buckets),
+                }
+
+            stats["calls"] += 1
+            stats["errors"] += call.error is not None
+            stats["throttles"] += call.throttles
+            stats["retries"] += call.retries
+            stats["items"] += call.items
+            stats["scanned_items"] += call.scanned_items
+            stats["unprocessed_items"] += call.unprocessed_items
+            stats["latency_sum"] += call.latency
+            stats["latency_max"] = max(stats["latency_max"], call.latency)
+
+            for i, bound in enumerate(self.buckets):
+                if call.latency <= bound:
+                    stats["latency_buckets"][i] += 1
+
+            for (table, index), units in call.capacity.items():
+                key = (table, index, kind)
+                self._capacity[key] = self._capacity.get(key, 0.0) + units
+
+            key = (call.caller, kind)
+            self._caller_capacity[key] = (
+                self._caller_capacity.get(key, 0.0) + call.capacity_units
+            )
+
+    def snapshot(self) -> dict[str, list[dict]]:
+        """Return the aggregates as plain data.
+
+        calls: one entry per caller and operation, latency_buckets are cumulative
+        counts for the bounds in buckets. capacity: units by table, index and kind
+        (read or write). callers: units by adapter method and kind.
+        """
+        with self._lock:
+            return {
+                "calls": [
+                    dict(
+                        stats,
+                        caller=caller,
+                        operation=operation,
+                        latency_buckets=list(stats["latency_buckets"]),
+                    )
+                    for (caller, operation), stats in self._calls.items()
+                ],
+                "capacity": [
+                    {"table": table, "index": index, "kind": kind, "units": units}
+                    for (table, index, kind), units in self._capacity.items()
+                ],
+                "callers": [
+                    {"caller": caller, "kind": kind, "units": units}
+                    for (caller, kind), units in self._caller_capacity.items()
+                ],
+            }
+
+
+class PrometheusExporter:
+    """Render InMemoryMetrics in the Prometheus text exposition format
+
+    Serve render() from the application's /metrics endpoint.
+    """
+
+    def __init__(self, metrics: InMemoryMetrics, prefix: str = "dycasbin") -> None:
+        self.metrics = metrics
+        self.prefix = prefix
+
+    def _labels(self, **labels: Any) -> str:
+        return ",".join(
+            '{}="{}"'.format(
+                name,
+                ""
+                if value is None
+                else str(value).replace("\\", "\\\\").replace('"', '\\"'),
+            )
+            for name, value in labels.items()
+        )
+
+    def render(self) -> str:
+        snapshot = self.metrics.snapshot()
+        prefix = self.prefix
+        lines = []
+        counters = [
+            ("calls", "DynamoDB calls"),
+            ("errors", "DynamoDB calls that failed"),
+            ("throttles", "DynamoDB attempts rejected by throttling"),
+            ("retries", "DynamoDB attempts retried by botocore"),
+            ("items", "Items read or written"),
+            ("scanned_items", "Items evaluated by scans and queries"),
+            ("unprocessed_items", "Items handed back by batch operations"),
+        ]
+
+        for name, help_text in counters:
+            lines.append("# HELP {}_{}_total {}".format(prefix, name, help_text))
+            lines.append("# TYPE {}_{}_total counter".format(prefix, name))
+
+            for stats in snapshot["calls"]:
+                labels = self._labels(
+                    caller=stats["caller"], operation=stats["operation"]
+                )
+                lines.append(
+                    "{}_{}_total{{{}}} {}".format(prefix, name, labels, stats[name])
+                )
+
+        lines.append(
+            "# HELP {}_request_duration_seconds DynamoDB call latency".format(prefix)
+        )
+        lines.append("# TYPE {}_request_duration_seconds histogram".format(prefix))
+
+        for stats in snapshot["calls"]:
+            labels = {"caller": stats["caller"], "operation": stats["operation"]}
+
+            for bound, count in zip(
+                self.metrics.buckets, stats["latency_buckets"], strict=True
+            ):
+                lines.append(
+                    "{}_request_duration_seconds_bucket{{{}}} {}".format(
+                        prefix, self._labels(**labels, le=bound), count
+                    )
+                )
+
+            lines.append(
+                "{}_request_duration_seconds_bucket{{{}}} {}".format(
+                    prefix, self._labels(**labels, le="+Inf"), stats["calls"]
+                )
+            )
+            lines.append(
+                "{}_request_duration_seconds_sum{{{}}} {}".format(
+                    prefix, self._labels(**labels), stats["latency_sum"]
+                )
+            )
+            lines.append(
+                "{}_request_duration_seconds_count{{{}}} {}".format(
+                    prefix, self._labels(**labels), stats["calls"]
+                )
+            )
+
+        lines.append(
+            "# HELP {}_consumed_capacity_units_total Consumed capacity by table and index".format(
+                prefix
+            )
+        )
+        lines.append("# TYPE {}_consumed_capacity_units_total counter".format(prefix))
+
+        for entry in snapshot["capacity"]:
+            lines.append(
+                "{}_consumed_capacity_units_total{{{}}} {}".format(
+                    prefix,
+                    self._labels(
+                        table=entry["table"], index=entry["index"], kind=entry["kind"]
+                    ),
+                    entry["units"],
+                )
+            )
+
+        lines.append(
+            "# HELP {}_caller_capacity_units_total Consumed capacity by adapter method".format(
+                prefix
+            )
+        )
+        lines.append("# TYPE {}_caller_capacity_units_total counter".format(prefix))
+
+        for entry in snapshot["callers"]:
+            lines.append(
+                "{}_caller_capacity_units_total{{{}}} {}".format(
+                    prefix,
+                    self._labels(caller=entry["caller"], kind=entry["kind"]),
+                    entry["units"],
+                )
+            )
+
+        return "\n".join(lines) + "\n"
+
+
+class OpenTelemetryHook(MetricsHook):
+    """Record calls with OpenTelemetry instruments created from a Meter
+
+    Args:
+        meter: opentelemetry.metrics.Meter, e.g. metrics.get_meter("python_dycasbin")
+    """
+
+    def __init__(self, meter: Any) -> None:
+        self.duration = meter.create_histogram(
+            "dycasbin.request.duration", unit="s", description="DynamoDB call latency"
+        )
+        self.capacity = meter.create_counter(
+            "dycasbin.consumed_capacity",
+            unit="{capacity_unit}",
+            description="Consumed capacity by table and index",
+        )
+        self.throttles = meter.create_counter(
+            "dycasbin.throttles", description="DynamoDB attempts rejected by throttling"
+        )
+        self.items = meter.create_counter(
+            "dycasbin.items", description="Items read or written"
+        )
+
+    def record(self, call: CallRecord) -> None:
+        attributes = {"operation": call.operation, "caller": call.caller or ""}
+
+        if call.error is not None:
+            attributes["error"] = call.error
+
+        self.duration.record(call.latency, attributes)
+        self.items.add(call.items, attributes)
+
+        if call.throttles:
+            self.throttles.add(call.throttles, attributes)
+
+        for (table, index), units in call.capacity.items():
+            self.capacity.add(
+                units,
+                dict(
+                    attributes,
+                    table=table,
+                    index=index or "",
+                    kind="read" if call.is_read else "write",
+                ),
+            )
+
+
+def tracked(func: Callable) -> Callable:
+    """Attribute the DynamoDB calls made by an adapter method to that method.
+
+    Nested tracked methods keep the outermost name.
+    """
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            if current_caller.get() is not None:
+                return await func(*args, **kwargs)
+
+            token = current_caller.set(func.__name__)
+
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                current_caller.reset(token)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if current_caller.get() is not None:
+            return func(*args, **kwargs)
+
+        token = current_caller.set(func.__name__)
+
+        try:
+            return func(*args, **kwargs)
+        finally:
+            current_caller.reset(token)
+
+    return wrapper
+
+
+def _written_items(operation: str, params: dict) -> int:
+    if operation == "BatchWriteItem":
+        return sum(
+            len(requests) for requests in params.get("RequestItems", {}).values()
+        )
+    if operation == "TransactWriteItems":
+        return len(params.get("TransactItems", []))
+    if operation in ("PutItem", "DeleteItem", "UpdateItem"):
+        return 1
+
+    return 0
+
+
+def _read_items(parsed: dict) -> int:
+    if "Count" in parsed:
+        return parsed["Count"]
+    if "Item" in parsed:
+        return 1
+    if "Responses" in parsed:
+        responses = parsed["Responses"]
+
+        if isinstance(responses, dict):
+            return sum(len(items) for items in responses.values())
+
+        return len(responses)
+
+    return 0
+
+
+def _capacity(consumed: Any) -> dict[tuple[str, str | None], float]:
+    """Units by (table, index) from ConsumedCapacity, INDEXES or TOTAL detail."""
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+
+    capacity = {}
+
+    for entry in consumed or []:
+        table = entry.get("TableName")
+        indexes = {
+            name: detail.get("CapacityUnits", 0)
+            for name, detail in {
+                **entry.get("GlobalSecondaryIndexes", {}),
+                **entry.get("LocalSecondaryIndexes", {}),
+            }.items()
+        }
+
+        if "Table" in entry:
+            table_units = entry["Table"].get("CapacityUnits", 0)
+        else:
+            table_units = entry.get("CapacityUnits", 0) - sum(indexes.values())
+
+        capacity[(table, None)] = capacity.get((table, None), 0.0) + table_units
+
+        for name, units in indexes.items():
+            capacity[(table, name)] = capacity.get((table, name), 0.0) + units
+
+    return capacity
+
+
+def _unprocessed_items(parsed: dict) -> int:
+    unprocessed = parsed.get("UnprocessedItems") or {}
+    unprocessed_keys = parsed.get("UnprocessedKeys") or {}
+    return sum(len(requests) for requests in unprocessed.values()) + sum(
+        len(request.get("Keys", [])) for request in unprocessed_keys.values()
+    )
+
+
+def instrument_client(client: Any, hook: MetricsHook) -> Any:
+    """Report every call made by a botocore or aiobotocore client to hook."""
+    service = client.meta.service_model.service_id.hyphenize()
+    events = client.meta.events
+
+    def start(params: dict, model: Any, context: dict, **kwargs: Any) -> None:
+        if (
+            "ReturnConsumedCapacity" in model.input_shape.members
+            and "ReturnConsumedCapacity" not in params
+        ):
+            params["ReturnConsumedCapacity"] = "INDEXES"
+
+        context[_STATE] = {
+            "operation": model.name,
+            "table": params.get("TableName"),
+            "caller": current_caller.get(),
+            "written": _written_items(model.name, params),
+            "started": time.time(),
+            "clock": time.perf_counter(),
+            "throttles": 0,
+        }
+
+    def retry(request_dict: dict, response: Any = None, **kwargs: Any) -> None:
+        state = request_dict.get("context", {}).get(_STATE)
+
+        if state is not None and response is not None:
+            if response[1].get("Error", {}).get("Code") in THROTTLE_CODES:
+                state["throttles"] += 1
+
+    def finish(state: dict, parsed: dict | None, error: str | None) -> None:
+        parsed = parsed or {}
+        read = state["operation"] in READ_OPERATIONS
+        hook.record(
+            CallRecord(
+                operation=state["operation"],
+                table=state["table"],
+                caller=state["caller"],
+                started=state["started"],
+                latency=time.perf_counter() - state["clock"],
+                capacity=_capacity(parsed.get("ConsumedCapacity")),
+                items=_read_items(parsed) if read else state["written"],
+                scanned_items=parsed.get("ScannedCount", 0),
+                unprocessed_items=_unprocessed_items(parsed),
+                retries=parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0),
+                throttles=state["throttles"],
+                error=error,
+            )
+        )
+
+    def after_call(parsed: dict, context: dict, **kwargs: Any) -> None:
+        state = context.pop(_STATE, None)
+
+        if state is not None:
+            finish(state, parsed, parsed.get("Error", {}).get("Code"))
+
+    def after_call_error(exception: Exception, context: dict, **kwargs: Any) -> None:
+        state = context.pop(_STATE, None)
+
+        if state is not None:
+            finish(state, None, type(exception).__name__)
+
+    events.register("provide-client-params.{}".format(service), start)
+    events.register("needs-retry.{}".format(service), retry)
+    events.register("after-call.{}".format(service), after_call)
+    events.register("after-call-error.{}".format(service), after_call_error)
+    return client
@@ -0,0 +1,116 @@
+"""Rewrite the ids of a policy table to another id scheme
+
+    python -m python_dycasbin.migrate casbin_rule --to blake2b --segments 8
+
+With --domain-fields (such as p=1,g=2) the items written before the table had
+table_domain_fields also get their dom copy, so the domain index sees them.
+
+The table stays usable while the migration runs. Every item whose id differs from
+the target scheme is put under its new id before the old item is deleted, so a rule
+is never missing, and a run that is interrupted can simply be started again. While
+it runs, writers should use table_id_scheme set to the target scheme and
+table_legacy_id_scheme set to the old one, so rule deletes hit both ids.
+"""
+
+import argparse
+import threading
+
+from python_dycasbin import metrics
+from python_dycasbin.adapter import Adapter, versioned
+
+
+@metrics.tracked
+@versioned
+def migrate_ids(adapter: Adapter) -> dict[str, int]:
+    """Move every rule of the adapter's table to the id of adapter.table_id_scheme.
+
+    Rules missing the dom copy of adapter.table_domain_fields are rewritten with it.
+    The table is read with a parallel scan of adapter.scan_segments segments, each
+    page is rewritten with batched writes as soon as it arrives. Returns the number
+    of items scanned and migrated.
+    """
+    dynamodb = adapter._get_db_handler()
+    counts = {"scanned": 0, "migrated": 0}
+    lock = threading.Lock()
+
+    def migrate_segment(segment: int) -> None:
+        scan_kwargs = {"TableName": adapter.table_name}
+
+        if adapter.scan_segments > 1:
+            scan_kwargs["Segment"] = segment
+            scan_kwargs["TotalSegments"] = adapter.scan_segments
+
+        for page in adapter._paginate(dynamodb, "scan", **scan_kwargs):
+            puts = []
+            deletes = []
+
+            for item in page.get("Items", []):
+                if not adapter._is_rule_item(item):
+                    continue
+
+                ptype = item["ptype"]["S"]
+                rule = adapter.get_rule_from_item(item)
+                new_item = dict(item, id={"S": adapter.get_id(ptype, rule)})
+                field = (adapter.table_domain_fields or {}).get(ptype)
+
+                if field is not None and field < len(rule):
+                    new_item["dom"] = {"S": rule[field]}
+
+                if new_item != item:
+                    puts.append({"PutRequest": {"Item": new_item}})
+
+                if new_item["id"] != item["id"]:
+                    deletes.append({"DeleteRequest": {"Key": {"id": item["id"]}}})
+
+            adapter._write_batches(puts)
+            adapter._write_batches(deletes)
+
+            with lock:
+                counts["scanned"] += len(page.get("Items", []))
+                counts["migrated"] += len(puts)
+
+    adapter._map_concurrently(
+        migrate_segment, range(adapter.scan_segments), adapter.scan_max_workers
+    )
+    return counts
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("table_name")
+    parser.add_argument("--to", choices=["md5", "blake2b"], default="blake2b")
+    parser.add_argument("--segments", type=int, default=4)
+    parser.add_argument("--write-workers", type=int, default=8)
+    parser.add_argument(
+        "--domain-fields",
+        help="position of the domain in the rules of each ptype, such as p=1,g=2",
+    )
+    parser.add_argument("--endpoint-url")
+    parser.add_argument("--region-name")
+    args = parser.parse_args(argv)
+    domain_fields = None
+
+    if args.domain_fields:
+        domain_fields = {
+            ptype: int(field)
+            for ptype, field in (
+                pair.split("=") for pair in args.domain_fields.split(",")
+            )
+        }
+
+    adapter = Adapter(
+        args.table_name,
+        table_create_table=False,
+        table_id_scheme=args.to,
+        table_domain_fields=domain_fields,
+        aws_endpoint_url=args.endpoint_url,
+        aws_region_name=args.region_name,
+        scan_segments=args.segments,
+        write_max_workers=args.write_workers,
+    )
+    counts = migrate_ids(adapter)
+    print("scanned {scanned} items, migrated {migrated}".format(**counts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Client side pacing of DynamoDB calls to the table's read and write capacity
+
+A RateLimiter holds one token bucket for reads and one for writes, filled at the
+capacity units per second the table can sustain. Every data plane call takes its
+estimated units from the bucket of its kind before it is sent, waiting when the
+bucket is empty, and the estimate is corrected with the ConsumedCapacity of the
+response. Throttling errors and unprocessed batch items halve the rate of the
+bucket, calls that had to wait and were not throttled raise it again by a tenth
+of the starting rate per second (additive increase, multiplicative decrease), so
+bulk jobs settle at the highest rate the table accepts instead of thrashing.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Callable
+
+from python_dycasbin import metrics
+
+WRITE_OPERATIONS = {
+    "PutItem",
+    "DeleteItem",
+    "UpdateItem",
+    "BatchWriteItem",
+    "TransactWriteItems",
+}
+_STATE = "dycasbin_rate_limit"
+
+
+class TokenBucket:
+    """Token bucket whose rate adapts to throttling feedback
+
+    Args:
+        rate: Starting rate in units per second
+        burst: (Optional) Seconds of rate the bucket holds, 1 second by default
+        min_rate: (Optional) Lowest rate throttling can bring the bucket to
+        max_rate: (Optional) Highest rate the bucket can grow to, unbounded by default
+        clock: (Optional) Monotonic clock in seconds
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        *,
+        burst: float = 1.0,
+        min_rate: float | None = None,
+        max_rate: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate if min_rate is not None else rate / 20
+        self.max_rate = max_rate
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._tokens = rate * burst
+        self._updated = clock()
+        self._changed = self._updated
+        self._decreased = float("-inf")
+        self._stats = {"waits": 0, "wait_seconds": 0.0, "throttles": 0}
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(
+            self.rate * self.burst, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def reserve(self, units: float) -> float:
+        """Take units from the bucket and return the seconds to wait before using them."""
+        with self._lock:
+            self._refill(self.clock())
+            self._tokens -= units
+
+            if self._tokens >= 0:
+                return 0.0
+
+            delay = -self._tokens / self.rate
+            self._stats["waits"] += 1
+            self._stats["wait_seconds"] += delay
+            return delay
+
+    def adjust(self, units: float) -> None:
+        """Take units more, or give back -units, once the actual cost of a call is known."""
+        with self._lock:
+            self._tokens -= units
+
+    def throttled(self) -> None:
+        """Halve the rate, at most once per second so a burst of errors counts once."""
+        with self._lock:
+            self._stats["throttles"] += 1
+            now = self.clock()
+
+            if now - self._decreased < 1.0:
+                return
+
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            self._changed = self._decreased = now
+
+    def succeeded(self) -> None:
+        """Raise the rate by a tenth of the starting rate, at most once per second."""
+        with self._lock:
+            now = self.clock()
+
+            if now - self._changed < 1.0:
+                return
+
+            self._refill(now)
+            self.rate += self.base_rate / 10
+
+            if self.max_rate is not None:
+                self.rate = min(self.max_rate, self.rate)
+
+            self._changed = now
+
+    def get_stats(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self._stats, rate=self.rate)
+
+
+class RateLimiter:
+    """Read and write token buckets shared by every call of the clients it is installed on
+
+    A rate of None leaves that kind of call unlimited. Share one RateLimiter between
+    the adapters of a process that use the same table.
+
+    Args:
+        read_rate: Read capacity units per second, the table's provisioned RCU
+        write_rate: Write capacity units per second, the table's provisioned WCU
+        bucket_kwargs: (Optional) Passed to both TokenBuckets
+    """
+
+    def __init__(
+        self, read_rate: float | None, write_rate: float | None, **bucket_kwargs: Any
+    ) -> None:
+        self.read = TokenBucket(read_rate, **bucket_kwargs) if read_rate else None
+        self.write = TokenBucket(write_rate, **bucket_kwargs) if write_rate else None
+        self._lock = threading.Lock()
+        # operation -> average units consumed per call, or per item for writes
+        self._units: dict[str, float] = {}
+
+    def bucket(self, operation: str) -> TokenBucket | None:
+        if operation in metrics.READ_OPERATIONS:
+            return self.read
+        if operation in WRITE_OPERATIONS:
+            return self.write
+
+        return None
+
+    def estimate(self, operation: str, params: dict) -> float:
+        """Units a call is expected to consume, from the calls of the same operation."""
+        count = max(1, metrics._written_items(operation, params))
+
+        with self._lock:
+            return count * self._units.get(operation, 1.0)
+
+    def observe(self, operation: str, count: int, units: float) -> None:
+        """Fold the units consumed by a call writing count items into the averages."""
+        with self._lock:
+            average = self._units.get(operation, 1.0)
+            self._units[operation] = 0.8 * average + 0.2 * units / max(1, count)
+
+    def get_stats(self) -> dict[str, dict[str, float]]:
+        """Return the rate and the waits and throttles seen by each bucket."""
+        return {
+            kind: bucket.get_stats()
+            for kind, bucket in (("read", self.read), ("write", self.write))
+            if bucket is not None
+        }
+
+
+def install(client: Any, limiter: RateLimiter, asynchronous: bool = False) -> Any:
+    """Pace the calls of a botocore client, or of an aiobotocore one when asynchronous."""
+    service = client.meta.service_model.service_id.hyphenize()
+    events = client.meta.events
+
+    def reserve(params: dict, model: Any, context: dict) -> float:
+        bucket = limiter.bucket(model.name)
+
+        if bucket is None:
+            return 0.0
+
+        if (
+            "ReturnConsumedCapacity" in model.input_shape.members
+            and "ReturnConsumedCapacity" not in params
+        ):
+            params["ReturnConsumedCapacity"] = "INDEXES"
+
+        units = limiter.estimate(model.name, params)
+        delay = bucket.reserve(units)
+        context[_STATE] = {
+            "bucket": bucket,
+            "units": units,
+            "count": metrics._written_items(model.name, params),
+            "delay": delay,
+        }
+        return delay
+
+    def wait(params: dict, model: Any, context: dict, **kwargs: Any) -> None:
+        delay = reserve(params, model, context)
+
+        if delay:
+            time.sleep(delay)
+
+    async def wait_async(
+        params: dict, model: Any, context: dict, **kwargs: Any
+    ) -> None:
+        delay = reserve(params, model, context)
+
+        if delay:
+            await asyncio.sleep(delay)
+
+    def retry(request_dict: dict, response: Any = None, **kwargs: Any) -> None:
+        state = request_dict.get("context", {}).get(_STATE)
+
+        if state is not None and response is not None:
+            if response[1].get("Error", {}).get("Code") in metrics.THROTTLE_CODES:
+                state["bucket"].throttled()
+
+    def finish(parsed: dict, model: Any, context: dict, **kwargs: Any) -> None:
+        state = context.pop(_STATE, None)
+
+        if state is None or "Error" in parsed:
+            return
+
+        capacity = metrics._capacity(parsed.get("ConsumedCapacity"))
+
+        if capacity:
+            # tables and indexes have separate budgets, the busiest one sets the pace
+            units = max(capacity.values())
+            state["bucket"].adjust(units - state["units"])
+            limiter.observe(model.name, state["count"], units)
+
+        if metrics._unprocessed_items(parsed):
+            state["bucket"].throttled()
+        elif state["delay"]:
+            state["bucket"].succeeded()
+
+    # the wait happens before the request is built, so it is not signed too early
+    events.register(
+        "provide-client-params.{}".format(service),
+        wait_async if asynchronous else wait,
+    )
+    events.register("needs-retry.{}".format(service), retry)
+    events.register("after-call.{}".format(service), finish)
+    return client
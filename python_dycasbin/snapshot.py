@@ -0,0 +1,257 @@
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Any, Iterable, Iterator
+
+from casbin import Model, persist
+
+from python_dycasbin import metrics
+from python_dycasbin.adapter import Adapter
+
+SNAPSHOT_MAGIC = b"DYCS"
+SNAPSHOT_FORMAT = 1
+
+_HEADER = struct.Struct("<4sBI")
+_COUNT = struct.Struct("<I")
+
+
+def write_snapshot(
+    path: str, version: str, rules: Iterable[tuple[str, list[str]]]
+) -> None:
+    """Write (ptype, values) rules to a snapshot file stamped with a table version.
+
+    Layout: header (magic, format, version length), version, string table
+    (count, then length-prefixed utf-8 strings) and rule table (count, then for each
+    rule its field count followed by string indexes, ptype first). Every distinct
+    value is stored once. The file is replaced atomically.
+    """
+    strings = {}
+    rule_table = []
+
+    for ptype, values in rules:
+        fields = [ptype, *values]
+        rule_table.append(len(fields))
+        rule_table.extend(strings.setdefault(v, len(strings)) for v in fields)
+
+    version_bytes = version.encode("utf-8")
+    chunks = [_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, len(version_bytes))]
+    chunks.append(version_bytes)
+    chunks.append(_COUNT.pack(len(strings)))
+
+    for value in strings:
+        encoded = value.encode("utf-8")
+        chunks.append(_COUNT.pack(len(encoded)))
+        chunks.append(encoded)
+
+    chunks.append(_COUNT.pack(len(rule_table)))
+    chunks.append(struct.pack("<{}I".format(len(rule_table)), *rule_table))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".dycasbin-snapshot-")
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"".join(chunks))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_snapshot(path: str) -> tuple[str, list[tuple[str, list[str]]]] | None:
+    """Read a snapshot file, returning (version, rules) or None if it is unusable."""
+    try:
+        with (
+            open(path, "rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data,
+        ):
+            return _parse_snapshot(data)
+    except (OSError, ValueError, struct.error, UnicodeDecodeError):
+        return None
+
+
+def _parse_snapshot(data: Any) -> tuple[str, list[tuple[str, list[str]]]] | None:
+    magic, file_format, version_length = _HEADER.unpack_from(data, 0)
+
+    if magic != SNAPSHOT_MAGIC or file_format != SNAPSHOT_FORMAT:
+        return None
+
+    offset = _HEADER.size
+    version = bytes(data[offset : offset + version_length]).decode("utf-8")
+    offset += version_length
+
+    (string_count,) = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    strings = []
+
+    for _ in range(string_count):
+        (length,) = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        strings.append(bytes(data[offset : offset + length]).decode("utf-8"))
+        offset += length
+
+    (table_length,) = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    rule_table = struct.unpack_from("<{}I".format(table_length), data, offset)
+    rules = []
+    i = 0
+
+    while i < len(rule_table):
+        field_count = rule_table[i]
+        fields = [strings[j] for j in rule_table[i + 1 : i + 1 + field_count]]
+        rules.append((fields[0], fields[1:]))
+        i += 1 + field_count
+
+    return version, rules
+
+
+def _model_rules(model: Model) -> Iterator[tuple[str, list[str]]]:
+    for sec in ["p", "g"]:
+        if sec not in model.model:
+            continue
+
+        for ptype, ast in model.model[sec].items():
+            for rule in ast.policy:
+                yield ptype, rule
+
+
+class SnapshotAdapter(persist.BatchAdapter, persist.UpdateAdapter):
+    """Wrap an Adapter with a local snapshot of the policy for warm starts
+
+    The wrapped adapter is switched to table_version_marker, so the version marker
+    item of the table is replaced after every write. load_policy reads the marker
+    with one GetItem and loads the local snapshot when its stamp matches, otherwise
+    it does a full load through the wrapped adapter and rewrites the snapshot.
+    Every other process writing to the table must set table_version_marker too,
+    writers that do not are only seen once the snapshot is older than
+    snapshot_max_age.
+
+    The marker only tells whether the table changed, not what changed, so a stale
+    snapshot is always replaced by a full load; there is no incremental catch-up.
+
+    Args:
+        adapter: The wrapped Adapter
+        snapshot_path: Local file used to store the snapshot
+        snapshot_max_age: (Optional) Seconds after which the snapshot is reloaded
+          from the table even if the version marker matches
+    """
+
+    def __init__(
+        self,
+        adapter: Adapter,
+        snapshot_path: str,
+        snapshot_max_age: float | None = None,
+    ) -> None:
+        adapter.table_version_marker = True
+        self.adapter = adapter
+        self.snapshot_path = snapshot_path
+        self.snapshot_max_age = snapshot_max_age
+
+    def _snapshot_expired(self) -> bool:
+        if self.snapshot_max_age is None:
+            return False
+
+        try:
+            age = time.time() - os.path.getmtime(self.snapshot_path)
+        except OSError:
+            return True
+
+        return age > self.snapshot_max_age
+
+    @metrics.tracked
+    def load_policy(self, model: Model) -> None:
+        """load policies from the snapshot when it is current, else from database"""
+        version = self.adapter._table_version()
+
+        if version is None:
+            version = self.adapter._bump_version()
+        elif not self._snapshot_expired():
+            snapshot = read_snapshot(self.snapshot_path)
+
+            if snapshot is not None and snapshot[0] == version:
+                rules = {}
+
+                for ptype, rule in snapshot[1]:
+                    rules.setdefault(ptype, []).append(rule)
+
+                for ptype, ptype_rules in rules.items():
+                    self.adapter._add_rules(model, ptype, ptype_rules)
+
+                self.adapter._filtered = False
+                return
+
+        # the version is read before loading, so a concurrent write leaves the
+        # snapshot stamped with an older version and it is refetched next time
+        self.adapter.load_policy(model)
+        write_snapshot(self.snapshot_path, version, _model_rules(model))
+
+    @metrics.tracked
+    def save_policy(self, model: Model) -> bool:
+        """save the policy, the snapshot is rewritten by the next load_policy"""
+        return self.adapter.save_policy(model)
+
+    @metrics.tracked
+    def load_filtered_policy(self, model: Model, filter: Any) -> None:
+        self.adapter.load_filtered_policy(model, filter)
+
+    def is_filtered(self) -> bool:
+        return self.adapter.is_filtered()
+
+    @metrics.tracked
+    def add_policy(self, sec: str, ptype: str, rule: Iterable) -> Any:
+        return self.adapter.add_policy(sec, ptype, rule)
+
+    @metrics.tracked
+    def add_policies(self, sec: str, ptype: str, rules: Iterable[Iterable]) -> Any:
+        return self.adapter.add_policies(sec, ptype, rules)
+
+    @metrics.tracked
+    def remove_policy(self, sec: str, ptype: str, rule: Iterable) -> Any:
+        return self.adapter.remove_policy(sec, ptype, rule)
+
+    @metrics.tracked
+    def remove_policies(self, sec: str, ptype: str, rules: Iterable[Iterable]) -> Any:
+        return self.adapter.remove_policies(sec, ptype, rules)
+
+    @metrics.tracked
+    def remove_filtered_policy(
+        self, sec: str, ptype: str, field_index: int, *field_values: str
+    ) -> Any:
+        return self.adapter.remove_filtered_policy(
+            sec, ptype, field_index, *field_values
+        )
+
+    @metrics.tracked
+    def update_policy(
+        self, sec: str, ptype: str, old_rule: Iterable, new_rule: Iterable
+    ) -> Any:
+        return self.adapter.update_policy(sec, ptype, old_rule, new_rule)
+
+    @metrics.tracked
+    def update_policies(
+        self,
+        sec: str,
+        ptype: str,
+        old_rules: Iterable[Iterable],
+        new_rules: Iterable[Iterable],
+    ) -> Any:
+        return self.adapter.update_policies(sec, ptype, old_rules, new_rules)
+
+    @metrics.tracked
+    def update_filtered_policies(
+        self,
+        sec: str,
+        ptype: str,
+        new_rules: Iterable[Iterable],
+        field_index: int,
+        *field_values: str,
+    ) -> Any:
+        return self.adapter.update_filtered_policies(
+            sec,
+            ptype,
+            new_rules,
+            field_index,
+            *field_values,
+        )
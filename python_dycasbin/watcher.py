@@ -0,0 +1,288 @@
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+from casbin.model.policy_op import PolicyOp
+from casbin.persist.watcher import Watcher
+
+from python_dycasbin import metrics
+from python_dycasbin.adapter import Adapter
+
+logger = logging.getLogger(__name__)
+
+
+class StreamReader:
+    """Source of DynamoDB Stream records for StreamWatcher
+
+    get_records returns the records that arrived since the previous call, in the
+    shape of the dynamodbstreams GetRecords response (eventName and dynamodb
+    NewImage/OldImage). reset drops the read position after an error and start
+    takes a new one, so records written from then on are returned.
+    """
+
+    def get_records(self) -> list[dict]:
+        return []
+
+    def start(self) -> None:
+        pass
+
+    def reset(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class DynamoDBStreamReader(StreamReader):
+    """Read the stream of the adapter's table through the dynamodbstreams API
+
+    Shards open when the reader starts are followed from LATEST, shards that appear
+    afterwards are read from TRIM_HORIZON so no record is skipped when shards split.
+
+    Args:
+        adapter: Adapter whose table and connection settings are used
+        stream_arn: (Optional) Stream ARN, read from describe_table when omitted
+        shard_refresh_interval: (Optional) Seconds between checks for new shards
+    """
+
+    def __init__(
+        self,
+        adapter: Adapter,
+        stream_arn: str | None = None,
+        shard_refresh_interval: float = 30.0,
+    ) -> None:
+        self.adapter = adapter
+        self.stream_arn = stream_arn
+        self.shard_refresh_interval = shard_refresh_interval
+
+        import boto3
+
+        self._client = boto3.client(
+            "dynamodbstreams",
+            config=adapter._client_config(),
+            **adapter._client_kwargs(),
+        )
+
+        if adapter.metrics_hook is not None:
+            metrics.instrument_client(self._client, adapter.metrics_hook)
+        self._iterators: dict[str, str] = {}
+        self._finished: set[str] = set()
+        self._started = False
+        self._refreshed_at = 0.0
+
+    def _get_stream_arn(self) -> str:
+        if self.stream_arn is None:
+            dynamodb = self.adapter._get_db_handler()
+            table = dynamodb.describe_table(TableName=self.adapter.table_name)
+            self.stream_arn = table["Table"]["LatestStreamArn"]
+
+        return self.stream_arn
+
+    def _refresh_shards(self) -> None:
+        stream_arn = self._get_stream_arn()
+        request = {"StreamArn": stream_arn}
+        shards = []
+
+        while True:
+            description = self._client.describe_stream(**request)["StreamDescription"]
+            shards.extend(description.get("Shards", []))
+
+            if "LastEvaluatedShardId" not in description:
+                break
+
+            request["ExclusiveStartShardId"] = description["LastEvaluatedShardId"]
+
+        iterator_type = "TRIM_HORIZON" if self._started else "LATEST"
+
+        for shard in shards:
+            shard_id = shard["ShardId"]
+
+            if shard_id in self._iterators or shard_id in self._finished:
+                continue
+
+            response = self._client.get_shard_iterator(
+                StreamArn=stream_arn,
+                ShardId=shard_id,
+                ShardIteratorType=iterator_type,
+            )
+            self._iterators[shard_id] = response["ShardIterator"]
+
+        self._started = True
+        self._refreshed_at = time.monotonic()
+
+    def start(self) -> None:
+        if not self._started:
+            self._refresh_shards()
+
+    def get_records(self) -> list[dict]:
+        if (
+            not self._started
+            or not self._iterators
+            or time.monotonic() - self._refreshed_at >= self.shard_refresh_interval
+        ):
+            self._refresh_shards()
+
+        records = []
+
+        for shard_id, iterator in list(self._iterators.items()):
+            response = self._client.get_records(ShardIterator=iterator)
+            records.extend(response.get("Records", []))
+
+            if response.get("NextShardIterator"):
+                self._iterators[shard_id] = response["NextShardIterator"]
+            else:
+                # the shard is closed, its children are picked up on the next refresh
+                del self._iterators[shard_id]
+                self._finished.add(shard_id)
+                self._refreshed_at = 0.0
+
+        return records
+
+    def reset(self) -> None:
+        self._iterators.clear()
+        self._finished.clear()
+        self._started = False
+
+
+class StreamWatcher(Watcher):
+    """Casbin watcher that applies the table's DynamoDB Stream to an enforcer
+
+    INSERT records add the rule to the enforcer's model, REMOVE records remove it
+    and MODIFY does both, one rule at a time and without writing back to the table.
+    The table needs a stream with NEW_AND_OLD_IMAGES (see table_stream_view_type).
+    When the stream cannot be read the update callback, enforcer.load_policy by
+    default, is called to resynchronise with a full load. The new stream position is
+    taken before that load, so no write made during it is missed, and a load that
+    fails is retried every interval until it succeeds.
+
+    The model is changed from the watcher thread. Pass a lock that the application
+    also holds around enforce calls when they must not see a rule half applied.
+
+    Args:
+        enforcer: Enforcer kept in sync
+        reader: (Optional) StreamReader, defaults to a DynamoDBStreamReader for the enforcer's adapter
+        interval: (Optional) Seconds between stream polls
+        start: (Optional) Start the polling thread immediately
+        lock: (Optional) Context manager held while records are applied
+    """
+
+    def __init__(
+        self,
+        enforcer: Any,
+        reader: StreamReader | None = None,
+        *,
+        interval: float = 0.5,
+        start: bool = True,
+        lock: Any | None = None,
+    ) -> None:
+        self.enforcer = enforcer
+        self.adapter = enforcer.get_adapter()
+        self.reader = (
+            reader if reader is not None else DynamoDBStreamReader(self.adapter)
+        )
+        self.interval = interval
+        self.lock = lock if lock is not None else threading.Lock()
+        self._callback: Callable | None = enforcer.load_policy
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._needs_resync = False
+
+        if start:
+            self.start()
+
+    def set_update_callback(self, func: Callable) -> None:
+        self._callback = func
+
+    def update(self) -> None:
+        """changes reach other nodes through the stream, nothing to publish"""
+        pass
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+
+        self._thread = threading.Thread(
+            target=self._run, name="dycasbin-stream-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        self.reader.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self._needs_resync:
+                    self._resync()
+                else:
+                    self.poll()
+            except Exception:
+                if self._needs_resync:
+                    logger.exception("reloading the policy failed, retrying")
+                else:
+                    logger.exception(
+                        "reading the policy stream failed, reloading policy"
+                    )
+                    self._needs_resync = True
+
+            self._stop.wait(self.interval)
+
+    def _resync(self) -> None:
+        """Take a new stream position, then reload the policy through the callback."""
+        self.reader.reset()
+        self.reader.start()
+
+        if self._callback is not None:
+            self._callback()
+
+        self._needs_resync = False
+
+    def poll(self) -> int:
+        """Apply the records that arrived since the last poll, return how many were read."""
+        records = self.reader.get_records()
+
+        with self.lock:
+            for record in records:
+                self.apply_record(record)
+
+        return len(records)
+
+    def apply_record(self, record: dict) -> None:
+        event = record.get("eventName")
+        images = record.get("dynamodb", {})
+
+        if event in ("REMOVE", "MODIFY") and "OldImage" in images:
+            self._apply(PolicyOp.Policy_remove, images["OldImage"])
+
+        if event in ("INSERT", "MODIFY") and "NewImage" in images:
+            self._apply(PolicyOp.Policy_add, images["NewImage"])
+
+    def _apply(self, op: PolicyOp, item: dict) -> None:
+        if not self.adapter._is_rule_item(item):
+            return
+
+        ptype = item["ptype"]["S"]
+        sec = ptype[0]
+        model = self.enforcer.get_model()
+
+        if sec not in model.model or ptype not in model.model[sec]:
+            return
+
+        rule = self.adapter.get_rule_from_item(item)
+
+        if op == PolicyOp.Policy_add:
+            changed = model.add_policy(sec, ptype, rule)
+        else:
+            changed = model.remove_policy(sec, ptype, rule)
+
+        if changed and sec == "g" and ptype in self.enforcer.rm_map:
+            model.build_incremental_role_links(
+                self.enforcer.get_named_role_manager(ptype), op, sec, ptype, [rule]
+            )
@@ -223,11 +223,13 @@ class TestManagement(unittest.TestCase):
         self.assertTrue(result)
 
     def test_add_grouping_policies(self):
-        # Not implemented
         result = self.e.add_grouping_policies(
             [["jIJv0pqSRr", "data4_admin"], ["eybi6hf6m0", "data5_admin"]]
         )
-        self.assertFalse(result)
+        self.assertTrue(result)
+        self.e.load_policy()
+        result = self.e.has_grouping_policy("eybi6hf6m0", "data5_admin")
+        self.assertTrue(result)
 
     def test_remove_grouping_policy(self):
         # Not implemented
@@ -238,9 +240,11 @@ class TestManagement(unittest.TestCase):
         self.assertFalse(result)
 
     def test_remove_grouping_policies(self):
-        # Not implemented
         self.e.add_grouping_policy("uFRsrJ2gJe", "data2_admin")
         result = self.e.remove_grouping_policies([["uFRsrJ2gJe", "data2_admin"]])
+        self.assertTrue(result)
+        self.e.load_policy()
+        result = self.e.has_grouping_policy("uFRsrJ2gJe", "data2_admin")
         self.assertFalse(result)
 
     def test_remove_filtered_grouping_policy(self):
@@ -253,7 +257,7 @@ class TestManagement(unittest.TestCase):
         result = self.e.remove_named_grouping_policies(
             "g", [["IL8Cvh6sqL", "data4_admin"], ["vVm78hI07v", "data5_admin"]]
         )
-        self.assertFalse(result)
+        self.assertTrue(result)
 
     def test_remove_named_grouping_policy_case2(self):
         self.e.add_grouping_policy("z1oZ0MWTqW", "data2_admin")
@@ -278,6 +282,28 @@ class TestManagement(unittest.TestCase):
         )
         self.assertFalse(result)
 
+    def test_update_policies_case2(self):
+        self.e.add_policies(
+            [["AV4nqZl3lU", "files", "read"], ["AV4nqZl3lU", "logs", "read"]]
+        )
+        result = self.e.update_policies(
+            [["AV4nqZl3lU", "files", "read"], ["AV4nqZl3lU", "logs", "read"]],
+            [["AV4nqZl3lU", "files", "write"], ["AV4nqZl3lU", "logs", "write"]],
+        )
+        self.assertTrue(result)
+        self.e.load_policy()
+        result = self.e.get_policy()
+        self.assertIn(["AV4nqZl3lU", "files", "write"], result)
+        self.assertNotIn(["AV4nqZl3lU", "logs", "read"], result)
+
+    def test_load_filtered_policy(self):
+        self.e.add_policy("hX2bWq9EoT", "data4", "write")
+        self.e.add_policy("Kd83mQpLz0", "data4", "write")
+        self.e.load_filtered_policy(adapter.Filter(ptype=["p"], v0=["hX2bWq9EoT"]))
+        self.assertTrue(self.e.is_filtered())
+        result = self.e.get_policy()
+        self.assertListEqual([["hX2bWq9EoT", "data4", "write"]], result)
+
     def tearDown(self):
         client = boto3.client(
             "dynamodb",
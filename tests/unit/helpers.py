@@ -0,0 +1,18 @@
+from unittest.mock import patch
+
+from python_dycasbin import adapter
+
+
+def adapter_item(ptype, *values):
+    item = {"ptype": {"S": ptype}, "id": {"S": "-".join((ptype,) + values)}}
+    for i, v in enumerate(values):
+        item["v{}".format(i)] = {"S": v}
+    return item
+
+
+def fake_adapter(adapter_class, table_name, client, **kwargs):
+    # every test gets a new FakeDynamoDB, so the table is never known to exist
+    adapter.clear_table_cache()
+
+    with patch("boto3.client", return_value=client):
+        return adapter_class(table_name=table_name, **kwargs)
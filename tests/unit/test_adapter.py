@@ -1,7 +1,11 @@
 import unittest
-from unittest.mock import patch
+from unittest.mock import ANY, patch
+
+import casbin
 
 from python_dycasbin import adapter
+from python_dycasbin.fake_dynamodb import FakeDynamoDB, ResourceNotFoundException
+from tests.unit.helpers import adapter_item
 
 policy_line = "p, alice, data1, read"
 table_name = "casbin_rule"
@@ -11,6 +15,16 @@ def mock_get_line_from_item(item):
     return policy_line
 
 
+def missing_table(mock_client):
+    """Make the mocked client report that the table does not exist yet."""
+    client = mock_client.return_value
+    client.exceptions.ResourceNotFoundException = ResourceNotFoundException
+    client.describe_table.side_effect = ResourceNotFoundException("no table")
+    client.create_table.side_effect = lambda **definition: {
+        "TableDescription": dict(definition, TableStatus="ACTIVE")
+    }
+
+
 class TestAdapter(unittest.TestCase):
     def setUp(self):
         self.table_name = "casbin_rule"
@@ -20,9 +34,11 @@ class TestAdapter(unittest.TestCase):
         self.aws_secret_access_key = "anything"
         self.aws_use_ssl = False
         self.aws_verify = False
+        adapter.clear_table_cache()
 
-    @patch("python_dycasbin.adapter.boto3.client")
+    @patch("boto3.client")
     def test_create_table_provisioned(self, mock_client):
+        missing_table(mock_client)
         _ = adapter.Adapter(
             table_name=self.table_name,
             aws_endpoint_url=self.aws_endpoint_url,
@@ -43,6 +59,7 @@ class TestAdapter(unittest.TestCase):
             aws_secret_access_key="anything",
             aws_session_token=None,
             aws_account_id=None,
+            config=ANY,
         )
 
         mock_client.return_value.create_table.assert_called_once_with(
@@ -83,8 +100,9 @@ class TestAdapter(unittest.TestCase):
             ProvisionedThroughput={"ReadCapacityUnits": 10, "WriteCapacityUnits": 10},
         )
 
-    @patch("python_dycasbin.adapter.boto3.client")
+    @patch("boto3.client")
     def test_create_table_ondemand(self, mock_client):
+        missing_table(mock_client)
         _ = adapter.Adapter(
             table_name=self.table_name,
             table_billing_mode="PAY_PER_REQUEST",
@@ -106,6 +124,7 @@ class TestAdapter(unittest.TestCase):
             aws_secret_access_key="anything",
             aws_session_token=None,
             aws_account_id=None,
+            config=ANY,
         )
 
         mock_client.return_value.create_table.assert_called_once_with(
@@ -146,7 +165,93 @@ class TestAdapter(unittest.TestCase):
             OnDemandThroughput={"MaxReadRequestUnits": 10, "MaxWriteRequestUnits": 10},
         )
 
-    @patch("python_dycasbin.adapter.boto3.client")
+    def test_existing_table_is_described_once(self):
+        client = FakeDynamoDB()
+        client.create_table(
+            **adapter.Adapter(table_create_table=False)._table_definition(
+                self.table_name, None, "PAY_PER_REQUEST", None, None, None, None
+            )
+        )
+
+        with (
+            patch("boto3.client", return_value=client),
+            patch.object(client, "create_table") as create_table,
+            patch.object(
+                client, "describe_table", wraps=client.describe_table
+            ) as describe_table,
+        ):
+            adapter.Adapter(table_name=self.table_name)
+            adapter.Adapter(table_name=self.table_name)
+
+        create_table.assert_not_called()
+        describe_table.assert_called_once_with(TableName=self.table_name)
+
+    @patch("python_dycasbin.adapter.time.sleep")
+    @patch("boto3.client")
+    def test_created_table_is_waited_for(self, mock_client, sleep):
+        missing_table(mock_client)
+        client = mock_client.return_value
+        indexes = [
+            {"IndexName": "v0-v1-index", "IndexStatus": "CREATING"},
+            {"IndexName": "v1-v0-index", "IndexStatus": "CREATING"},
+        ]
+        client.create_table.side_effect = None
+        client.create_table.return_value = {
+            "TableDescription": {"TableStatus": "CREATING"}
+        }
+        client.describe_table.side_effect = [
+            ResourceNotFoundException("no table"),
+            {"Table": {"TableStatus": "ACTIVE", "GlobalSecondaryIndexes": indexes}},
+            {
+                "Table": {
+                    "TableStatus": "ACTIVE",
+                    "GlobalSecondaryIndexes": [
+                        dict(index, IndexStatus="ACTIVE") for index in indexes
+                    ],
+                }
+            },
+        ]
+
+        adapter.Adapter(table_name=self.table_name)
+
+        client.create_table.assert_called_once()
+        self.assertEqual(client.describe_table.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    @patch("python_dycasbin.adapter.time.sleep")
+    @patch("boto3.client")
+    def test_created_table_timeout(self, mock_client, sleep):
+        missing_table(mock_client)
+        client = mock_client.return_value
+        client.create_table.side_effect = None
+        client.create_table.return_value = {
+            "TableDescription": {"TableStatus": "CREATING"}
+        }
+        client.describe_table.side_effect = [
+            ResourceNotFoundException("no table"),
+            {"Table": {"TableStatus": "CREATING"}},
+        ]
+
+        with self.assertRaises(TimeoutError):
+            adapter.Adapter(table_name=self.table_name, table_create_timeout=0)
+
+    def test_missing_index_warns(self):
+        client = FakeDynamoDB()
+        client.create_table(
+            **adapter.Adapter(table_create_table=False)._table_definition(
+                self.table_name, None, "PAY_PER_REQUEST", None, None, None, None
+            )
+        )
+
+        with (
+            patch("boto3.client", return_value=client),
+            self.assertWarnsRegex(UserWarning, "domain-index"),
+        ):
+            adapter.Adapter(
+                table_name=self.table_name, table_domain_fields={"p": 1, "g": 2}
+            )
+
+    @patch("boto3.client")
     def test_dont_create_table(self, mock_client):
         _ = adapter.Adapter(
             table_name=self.table_name,
@@ -159,3 +264,491 @@ class TestAdapter(unittest.TestCase):
             aws_verify=self.aws_verify,
         )
         mock_client.return_value.create_table.assert_not_called()
+
+    @patch("boto3.client")
+    def test_load_policy_parallel_scan(self, mock_client):
+        pages = {
+            (0, None): {
+                "Items": [adapter_item("p", "alice", "data1", "read")],
+                "LastEvaluatedKey": {"id": {"S": "a"}},
+            },
+            (0, "a"): {"Items": [adapter_item("p", "bob", "data2", "write")]},
+            (1, None): {"Items": [adapter_item("g", "alice", "admin")]},
+        }
+
+        def scan(**kwargs):
+            start = kwargs.get("ExclusiveStartKey", {}).get("id", {}).get("S")
+            return pages[(kwargs["Segment"], start)]
+
+        mock_client.return_value.scan.side_effect = scan
+        test_adapter = adapter.Adapter(
+            table_name=self.table_name, table_create_table=False, scan_segments=2
+        )
+        model = casbin.Enforcer.new_model("tests/e2e/rbac_model.conf")
+        test_adapter.load_policy(model)
+
+        self.assertEqual(mock_client.return_value.scan.call_count, 3)
+        self.assertCountEqual(
+            model.get_policy("p", "p"),
+            [["alice", "data1", "read"], ["bob", "data2", "write"]],
+        )
+        self.assertEqual(model.get_policy("g", "g"), [["alice", "admin"]])
+
+    @patch("boto3.client")
+    def test_save_policy_sync_writes_changes(self, mock_client):
+        test_adapter = adapter.Adapter(
+            table_name=self.table_name, table_create_table=False, save_mode="sync"
+        )
+        kept = test_adapter.convert_to_item("p", ["alice", "data1", "read"])
+        stale = test_adapter.convert_to_item("p", ["bob", "data2", "write"])
+        mock_client.return_value.scan.return_value = {
+            "Items": [
+                {"id": kept["id"], "ptype": kept["ptype"]},
+                {"id": stale["id"], "ptype": stale["ptype"]},
+                {"id": {"S": "__dycasbin_version__"}},
+            ]
+        }
+        mock_client.return_value.batch_write_item.return_value = {}
+        model = casbin.Enforcer.new_model("tests/e2e/rbac_model.conf")
+        model.add_policy("p", "p", ["alice", "data1", "read"])
+        model.add_policy("g", "g", ["alice", "admin"])
+
+        self.assertTrue(test_adapter.save_policy(model))
+
+        mock_client.return_value.scan.assert_called_once_with(
+            TableName=self.table_name, ProjectionExpression="id, ptype"
+        )
+        mock_client.return_value.batch_write_item.assert_called_once_with(
+            RequestItems={
+                self.table_name: [
+                    {
+                        "PutRequest": {
+                            "Item": test_adapter.convert_to_item(
+                                "g", ["alice", "admin"]
+                            )
+                        }
+                    },
+                    {"DeleteRequest": {"Key": {"id": stale["id"]}}},
+                ]
+            }
+        )
+
+    @patch("boto3.client")
+    def test_id_schemes(self, mock_client):
+        md5_adapter = adapter.Adapter(
+            table_name=self.table_name, table_create_table=False
+        )
+        blake_adapter = adapter.Adapter(
+            table_name=self.table_name,
+            table_create_table=False,
+            table_id_scheme="blake2b",
+        )
+        rule = ["alice", "data1", "read"]
+
+        self.assertEqual(
+            md5_adapter.get_id("p", rule),
+            md5_adapter.convert_to_item("p", rule)["id"]["S"],
+        )
+        self.assertEqual(
+            blake_adapter.get_id("p", rule),
+            blake_adapter.convert_to_item("p", iter(rule))["id"]["S"],
+        )
+        self.assertEqual(
+            blake_adapter.get_id("p", rule, "md5"), md5_adapter.get_id("p", rule)
+        )
+        self.assertEqual(len(blake_adapter.get_id("p", rule)), 32)
+        self.assertNotEqual(
+            blake_adapter.get_id("p", ["a, b", "c"]),
+            blake_adapter.get_id("p", ["a", "b, c"]),
+        )
+        self.assertNotEqual(
+            blake_adapter.get_id("p", ["ab", ""]), blake_adapter.get_id("p", ["a", "b"])
+        )
+
+        with self.assertRaises(ValueError):
+            adapter.Adapter(table_create_table=False, table_id_scheme="sha1")
+
+    @patch("boto3.client")
+    def test_remove_policy_deletes_legacy_id(self, mock_client):
+        test_adapter = adapter.Adapter(
+            table_name=self.table_name,
+            table_create_table=False,
+            table_id_scheme="blake2b",
+            table_legacy_id_scheme="md5",
+        )
+        rule = ["alice", "data1", "read"]
+        test_adapter.remove_policy("p", "p", rule)
+
+        deleted = [
+            c.kwargs["Key"]["id"]["S"]
+            for c in mock_client.return_value.delete_item.call_args_list
+        ]
+        self.assertEqual(
+            deleted,
+            [test_adapter.get_id("p", rule), test_adapter.get_id("p", rule, "md5")],
+        )
+
+    @patch("boto3.client")
+    def test_add_policies_batches(self, mock_client):
+        mock_client.return_value.batch_write_item.return_value = {}
+        test_adapter = adapter.Adapter(
+            table_name=self.table_name, table_create_table=False
+        )
+        rules = [["user{}".format(i), "data1", "read"] for i in range(60)]
+        test_adapter.add_policies("p", "p", rules + rules[:5])
+
+        calls = mock_client.return_value.batch_write_item.call_args_list
+        sizes = sorted(len(c.kwargs["RequestItems"][self.table_name]) for c in calls)
+        self.assertEqual(sizes, [10, 25, 25])
+
+    @patch("boto3.client")
+    def test_remove_policies_batches(self, mock_client):
+        mock_client.return_value.batch_write_item.return_value = {}
+        test_adapter = adapter.Adapter(
+            table_name=self.table_name, table_create_table=False
+        )
+        rules = [["alice", "data1", "read"], ["bob", "data2", "write"]]
+        test_adapter.remove_policies("p", "p", rules)
+
+        mock_client.return_value.batch_write_item.assert_called_once_with(
+            RequestItems={
+                self.table_name: [
+                    {
+                        "DeleteRequest": {
+                            "Key": {"id": test_adapter.convert_to_item("p", rule)["id"]}
+                        }
+                    }
+                    for rule in rules
+                ]
+            }
+        )
+
+    @patch("boto3.client")
+    def test_update_policy_transaction(self, mock_client):
+        test_adapter = adapter.Adapter(
+            table_name=self.table_name, table_create_table=False
+        )
+        old_rule = ["alice", "data1", "read"]
+        new_rule = ["alice", "data1", "write"]
+        test_adapter.update_policy("p", "p", old_rule, new_rule)
+
+        mock_client.return_value.put_item.assert_not_called()
+        mock_client.return_value.delete_item.assert_not_called()
+        mock_client.return_value.transact_write_items.assert_called_once_with(
+            TransactItems=[
+                {
+                    "Put": {
+                        "TableName": self.table_name,
+                        "Item": test_adapter.convert_to_item("p", new_rule),
+                    }
+                },
+                {
+                    "Delete": {
+                        "TableName": self.table_name,
+                        "Key": {
+                            "id": test_adapter.convert_to_item("p", old_rule)["id"]
+                        },
+                    }
+                },
+            ]
+        )
+
+    @patch("boto3.client")
+    def test_update_policies_chunks_transactions(self, mock_client):
+        test_adapter = adapter.Adapter(
+            table_name=self.table_name, table_create_table=False
+        )
+        old_rules = [["user{}".format(i), "data1", "read"] for i in range(120)]
+        new_rules = [["user{}".format(i), "data1", "write"] for i in range(120)]
+        self.assertTrue(test_adapter.update_policies("p", "p", old_rules, new_rules))
+
+        calls = mock_client.return_value.transact_write_items.call_args_list
+        self.assertEqual(
+            [len(c.kwargs["TransactItems"]) for c in calls], [100, 100, 40]
+        )
+
+    @patch("boto3.client")
+    def test_update_filtered_policies(self, mock_client):
+        mock_client.return_value.query.return_value = {
+            "Items": [adapter_item("p", "alice", "data1", "read")]
+        }
+        test_adapter = adapter.Adapter(
+            table_name=self.table_name, table_create_table=False
+        )
+        old_rules = test_adapter.update_filtered_policies(
+            "p", "p", [["alice", "data2", "read"]], 1, "data1"
+        )
+
+        self.assertEqual(old_rules, [["alice", "data1", "read"]])
+        query_kwargs = mock_client.return_value.query.call_args.kwargs
+        self.assertEqual(query_kwargs["IndexName"], "v1-v0-index")
+        self.assertEqual(query_kwargs["KeyConditionExpression"], "v1 = :v1")
+        items = mock_client.return_value.transact_write_items.call_args.kwargs[
+            "TransactItems"
+        ]
+        self.assertEqual([list(i) for i in items], [["Put"], ["Delete"]])
+
+    @patch("python_dycasbin.adapter.time.sleep")
+    @patch("boto3.client")
+    def test_write_batch_backoff(self, mock_client, mock_sleep):
+        request = {"PutRequest": {"Item": adapter_item("p", "alice", "data1", "read")}}
+        mock_client.return_value.batch_write_item.side_effect = [
+            {"UnprocessedItems": {self.table_name: [request]}},
+            {"UnprocessedItems": {self.table_name: [request]}},
+            {},
+        ]
+        test_adapter = adapter.Adapter(
+            table_name=self.table_name, table_create_table=False
+        )
+        test_adapter._write_batch([request])
+
+        self.assertEqual(mock_sleep.call_count, 2)
+        for call in mock_sleep.call_args_list:
+            self.assertLessEqual(call.args[0], test_adapter.write_backoff_max)
+        self.assertEqual(
+            test_adapter.get_write_stats(),
+            {
+                "batches": 1,
+                "requests": 3,
+                "retries": 2,
+                "unprocessed_items": 2,
+                "failed_batches": 0,
+            },
+        )
+
+    @patch("python_dycasbin.adapter.time.sleep")
+    @patch("boto3.client")
+    def test_write_batch_gives_up(self, mock_client, mock_sleep):
+        request = {"PutRequest": {"Item": adapter_item("p", "alice", "data1", "read")}}
+        mock_client.return_value.batch_write_item.return_value = {
+            "UnprocessedItems": {self.table_name: [request]}
+        }
+        test_adapter = adapter.Adapter(
+            table_name=self.table_name, table_create_table=False, write_max_attempts=3
+        )
+
+        with self.assertRaises(adapter.UnprocessedItemsError) as ctx:
+            test_adapter._write_batch([request])
+
+        self.assertEqual(ctx.exception.unprocessed_items, {self.table_name: [request]})
+        self.assertEqual(mock_client.return_value.batch_write_item.call_count, 3)
+        self.assertEqual(test_adapter.get_write_stats()["failed_batches"], 1)
+
+    @patch("boto3.client")
+    def test_remove_filtered_policy_queries_index(self, mock_client):
+        mock_client.return_value.query.side_effect = [
+            {
+                "Items": [adapter_item("g", "alice", "admin")],
+                "LastEvaluatedKey": {"id": {"S": "a"}},
+            },
+            {"Items": [adapter_item("g", "alice", "admin", "domain1")]},
+        ]
+        mock_client.return_value.batch_write_item.return_value = {}
+        test_adapter = adapter.Adapter(
+            table_name=self.table_name, table_create_table=False
+        )
+        test_adapter.remove_filtered_policy("g", "g", 0, "alice", "admin")
+
+        mock_client.return_value.scan.assert_not_called()
+        query_kwargs = mock_client.return_value.query.call_args_list[0].kwargs
+        self.assertEqual(
+            query_kwargs,
+            {
+                "TableName": self.table_name,
+                "IndexName": "v0-v1-index",
+                "KeyConditionExpression": "v0 = :v0 and v1 = :v1",
+                "FilterExpression": "ptype = :ptype",
+                "ExpressionAttributeValues": {
+                    ":ptype": {"S": "g"},
+                    ":v0": {"S": "alice"},
+                    ":v1": {"S": "admin"},
+                },
+            },
+        )
+        requests = mock_client.return_value.batch_write_item.call_args.kwargs[
+            "RequestItems"
+        ][self.table_name]
+        self.assertEqual(len(requests), 2)
+
+    @patch("boto3.client")
+    def test_remove_filtered_policy_scans_unindexed_field(self, mock_client):
+        mock_client.return_value.scan.return_value = {"Items": []}
+        test_adapter = adapter.Adapter(
+            table_name=self.table_name, table_create_table=False
+        )
+        test_adapter.remove_filtered_policy("p", "p", 2, "read")
+
+        mock_client.return_value.query.assert_not_called()
+        scan_kwargs = mock_client.return_value.scan.call_args.kwargs
+        self.assertEqual(scan_kwargs["FilterExpression"], "ptype = :ptype and v2 = :v2")
+
+    @patch("boto3.client")
+    def test_load_filtered_policy_queries_each_subject(self, mock_client):
+        def query(**kwargs):
+            sub = kwargs["ExpressionAttributeValues"][":v0"]["S"]
+            if "ExclusiveStartKey" in kwargs:
+                return {"Items": [adapter_item("p", sub, "data2", "read")]}
+            return {
+                "Items": [adapter_item("p", sub, "data1", "read")],
+                "LastEvaluatedKey": {"id": {"S": sub}},
+            }
+
+        mock_client.return_value.query.side_effect = query
+        test_adapter = adapter.Adapter(
+            table_name=self.table_name, table_create_table=False, scan_max_workers=2
+        )
+        model = casbin.Enforcer.new_model("tests/e2e/rbac_model.conf")
+        test_adapter.load_filtered_policy(
+            model, adapter.Filter(ptype=["p"], v0=["alice", "bob"], v2=["read"])
+        )
+
+        self.assertTrue(test_adapter.is_filtered())
+        mock_client.return_value.scan.assert_not_called()
+        self.assertEqual(mock_client.return_value.query.call_count, 4)
+        query_kwargs = mock_client.return_value.query.call_args.kwargs
+        self.assertEqual(query_kwargs["IndexName"], "v0-v1-index")
+        self.assertEqual(
+            query_kwargs["FilterExpression"], "ptype = :ptype and v2 = :v2"
+        )
+        self.assertCountEqual(
+            model.get_policy("p", "p"),
+            [
+                ["alice", "data1", "read"],
+                ["alice", "data2", "read"],
+                ["bob", "data1", "read"],
+                ["bob", "data2", "read"],
+            ],
+        )
+
+    @patch("boto3.client")
+    def test_load_filtered_policy_scans_unindexed_filter(self, mock_client):
+        mock_client.return_value.scan.return_value = {"Items": []}
+        test_adapter = adapter.Adapter(
+            table_name=self.table_name, table_create_table=False
+        )
+        model = casbin.Enforcer.new_model("tests/e2e/rbac_model.conf")
+        test_adapter.load_filtered_policy(model, adapter.Filter(v2=["read", "write"]))
+
+        mock_client.return_value.scan.assert_called_once_with(
+            TableName=self.table_name,
+            FilterExpression="v2 IN (:v2_0, :v2_1)",
+            ExpressionAttributeValues={":v2_0": {"S": "read"}, ":v2_1": {"S": "write"}},
+        )
+        test_adapter.load_policy(model)
+        self.assertFalse(test_adapter.is_filtered())
+
+    @patch("boto3.client")
+    def test_client_per_instance_with_config(self, mock_client):
+        mock_client.side_effect = lambda *args, **kwargs: object()
+        first = adapter.Adapter(
+            table_name="first",
+            table_create_table=False,
+            aws_max_pool_connections=64,
+            aws_connect_timeout=2,
+            aws_read_timeout=5,
+            aws_retry_mode="adaptive",
+            aws_max_attempts=4,
+        )
+        second = adapter.Adapter(table_name="second", table_create_table=False)
+
+        self.assertIs(first._get_db_handler(), first._get_db_handler())
+        self.assertIs(second._get_db_handler(), second._get_db_handler())
+        self.assertIsNot(first._get_db_handler(), second._get_db_handler())
+        self.assertEqual(mock_client.call_count, 2)
+
+        config = mock_client.call_args_list[0].kwargs["config"]
+        self.assertEqual(config.max_pool_connections, 64)
+        self.assertEqual(config.connect_timeout, 2)
+        self.assertEqual(config.read_timeout, 5)
+        self.assertEqual(config.retries, {"mode": "adaptive", "total_max_attempts": 4})
+
+    @patch("boto3.client")
+    def test_iter_policies_prefetches_next_page(self, mock_client):
+        pages = {
+            None: {
+                "Items": [adapter_item("p", "alice", "data1", "read")],
+                "LastEvaluatedKey": {"id": {"S": "a"}},
+            },
+            "a": {
+                "Items": [
+                    {"id": {"S": "__dycasbin_version__"}, "version": {"S": "v1"}},
+                    adapter_item("g", "alice", "admin"),
+                ]
+            },
+        }
+        mock_client.return_value.scan.side_effect = lambda **kwargs: pages[
+            kwargs.get("ExclusiveStartKey", {}).get("id", {}).get("S")
+        ]
+        test_adapter = adapter.Adapter(table_name=table_name, table_create_table=False)
+
+        rules = test_adapter.iter_policies(page_size=2)
+        self.assertEqual(next(rules), ("p", ["alice", "data1", "read"]))
+        # the second page was requested before the first one was used up
+        self.assertEqual(mock_client.return_value.scan.call_count, 2)
+        self.assertEqual(list(rules), [("g", ["alice", "admin"])])
+        mock_client.return_value.scan.assert_called_with(
+            TableName=table_name, Limit=2, ExclusiveStartKey={"id": {"S": "a"}}
+        )
+
+        mock_client.return_value.query.return_value = {
+            "Items": [adapter_item("p", "bob", "data2", "write")]
+        }
+        self.assertEqual(
+            list(test_adapter.iter_policies("p", adapter.Filter(v0=["bob"]))),
+            [("p", ["bob", "data2", "write"])],
+        )
+        mock_client.return_value.query.assert_called_once_with(
+            TableName=table_name,
+            IndexName="v0-v1-index",
+            KeyConditionExpression="v0 = :v0",
+            FilterExpression="ptype = :ptype",
+            ExpressionAttributeValues={":ptype": {"S": "p"}, ":v0": {"S": "bob"}},
+        )
+        self.assertEqual(
+            list(test_adapter.iter_policies("g", adapter.Filter(ptype=["p"]))), []
+        )
+
+    @patch("boto3.client")
+    def test_load_policy_lines_keeps_commas(self, mock_client):
+        test_adapter = adapter.Adapter(table_name=table_name, table_create_table=False)
+        model = casbin.Enforcer.new_model("tests/e2e/rbac_model.conf")
+        items = [
+            adapter_item("p", "alice", "data1", "read, write"),
+            dict(adapter_item("g", "alice", "admin"), domain={"S": "d1"}),
+            {"id": {"S": "__dycasbin_version__"}, "version": {"S": "v1"}},
+        ]
+        test_adapter.load_policy_lines({"Items": items}, model)
+
+        policy = model.model["p"]["p"]
+        self.assertEqual(policy.policy, [["alice", "data1", "read, write"]])
+        self.assertEqual(policy.policy_map, {"alice,data1,read, write": 0})
+        self.assertEqual(model.model["g"]["g"].policy, [["alice", "admin"]])
+        self.assertEqual(test_adapter.get_line_from_item(items[1]), "g, alice, admin")
+
+    @patch("boto3.client")
+    def test_load_policy_lines_strips_values(self, mock_client):
+        test_adapter = adapter.Adapter(table_name=table_name, table_create_table=False)
+        model = casbin.Enforcer.new_model("tests/e2e/rbac_model.conf")
+        items = [adapter_item("p", " alice", "data1 ", " read ")]
+        test_adapter.load_policy_lines({"Items": items}, model, {})
+
+        policy = model.model["p"]["p"]
+        self.assertEqual(policy.policy, [["alice", "data1", "read"]])
+        self.assertEqual(policy.policy_map, {"alice,data1,read": 0})
+
+    @patch("boto3.client")
+    def test_load_policy_interns_values(self, mock_client):
+        mock_client.return_value.scan.side_effect = [
+            {
+                "Items": [adapter_item("p", "admin", "data1", "re" + "ad")],
+                "LastEvaluatedKey": {"id": {"S": "a"}},
+            },
+            {"Items": [adapter_item("p", "admin", "data2", "".join(["re", "ad"]))]},
+        ]
+        test_adapter = adapter.Adapter(table_name=table_name, table_create_table=False)
+        model = casbin.Enforcer.new_model("tests/e2e/rbac_model.conf")
+        test_adapter.load_policy(model)
+
+        first, second = model.model["p"]["p"].policy
+        self.assertIs(first[2], second[2])
+        self.assertEqual(second, ["admin", "data2", "read"])
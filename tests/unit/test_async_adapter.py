@@ -0,0 +1,250 @@
+import importlib.util
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import casbin
+from botocore.config import Config
+
+from python_dycasbin import adapter, async_adapter, fast_decode, metrics, rate_limit
+from python_dycasbin.fake_dynamodb import ResourceNotFoundException
+from tests.unit.helpers import adapter_item
+
+table_name = "casbin_rule"
+
+
+def mock_client():
+    client = MagicMock()
+    for name in (
+        "scan",
+        "query",
+        "put_item",
+        "delete_item",
+        "batch_write_item",
+        "transact_write_items",
+        "get_item",
+        "batch_get_item",
+    ):
+        setattr(client, name, AsyncMock(return_value={}))
+    return client
+
+
+class TestAsyncAdapter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.client = mock_client()
+        self.adapter = async_adapter.AsyncAdapter(
+            table_name=table_name, table_create_table=False, scan_segments=2
+        )
+        patcher = patch.object(
+            self.adapter, "_get_db_handler", AsyncMock(return_value=self.client)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_load_policy_parallel_scan(self):
+        pages = {
+            (0, None): {
+                "Items": [adapter_item("p", "alice", "data1", "read")],
+                "LastEvaluatedKey": {"id": {"S": "a"}},
+            },
+            (0, "a"): {"Items": [adapter_item("p", "bob", "data2", "write")]},
+            (1, None): {"Items": [adapter_item("g", "alice", "admin")]},
+        }
+
+        async def scan(**kwargs):
+            start = kwargs.get("ExclusiveStartKey", {}).get("id", {}).get("S")
+            return pages[(kwargs["Segment"], start)]
+
+        self.client.scan.side_effect = scan
+        e = casbin.AsyncEnforcer("tests/e2e/rbac_model.conf", self.adapter)
+        await e.load_policy()
+
+        self.assertCountEqual(
+            e.get_policy(), [["alice", "data1", "read"], ["bob", "data2", "write"]]
+        )
+        self.assertTrue(e.enforce("alice", "data1", "read"))
+        self.assertFalse(self.adapter.is_filtered())
+
+    async def test_add_policies_batches(self):
+        rules = [["user{}".format(i), "data1", "read"] for i in range(30)]
+        await self.adapter.add_policies("p", "p", rules)
+
+        calls = self.client.batch_write_item.call_args_list
+        sizes = sorted(len(c.kwargs["RequestItems"][table_name]) for c in calls)
+        self.assertEqual(sizes, [5, 25])
+
+    async def test_save_policy_sync_writes_changes(self):
+        self.adapter.save_mode = "sync"
+        stale = self.adapter.convert_to_item("p", ["bob", "data2", "write"])
+        self.client.scan.return_value = {
+            "Items": [{"id": stale["id"], "ptype": stale["ptype"]}]
+        }
+        model = casbin.Enforcer.new_model("tests/e2e/rbac_model.conf")
+        await self.adapter.save_policy(model)
+
+        self.client.batch_write_item.assert_called_once_with(
+            RequestItems={table_name: [{"DeleteRequest": {"Key": {"id": stale["id"]}}}]}
+        )
+
+    async def test_update_policy_transaction(self):
+        await self.adapter.update_policy(
+            "p", "p", ["alice", "data1", "read"], ["alice", "data1", "write"]
+        )
+        items = self.client.transact_write_items.call_args.kwargs["TransactItems"]
+        self.assertEqual([list(i) for i in items], [["Put"], ["Delete"]])
+
+    async def test_remove_filtered_policy_queries_index(self):
+        self.client.query.return_value = {
+            "Items": [adapter_item("g", "alice", "admin")]
+        }
+        await self.adapter.remove_filtered_policy("g", "g", 0, "alice")
+
+        self.assertEqual(self.client.query.call_args.kwargs["IndexName"], "v0-v1-index")
+        self.client.batch_write_item.assert_awaited_once_with(
+            RequestItems={
+                table_name: [{"DeleteRequest": {"Key": {"id": {"S": "g-alice-admin"}}}}]
+            }
+        )
+
+    async def test_iter_policies(self):
+        pages = {
+            None: {
+                "Items": [adapter_item("p", "alice", "data1", "read")],
+                "LastEvaluatedKey": {"id": {"S": "a"}},
+            },
+            "a": {"Items": [adapter_item("g", "alice", "admin")]},
+        }
+
+        async def scan(**kwargs):
+            return pages[kwargs.get("ExclusiveStartKey", {}).get("id", {}).get("S")]
+
+        self.client.scan.side_effect = scan
+        rules = [rule async for rule in self.adapter.iter_policies()]
+
+        self.assertEqual(
+            rules, [("p", ["alice", "data1", "read"]), ("g", ["alice", "admin"])]
+        )
+
+    async def test_has_rules(self):
+        stored = self.adapter.get_id("p", ["alice", "data1", "read"])
+
+        async def batch_get_item(RequestItems):
+            keys = RequestItems[table_name]["Keys"]
+            return {
+                "Responses": {
+                    table_name: [key for key in keys if key["id"]["S"] == stored]
+                }
+            }
+
+        self.client.batch_get_item.side_effect = batch_get_item
+        self.client.get_item.return_value = {"Item": {"id": {"S": stored}}}
+        found = await self.adapter.has_rules(
+            [("p", ["alice", "data1", "read"]), ("p", ["bob", "data2", "write"])]
+        )
+
+        self.assertEqual(found, [True, False])
+        self.assertTrue(await self.adapter.has_rule("p", ["alice", "data1", "read"]))
+        self.client.get_item.assert_awaited_once()
+
+    async def test_provision_table_once(self):
+        adapter.clear_table_cache()
+        self.addCleanup(adapter.clear_table_cache)
+        definition = self.adapter._table_definition(
+            table_name, None, "PAY_PER_REQUEST", None, None, None, None
+        )
+        self.client.exceptions.ResourceNotFoundException = ResourceNotFoundException
+        self.client.describe_table = AsyncMock(
+            side_effect=ResourceNotFoundException("no table")
+        )
+        self.client.create_table = AsyncMock(
+            return_value={"TableDescription": dict(definition, TableStatus="ACTIVE")}
+        )
+
+        await self.adapter._provision_table(self.client, definition)
+        await self.adapter._provision_table(self.client, definition)
+
+        self.client.create_table.assert_awaited_once_with(**definition)
+        self.client.describe_table.assert_awaited_once_with(TableName=table_name)
+
+
+@unittest.skipUnless(
+    importlib.util.find_spec("aiobotocore"), "aiobotocore is not installed"
+)
+class TestAioClient(unittest.IsolatedAsyncioTestCase):
+    """A real aiobotocore client, talking to a local endpoint with canned responses"""
+
+    def setUp(self):
+        self.requests = []
+        self.responses = {}
+        test = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                operation = self.headers["X-Amz-Target"].split(".")[1]
+                test.requests.append((operation, json.loads(self.rfile.read(length))))
+                body = json.dumps(test.responses[operation]).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-amz-json-1.0")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    async def test_client_settings_and_hooks(self):
+        from aiobotocore.config import AioConfig
+
+        self.responses["Scan"] = {
+            "Items": [adapter_item("p", "alice", "data1", "read")],
+            "Count": 1,
+            "ScannedCount": 1,
+            "ConsumedCapacity": {"TableName": table_name, "CapacityUnits": 0.5},
+        }
+        hook = metrics.InMemoryMetrics()
+        limiter = rate_limit.RateLimiter(100, 100)
+        split_items = MagicMock(wraps=fast_decode.split_items)
+        test_adapter = async_adapter.AsyncAdapter(
+            table_name,
+            table_create_table=False,
+            aws_endpoint_url="http://127.0.0.1:{}".format(self.server.server_port),
+            aws_region_name="us-east-1",
+            aws_access_key_id="test",
+            aws_secret_access_key="test",
+            aws_config=Config(user_agent_extra="dycasbin-test"),
+            metrics_hook=hook,
+            rate_limiter=limiter,
+            scan_fast_decode=True,
+        )
+
+        with patch.object(fast_decode, "split_items", split_items):
+            async with test_adapter:
+                client = await test_adapter._get_db_handler()
+                e = casbin.AsyncEnforcer("tests/e2e/rbac_model.conf", test_adapter)
+                await e.load_policy()
+
+        self.assertIsInstance(client.meta.config, AioConfig)
+        self.assertEqual(client.meta.config.user_agent_extra, "dycasbin-test")
+        self.assertEqual(client.meta.config.max_pool_connections, 50)
+        self.assertEqual(e.get_policy(), [["alice", "data1", "read"]])
+        split_items.assert_called_once()
+        self.assertEqual(self.requests[0][0], "Scan")
+        self.assertEqual(self.requests[0][1]["ReturnConsumedCapacity"], "INDEXES")
+        [call] = hook.snapshot()["calls"]
+        self.assertEqual(
+            (call["caller"], call["operation"], call["items"]),
+            ("load_policy", "Scan", 1),
+        )
+        self.assertEqual(limiter._units["Scan"], 0.8 + 0.2 * 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
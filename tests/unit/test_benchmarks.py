@@ -0,0 +1,46 @@
+import json
+import os
+import tempfile
+import unittest
+
+from benchmarks import bench_adapter, compare
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_bench_fake_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "results.json")
+            bench_adapter.main(
+                [
+                    "--sizes",
+                    "200",
+                    "--repeat",
+                    "2",
+                    "--ops",
+                    "5",
+                    "--scan-segments",
+                    "2",
+                    "--output",
+                    output,
+                ]
+            )
+
+            with open(output) as f:
+                report = json.load(f)
+
+            self.assertEqual(compare.main([output, output, "--threshold", "0"]), 0)
+
+        rows = {(row["model"], row["operation"]): row for row in report["results"]}
+        self.assertEqual(len(rows), 8)
+
+        load = rows[("rbac", "load_policy")]
+        self.assertEqual(load["runs"], 2)
+        self.assertEqual(load["requests"], {"scan": 4})
+        self.assertGreater(load["consumed_capacity"]["read"], 0)
+
+        save = rows[("rbac_domains", "save_policy")]
+        self.assertEqual(save["requests"], {"batch_write_item": 16})
+        self.assertEqual(save["consumed_capacity"]["write"], 400)
+
+        remove = rows[("rbac", "remove_filtered_policy")]
+        self.assertEqual(remove["requests"], {"query": 5, "batch_write_item": 5})
@@ -0,0 +1,217 @@
+import unittest
+from unittest.mock import patch
+
+import casbin
+
+from python_dycasbin import adapter, bucketed
+from python_dycasbin.adapter import Filter
+from python_dycasbin.fake_dynamodb import FakeDynamoDB
+from tests.unit.helpers import fake_adapter
+
+table_name = "casbin_rule_packed"
+
+
+class TestBucketedAdapter(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeDynamoDB()
+        self.adapter = fake_adapter(bucketed.BucketedAdapter, table_name, self.client)
+        self.e = casbin.Enforcer("tests/e2e/rbac_model.conf", self.adapter)
+
+    def items(self):
+        return list(self.client.tables[table_name].items.values())
+
+    def test_rules_share_bucket_item(self):
+        self.e.add_policies(
+            [
+                ["alice", "data1", "read"],
+                ["alice", "data2", "write"],
+                ["bob", "data1", "read"],
+            ]
+        )
+        self.e.add_grouping_policy("alice", "admin")
+
+        self.assertEqual(len(self.items()), 3)
+
+        self.e.load_policy()
+        self.assertCountEqual(
+            self.e.get_policy(),
+            [
+                ["alice", "data1", "read"],
+                ["alice", "data2", "write"],
+                ["bob", "data1", "read"],
+            ],
+        )
+        self.assertEqual(self.e.get_grouping_policy(), [["alice", "admin"]])
+
+        self.e.remove_policy("alice", "data1", "read")
+        self.e.update_policy(["bob", "data1", "read"], ["bob", "data1", "write"])
+        self.e.load_policy()
+        self.assertCountEqual(
+            self.e.get_policy(),
+            [["alice", "data2", "write"], ["bob", "data1", "write"]],
+        )
+
+        self.e.remove_policy("bob", "data1", "write")
+        self.assertEqual(len(self.items()), 2)
+
+    def test_bucket_splits_into_chunks(self):
+        self.adapter.BUCKET_CHUNK_BYTES = 100
+        rules = [["alice", "data{}".format(i), "read"] for i in range(20)]
+        self.adapter.add_policies("p", "p", rules)
+
+        self.assertGreater(len(self.items()), 1)
+        self.assertEqual(len({item["stamp"]["S"] for item in self.items()}), 1)
+
+        self.adapter.remove_policies("p", "p", rules[5:])
+        self.assertEqual(len(self.items()), 1)
+
+        self.e.load_policy()
+        self.assertCountEqual(self.e.get_policy(), rules[:5])
+
+    def test_filtered_load_and_remove(self):
+        self.e.add_policies(
+            [
+                ["alice", "data1", "read"],
+                ["alice", "data2", "write"],
+                ["bob", "data1", "read"],
+            ]
+        )
+
+        self.e.load_filtered_policy(Filter(ptype=["p"], v0=["alice"], v2=["read"]))
+        self.assertEqual(self.e.get_policy(), [["alice", "data1", "read"]])
+        self.assertTrue(self.adapter.is_filtered())
+
+        self.e.remove_filtered_policy(1, "data1")
+        self.e.load_policy()
+        self.assertEqual(self.e.get_policy(), [["alice", "data2", "write"]])
+
+    def test_save_policy_drops_stale_buckets(self):
+        self.e.add_policies([["alice", "data1", "read"], ["bob", "data1", "read"]])
+        self.e.load_policy()
+        self.e.get_model().remove_policy("p", "p", ["bob", "data1", "read"])
+        self.e.save_policy()
+
+        self.assertEqual(len(self.items()), 1)
+        self.e.load_policy()
+        self.assertEqual(self.e.get_policy(), [["alice", "data1", "read"]])
+
+    def test_conflicting_writer_is_retried(self):
+        self.adapter.add_policy("p", "p", ["alice", "data1", "read"])
+        read_bucket = self.adapter._read_bucket
+        raced = []
+
+        def racing_read(bucket_id):
+            items = read_bucket(bucket_id)
+
+            if not raced:
+                raced.append(True)
+                # another writer changes the bucket after this one read it
+                other = fake_adapter(bucketed.BucketedAdapter, table_name, self.client)
+                other.add_policy("p", "p", ["alice", "data2", "read"])
+
+            return items
+
+        with patch.object(self.adapter, "_read_bucket", racing_read):
+            self.adapter.add_policy("p", "p", ["alice", "data3", "read"])
+
+        self.e.load_policy()
+        self.assertCountEqual(
+            self.e.get_policy(),
+            [
+                ["alice", "data1", "read"],
+                ["alice", "data2", "read"],
+                ["alice", "data3", "read"],
+            ],
+        )
+
+    def test_pack_and_unpack_table(self):
+        rows = fake_adapter(adapter.Adapter, "casbin_rule", self.client)
+        rows.add_policies(
+            "p", "p", [["alice", "data1", "read"], ["bob", "data2", "write"]]
+        )
+        rows.add_policy("g", "g", ["alice", "admin"])
+
+        self.assertEqual(bucketed.pack_table(rows, self.adapter), 3)
+        self.e.load_policy()
+        self.assertCountEqual(
+            self.e.get_policy(), [["alice", "data1", "read"], ["bob", "data2", "write"]]
+        )
+
+        copy = fake_adapter(adapter.Adapter, "casbin_rule_copy", self.client)
+        self.assertEqual(bucketed.unpack_table(self.adapter, copy), 3)
+        self.assertEqual(
+            {
+                item["id"]["S"]
+                for item in self.client.tables["casbin_rule_copy"].items.values()
+            },
+            {
+                item["id"]["S"]
+                for item in self.client.tables["casbin_rule"].items.values()
+            },
+        )
+
+    def test_version_marker_is_not_a_bucket(self):
+        self.adapter.table_version_marker = True
+        self.e.add_policy("alice", "data1", "read")
+        version = self.adapter._table_version()
+
+        self.assertIsNotNone(version)
+        self.e.load_policy()
+        self.assertEqual(self.e.get_policy(), [["alice", "data1", "read"]])
+
+        self.e.save_policy()
+        self.assertNotEqual(self.adapter._table_version(), version)
+        self.e.load_policy()
+        self.assertEqual(self.e.get_policy(), [["alice", "data1", "read"]])
+
+    def test_save_policy_keeps_version_marker_of_other_adapters(self):
+        self.adapter.table_version_marker = True
+        self.e.add_policy("alice", "data1", "read")
+        version = self.adapter._table_version()
+
+        other = fake_adapter(bucketed.BucketedAdapter, table_name, self.client)
+        e = casbin.Enforcer("tests/e2e/rbac_model.conf", other)
+        e.save_policy()
+
+        self.assertEqual(self.adapter._table_version(), version)
+
+    def test_empty_rule(self):
+        self.assertEqual(self.adapter.has_rules([("p", [])]), [False])
+
+        with self.assertRaises(ValueError):
+            self.adapter.add_policy("p", "p", [])
+
+    def test_iter_policies_and_has_rules(self):
+        self.e.add_policies([["alice", "data1", "read"], ["bob", "data2", "write"]])
+        self.e.add_grouping_policy("alice", "admin")
+
+        self.assertCountEqual(
+            list(self.adapter.iter_policies(page_size=1)),
+            [
+                ("p", ["alice", "data1", "read"]),
+                ("p", ["bob", "data2", "write"]),
+                ("g", ["alice", "admin"]),
+            ],
+        )
+        self.assertEqual(
+            list(self.adapter.iter_policies("p", Filter(v1=["data2"]))),
+            [("p", ["bob", "data2", "write"])],
+        )
+        self.assertEqual(
+            self.adapter.has_rules(
+                [
+                    ("p", ["alice", "data1", "read"]),
+                    ("p", ["alice", "data2", "read"]),
+                    ("g", ["alice", "admin"]),
+                ]
+            ),
+            [True, False, True],
+        )
+        self.assertFalse(self.adapter.has_rule("p", ["carol", "data1", "read"]))
+
+    def test_per_rule_methods_are_not_inherited(self):
+        for name in ("get_filtered_item", "load_domain_policy", "save_domain_policy"):
+            self.assertFalse(hasattr(self.adapter, name), name)
+
+        with self.assertRaises(ValueError):
+            bucketed.BucketedAdapter(table_domain_fields={"p": 1})
@@ -0,0 +1,105 @@
+import time
+import unittest
+from unittest.mock import patch
+
+import casbin
+
+from python_dycasbin import adapter, buffer
+from python_dycasbin.fake_dynamodb import FakeDynamoDB
+from tests.unit.helpers import fake_adapter
+
+table_name = "casbin_rule"
+
+
+class TestWriteBehindAdapter(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeDynamoDB()
+        self.adapter = fake_adapter(adapter.Adapter, table_name, self.client)
+
+    def buffered(self, **kwargs):
+        test_adapter = buffer.WriteBehindAdapter(self.adapter, **kwargs)
+        self.addCleanup(test_adapter.close)
+        return test_adapter
+
+    def stored_rules(self):
+        return sorted(
+            self.adapter.get_rule_from_item(item)
+            for item in self.client.tables[table_name].items.values()
+        )
+
+    def test_queued_writes_are_coalesced(self):
+        test_adapter = self.buffered(start=False)
+        e = casbin.Enforcer("tests/e2e/rbac_model.conf", test_adapter)
+
+        e.add_policy("alice", "data1", "read")
+        e.add_policy("bob", "data1", "read")
+        e.remove_policy("bob", "data1", "read")
+        e.add_policies([["carol", "data2", "write"], ["dave", "data2", "write"]])
+
+        self.assertEqual(test_adapter.pending(), 3)
+        self.assertEqual(self.stored_rules(), [])
+
+        with patch.object(
+            self.adapter, "_write_batch", wraps=self.adapter._write_batch
+        ) as write_batch:
+            self.assertEqual(test_adapter.flush(), 3)
+
+        write_batch.assert_called_once()
+        self.assertEqual(
+            self.stored_rules(),
+            [
+                ["alice", "data1", "read"],
+                ["carol", "data2", "write"],
+                ["dave", "data2", "write"],
+            ],
+        )
+
+        e.remove_policy("alice", "data1", "read")
+        e.load_policy()
+        self.assertEqual(test_adapter.pending(), 0)
+        self.assertCountEqual(
+            e.get_policy(), [["carol", "data2", "write"], ["dave", "data2", "write"]]
+        )
+
+    def test_remove_add_remove_keeps_the_remove(self):
+        self.adapter.add_policy("p", "p", ["alice", "data1", "read"])
+        test_adapter = self.buffered(start=False)
+
+        test_adapter.remove_policy("p", "p", ["alice", "data1", "read"])
+        test_adapter.add_policy("p", "p", ["alice", "data1", "read"])
+        test_adapter.remove_policy("p", "p", ["alice", "data1", "read"])
+
+        self.assertEqual(test_adapter.pending(), 1)
+        test_adapter.flush()
+        self.assertEqual(self.stored_rules(), [])
+
+        test_adapter.add_policy("p", "p", ["bob", "data1", "read"])
+        test_adapter.remove_policy("p", "p", ["bob", "data1", "read"])
+        self.assertEqual(test_adapter.pending(), 0)
+
+    def test_background_flush_on_size(self):
+        test_adapter = self.buffered(flush_max_items=2, flush_interval=60)
+
+        test_adapter.add_policy("p", "p", ["alice", "data1", "read"])
+        test_adapter.add_policy("p", "p", ["bob", "data1", "read"])
+
+        deadline = time.monotonic() + 5
+
+        while test_adapter.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(len(self.stored_rules()), 2)
+
+    def test_failed_flush_is_queued_again(self):
+        test_adapter = self.buffered(start=False)
+        test_adapter.add_policy("p", "p", ["alice", "data1", "read"])
+
+        with patch.object(self.adapter, "_write_batch", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                test_adapter.flush()
+
+        test_adapter.add_policy("p", "p", ["bob", "data1", "read"])
+        self.assertEqual(test_adapter.pending(), 2)
+
+        test_adapter.close()
+        self.assertEqual(len(self.stored_rules()), 2)
@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import patch
+
+import casbin
+
+from python_dycasbin import adapter
+from python_dycasbin.fake_dynamodb import FakeDynamoDB
+from tests.unit.helpers import fake_adapter
+
+table_name = "casbin_rule"
+model_path = "tests/e2e/rbac_with_domains_model.conf"
+
+
+class TestDomainLayout(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeDynamoDB()
+        self.adapter = fake_adapter(
+            adapter.Adapter,
+            table_name,
+            self.client,
+            table_domain_fields={"p": 1, "g": 2},
+        )
+        self.e = casbin.Enforcer(model_path, self.adapter)
+        self.e.add_policies(
+            [
+                ["admin", "d1", "data1", "read"],
+                ["admin", "d2", "data2", "read"],
+                ["admin", "d3", "data3", "read"],
+            ]
+        )
+        self.e.add_grouping_policies(
+            [["alice", "admin", "d1"], ["bob", "admin", "d2"], ["carol", "admin", "d3"]]
+        )
+
+    def stored_domains(self):
+        return sorted(
+            (item["ptype"]["S"], item["dom"]["S"])
+            for item in self.client.tables[table_name].items.values()
+        )
+
+    def test_table_has_domain_index(self):
+        indexes = self.client.tables[table_name].indexes
+        self.assertEqual(indexes["domain-index"], ["dom", "ptype"])
+
+        item = self.adapter.convert_to_item("g", ["alice", "admin", "d1"])
+        self.assertEqual(item["dom"], {"S": "d1"})
+        self.assertEqual(
+            item["id"]["S"], self.adapter.get_id("g", ["alice", "admin", "d1"])
+        )
+
+    def test_load_domain_policy_queries_only_those_domains(self):
+        model = casbin.Enforcer.new_model(model_path)
+
+        with patch.object(self.client, "scan", wraps=self.client.scan) as scan:
+            self.adapter.load_domain_policy(model, ["d1", "d2"])
+
+        scan.assert_not_called()
+        self.assertTrue(self.adapter.is_filtered())
+        self.assertCountEqual(
+            model.model["p"]["p"].policy,
+            [["admin", "d1", "data1", "read"], ["admin", "d2", "data2", "read"]],
+        )
+        self.assertCountEqual(
+            model.model["g"]["g"].policy,
+            [["alice", "admin", "d1"], ["bob", "admin", "d2"]],
+        )
+
+    def test_save_domain_policy_leaves_other_domains(self):
+        model = casbin.Enforcer.new_model(model_path)
+        self.adapter.load_domain_policy(model, ["d1"])
+        model.remove_policy("g", "g", ["alice", "admin", "d1"])
+        model.add_policy("p", "p", ["admin", "d1", "data1", "write"])
+
+        self.adapter.save_domain_policy(model, ["d1"])
+
+        self.e.load_policy()
+        self.assertCountEqual(
+            self.e.get_policy(),
+            [
+                ["admin", "d1", "data1", "read"],
+                ["admin", "d1", "data1", "write"],
+                ["admin", "d2", "data2", "read"],
+                ["admin", "d3", "data3", "read"],
+            ],
+        )
+        self.assertCountEqual(
+            self.e.get_grouping_policy(),
+            [["bob", "admin", "d2"], ["carol", "admin", "d3"]],
+        )
+
+    def test_remove_by_domain(self):
+        with patch.object(self.client, "scan", wraps=self.client.scan) as scan:
+            self.adapter.remove_domain_policy(["d1"])
+            self.e.remove_filtered_policy(1, "d2")
+
+        scan.assert_not_called()
+        self.assertEqual(self.stored_domains(), [("g", "d2"), ("g", "d3"), ("p", "d3")])
@@ -0,0 +1,87 @@
+import json
+import unittest
+
+import boto3
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError
+
+from python_dycasbin import fast_decode
+from tests.unit.helpers import adapter_item
+
+
+class RawBody:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+def replaying_client(status, body):
+    client = boto3.client(
+        "dynamodb",
+        region_name="us-east-1",
+        aws_access_key_id="anything",
+        aws_secret_access_key="anything",
+    )
+    client.meta.events.register(
+        "before-send.dynamodb.*",
+        lambda request, **kwargs: AWSResponse(
+            request.url, status, {}, RawBody(json.dumps(body).encode("utf-8"))
+        ),
+    )
+    return client
+
+
+class TestFastDecode(unittest.TestCase):
+    def scan(self, body, status=200):
+        plain = replaying_client(status, body).scan(TableName="casbin_rule")
+        fast = fast_decode.install(replaying_client(status, body)).scan(
+            TableName="casbin_rule"
+        )
+        plain.pop("ResponseMetadata")
+        fast.pop("ResponseMetadata")
+        return plain, fast
+
+    def test_same_result_as_botocore(self):
+        plain, fast = self.scan(
+            {
+                "Items": [
+                    adapter_item("p", "alice", "data1", "read, write"),
+                    {"id": {"S": "marker"}, "version": {"N": "3"}},
+                ],
+                "Count": 2,
+                "ScannedCount": 5,
+                "LastEvaluatedKey": {"id": {"S": "marker"}},
+                "ConsumedCapacity": {"TableName": "casbin_rule", "CapacityUnits": 0.5},
+            }
+        )
+
+        self.assertEqual(fast, plain)
+        self.assertEqual(fast["Items"][0]["v2"], {"S": "read, write"})
+
+    def test_binary_items_use_botocore(self):
+        plain, fast = self.scan(
+            {
+                "Items": [
+                    {"bucket_id": {"S": "a"}, "packed_rules": {"B": "eJwDAAAAAAE="}}
+                ]
+            }
+        )
+
+        self.assertEqual(fast, plain)
+        self.assertIsInstance(fast["Items"][0]["packed_rules"]["B"], bytes)
+
+    def test_errors_use_botocore(self):
+        with self.assertRaises(ClientError) as raised:
+            self.scan(
+                {
+                    "__type": "com.amazonaws.dynamodb.v20120810#ResourceNotFoundException",
+                    "message": "missing",
+                },
+                status=400,
+            )
+
+        self.assertEqual(
+            raised.exception.response["Error"]["Code"], "ResourceNotFoundException"
+        )
@@ -0,0 +1,130 @@
+import unittest
+from unittest.mock import patch
+
+import casbin
+
+from python_dycasbin import adapter, lazy
+from python_dycasbin.fake_dynamodb import FakeDynamoDB
+from tests.unit.helpers import fake_adapter
+
+table_name = "casbin_rule"
+
+
+class TestLazyPolicyLoader(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeDynamoDB()
+        self.adapter = fake_adapter(adapter.Adapter, table_name, self.client)
+        self.adapter.add_policies(
+            "p",
+            "p",
+            [
+                ["admin", "data1", "read"],
+                ["root", "data2", "write"],
+                ["bob", "data3", "read"],
+                ["carol", "data4", "read"],
+            ],
+        )
+        self.adapter.add_policies(
+            "g", "g", [["alice", "admin"], ["admin", "root"], ["bob", "admin"]]
+        )
+        self.e = casbin.Enforcer("tests/e2e/rbac_model.conf")
+
+    def test_loads_subject_and_reachable_roles(self):
+        loader = lazy.LazyPolicyLoader(self.e, self.adapter)
+
+        self.assertTrue(loader.enforce("alice", "data2", "write"))
+        self.assertFalse(loader.enforce("alice", "data3", "read"))
+        self.assertCountEqual(
+            self.e.get_policy(),
+            [["admin", "data1", "read"], ["root", "data2", "write"]],
+        )
+        self.assertEqual(
+            loader.get_stats(),
+            {
+                "hits": 1,
+                "misses": 1,
+                "evictions": 0,
+                "expirations": 0,
+                "subjects": 1,
+                "nodes": 3,
+                "rules": 4,
+            },
+        )
+
+    def test_evicts_least_recently_used_subject(self):
+        loader = lazy.LazyPolicyLoader(self.e, self.adapter, max_subjects=2)
+
+        loader.ensure("alice")
+        loader.ensure("bob")
+        loader.ensure("alice")
+        loader.ensure("carol")
+
+        # bob was unloaded, the roles alice still uses stay
+        self.assertFalse(self.e.enforce("bob", "data3", "read"))
+        self.assertTrue(self.e.enforce("alice", "data1", "read"))
+        self.assertTrue(self.e.enforce("carol", "data4", "read"))
+        self.assertEqual(loader.get_stats()["evictions"], 1)
+
+        for assertion in (self.e.model.model["p"]["p"], self.e.model.model["g"]["g"]):
+            self.assertEqual(
+                assertion.policy_map,
+                {",".join(rule): i for i, rule in enumerate(assertion.policy)},
+            )
+
+        loader.clear()
+        self.assertEqual(self.e.get_policy(), [])
+        self.assertEqual(self.e.get_grouping_policy(), [])
+        self.assertFalse(self.e.enforce("alice", "data1", "read"))
+
+    def test_ttl_reads_subject_again(self):
+        loader = lazy.LazyPolicyLoader(self.e, self.adapter, ttl=60)
+
+        with patch("python_dycasbin.lazy.time.monotonic", return_value=0):
+            loader.ensure("carol")
+
+        self.adapter.add_policy("p", "p", ["carol", "data5", "read"])
+
+        with patch("python_dycasbin.lazy.time.monotonic", return_value=30):
+            self.assertFalse(loader.enforce("carol", "data5", "read"))
+
+        with patch("python_dycasbin.lazy.time.monotonic", return_value=61):
+            self.assertTrue(loader.enforce("carol", "data5", "read"))
+
+        self.assertEqual(loader.get_stats()["expirations"], 1)
+
+    def test_ttl_reads_shared_roles_again(self):
+        loader = lazy.LazyPolicyLoader(self.e, self.adapter, ttl=60)
+
+        with patch("python_dycasbin.lazy.time.monotonic", return_value=0):
+            loader.ensure("alice")
+            loader.ensure("bob")
+
+        # admin is also used by bob, which has not expired
+        self.adapter.add_policy("p", "p", ["admin", "data5", "read"])
+
+        with patch("python_dycasbin.lazy.time.monotonic", return_value=61):
+            self.assertTrue(loader.enforce("alice", "data5", "read"))
+
+        self.assertTrue(self.e.enforce("bob", "data5", "read"))
+        self.assertEqual(self.e.get_policy().count(["admin", "data1", "read"]), 1)
+
+    def test_failed_load_leaves_no_nodes(self):
+        loader = lazy.LazyPolicyLoader(self.e, self.adapter)
+        fetch = loader._fetch
+
+        def failing_fetch(name):
+            if name == "root":
+                raise RuntimeError("read failed")
+
+            return fetch(name)
+
+        with patch.object(loader, "_fetch", failing_fetch):
+            with self.assertRaises(RuntimeError):
+                loader.ensure("alice")
+
+        self.assertEqual(loader.get_stats()["nodes"], 0)
+        self.assertEqual(self.e.get_policy(), [])
+        self.assertEqual(self.e.get_grouping_policy(), [])
+
+        loader.ensure("alice")
+        self.assertTrue(self.e.enforce("alice", "data2", "write"))
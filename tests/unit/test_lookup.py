@@ -0,0 +1,158 @@
+import unittest
+from unittest.mock import patch
+
+import casbin
+
+from python_dycasbin import adapter
+from python_dycasbin.fake_dynamodb import FakeDynamoDB
+from tests.unit.helpers import fake_adapter
+
+table_name = "casbin_rule"
+
+
+class TestPointLookup(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeDynamoDB()
+        self.adapter = fake_adapter(
+            adapter.Adapter, table_name, self.client, scan_max_workers=4
+        )
+        self.e = casbin.Enforcer("tests/e2e/rbac_model.conf", self.adapter)
+        self.e.add_policies([["user{}".format(i), "data1", "read"] for i in range(250)])
+        self.e.add_grouping_policy("alice", "admin")
+
+    def test_has_rules_batches_lookups(self):
+        rules = [("p", ["user{}".format(i), "data1", "read"]) for i in range(240, 260)]
+        rules += [("g", ["alice", "admin"]), ("g", ["bob", "admin"])]
+        rules += [("p", ["user{}".format(i), "data1", "read"]) for i in range(200)]
+
+        with patch.object(
+            self.client, "batch_get_item", wraps=self.client.batch_get_item
+        ) as batch_get_item:
+            found = self.adapter.has_rules(rules)
+
+        self.assertEqual(found[:10], [True] * 10)
+        self.assertEqual(found[10:20], [False] * 10)
+        self.assertEqual(found[20:22], [True, False])
+        self.assertEqual(found[22:], [True] * 200)
+        self.assertEqual(batch_get_item.call_count, 3)
+
+        for call in batch_get_item.call_args_list:
+            self.assertLessEqual(
+                len(call.kwargs["RequestItems"][table_name]["Keys"]), 100
+            )
+
+    def test_has_rule_uses_get_item(self):
+        with patch.object(
+            self.client, "batch_get_item", wraps=self.client.batch_get_item
+        ) as batch_get_item:
+            self.assertTrue(self.adapter.has_rule("g", ["alice", "admin"]))
+            self.assertFalse(self.adapter.has_rule("g", ["bob", "admin"]))
+
+        batch_get_item.assert_not_called()
+
+    def test_lookup_cache(self):
+        cached = fake_adapter(
+            adapter.Adapter, table_name, self.client, lookup_cache_size=100
+        )
+        rules = [("g", ["alice", "admin"]), ("g", ["bob", "admin"])]
+        self.assertEqual(cached.has_rules(rules), [True, False])
+
+        with (
+            patch.object(self.client, "get_item") as get_item,
+            patch.object(self.client, "batch_get_item") as batch_get_item,
+        ):
+            self.assertEqual(cached.has_rules(rules), [True, False])
+            self.assertFalse(cached.has_rule("g", ["bob", "admin"]))
+
+        get_item.assert_not_called()
+        batch_get_item.assert_not_called()
+
+        self.e.add_grouping_policy("bob", "admin")
+        self.assertFalse(cached.has_rule("g", ["bob", "admin"]))
+        cached.clear_lookup_cache()
+        self.assertTrue(cached.has_rule("g", ["bob", "admin"]))
+
+    def test_own_writes_update_lookup_cache(self):
+        cached = fake_adapter(
+            adapter.Adapter, table_name, self.client, lookup_cache_size=100
+        )
+        e = casbin.Enforcer("tests/e2e/rbac_model.conf", cached)
+        alice, bob, carol = (
+            ("p", ["alice", "data1", "read"]),
+            ("p", ["bob", "data2", "write"]),
+            ("p", ["carol", "data3", "read"]),
+        )
+        self.assertEqual(cached.has_rules([alice, bob, carol]), [False] * 3)
+
+        e.add_policy(*alice[1])
+        e.add_policies([bob[1], carol[1]])
+        e.update_policy(carol[1], ["carol", "data3", "write"])
+        e.remove_filtered_policy(0, "bob")
+
+        with (
+            patch.object(self.client, "get_item") as get_item,
+            patch.object(self.client, "batch_get_item") as batch_get_item,
+        ):
+            self.assertEqual(
+                cached.has_rules(
+                    [alice, bob, carol, ("p", ["carol", "data3", "write"])]
+                ),
+                [True, False, False, True],
+            )
+            e.remove_policy(*alice[1])
+            self.assertFalse(cached.has_rule(*alice))
+
+        get_item.assert_not_called()
+        batch_get_item.assert_not_called()
+
+        with patch.object(self.client, "put_item", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                cached.add_policy("p", "p", alice[1])
+
+        # the failed write evicted the cached answer, so the rule is looked up again
+        with patch.object(
+            self.client, "get_item", wraps=self.client.get_item
+        ) as get_item:
+            self.assertFalse(cached.has_rule(*alice))
+
+        get_item.assert_called_once()
+
+    def test_unprocessed_keys_are_retried(self):
+        self.adapter.write_backoff_base = 0
+        batch_get_item = self.client.batch_get_item
+        calls = []
+
+        def flaky_batch_get_item(**kwargs):
+            calls.append(kwargs)
+
+            if len(calls) > 1:
+                return batch_get_item(**kwargs)
+
+            keys = kwargs["RequestItems"][table_name]["Keys"]
+            request = dict(kwargs["RequestItems"][table_name], Keys=keys[:1])
+            response = batch_get_item(RequestItems={table_name: request})
+            response["UnprocessedKeys"] = {
+                table_name: dict(request, Keys=keys[1:]),
+            }
+            return response
+
+        rules = [("p", ["user{}".format(i), "data1", "read"]) for i in range(3)]
+
+        with patch.object(self.client, "batch_get_item", flaky_batch_get_item):
+            self.assertEqual(self.adapter.has_rules(rules), [True] * 3)
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(calls[1]["RequestItems"][table_name]["Keys"]), 2)
+
+        self.adapter.write_max_attempts = 1
+        calls.clear()
+
+        with patch.object(self.client, "batch_get_item", flaky_batch_get_item):
+            with self.assertRaises(adapter.UnprocessedKeysError) as raised:
+                self.adapter.has_rules(rules)
+
+        self.assertIn("2 unprocessed keys", str(raised.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+
+import casbin
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+
+from python_dycasbin import adapter, metrics
+from tests.unit.helpers import adapter_item
+
+table_name = "casbin_rule"
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = metrics.InMemoryMetrics()
+        self.adapter = adapter.Adapter(
+            table_name=table_name,
+            table_create_table=False,
+            aws_region_name="us-east-1",
+            aws_access_key_id="anything",
+            aws_secret_access_key="anything",
+            metrics_hook=self.metrics,
+        )
+        self.stubber = Stubber(self.adapter._get_db_handler())
+        self.stubber.activate()
+
+    def tearDown(self):
+        self.stubber.deactivate()
+
+    def calls(self):
+        return {
+            (stats["caller"], stats["operation"]): stats
+            for stats in self.metrics.snapshot()["calls"]
+        }
+
+    def test_records_capacity_by_table_and_index(self):
+        self.stubber.add_response(
+            "query",
+            {
+                "Items": [adapter_item("p", "alice", "data1", "read")],
+                "Count": 1,
+                "ScannedCount": 2,
+                "ConsumedCapacity": {
+                    "TableName": table_name,
+                    "CapacityUnits": 1.5,
+                    "Table": {"CapacityUnits": 0.0},
+                    "GlobalSecondaryIndexes": {"v0-v1-index": {"CapacityUnits": 1.5}},
+                },
+            },
+            {
+                "TableName": table_name,
+                "IndexName": "v0-v1-index",
+                "KeyConditionExpression": "v0 = :v0",
+                "FilterExpression": "ptype = :ptype",
+                "ExpressionAttributeValues": {
+                    ":ptype": {"S": "p"},
+                    ":v0": {"S": "alice"},
+                },
+                "ReturnConsumedCapacity": "INDEXES",
+            },
+        )
+        self.stubber.add_response(
+            "batch_write_item",
+            {
+                "UnprocessedItems": {},
+                "ConsumedCapacity": [{"TableName": table_name, "CapacityUnits": 3.0}],
+            },
+        )
+
+        self.assertTrue(self.adapter.remove_filtered_policy("p", "p", 0, "alice"))
+
+        calls = self.calls()
+        query = calls[("remove_filtered_policy", "Query")]
+        self.assertEqual(query["calls"], 1)
+        self.assertEqual(query["items"], 1)
+        self.assertEqual(query["scanned_items"], 2)
+        self.assertEqual(query["errors"], 0)
+        self.assertEqual(
+            calls[("remove_filtered_policy", "BatchWriteItem")]["items"], 1
+        )
+
+        snapshot = self.metrics.snapshot()
+        capacity = {
+            (entry["index"], entry["kind"]): entry["units"]
+            for entry in snapshot["capacity"]
+        }
+        self.assertEqual(
+            capacity,
+            {(None, "read"): 0.0, ("v0-v1-index", "read"): 1.5, (None, "write"): 3.0},
+        )
+        self.assertIn(
+            {"caller": "remove_filtered_policy", "kind": "write", "units": 3.0},
+            snapshot["callers"],
+        )
+
+    def test_caller_survives_parallel_scan(self):
+        self.adapter.scan_segments = 2
+        self.adapter.scan_max_workers = 2
+
+        for _ in range(2):
+            self.stubber.add_response("scan", {"Items": [], "Count": 0})
+
+        e = casbin.Enforcer("tests/e2e/rbac_model.conf")
+        self.adapter.load_policy(e.get_model())
+
+        self.assertEqual(self.calls()[("load_policy", "Scan")]["calls"], 2)
+
+    def test_records_errors(self):
+        self.stubber.add_client_error(
+            "put_item", service_error_code="ProvisionedThroughputExceededException"
+        )
+
+        with self.assertRaises(ClientError):
+            self.adapter.add_policy("p", "p", ["alice", "data1", "read"])
+
+        stats = self.calls()[("add_policy", "PutItem")]
+        self.assertEqual(stats["calls"], 1)
+        self.assertEqual(stats["errors"], 1)
+
+    def test_prometheus_exporter(self):
+        self.stubber.add_response("put_item", {})
+        self.adapter.add_policy("p", "p", ["alice", "data1", "read"])
+
+        text = metrics.PrometheusExporter(self.metrics).render()
+
+        self.assertIn(
+            'dycasbin_calls_total{caller="add_policy",operation="PutItem"} 1', text
+        )
+        self.assertIn(
+            'dycasbin_request_duration_seconds_count{caller="add_policy",operation="PutItem"} 1',
+            text,
+        )
+        self.assertIn("# TYPE dycasbin_request_duration_seconds histogram", text)
@@ -0,0 +1,84 @@
+import unittest
+from unittest.mock import patch
+
+from python_dycasbin import adapter, migrate
+from tests.unit.helpers import adapter_item
+
+table_name = "casbin_rule"
+
+
+class TestMigrate(unittest.TestCase):
+    @patch("boto3.client")
+    def test_migrate_ids(self, mock_client):
+        test_adapter = adapter.Adapter(
+            table_name=table_name, table_create_table=False, table_id_scheme="blake2b"
+        )
+        legacy = adapter.Adapter(table_name=table_name, table_create_table=False)
+        old_item = legacy.convert_to_item("p", ["alice", "data1", "read"])
+        migrated_item = test_adapter.convert_to_item("g", ["alice", "admin"])
+        mock_client.return_value.scan.return_value = {
+            "Items": [
+                old_item,
+                migrated_item,
+                {"id": {"S": "__dycasbin_version__"}, "version": {"S": "1"}},
+            ]
+        }
+        mock_client.return_value.batch_write_item.return_value = {}
+
+        counts = migrate.migrate_ids(test_adapter)
+
+        self.assertEqual(counts, {"scanned": 3, "migrated": 1})
+        calls = mock_client.return_value.batch_write_item.call_args_list
+        self.assertEqual(
+            [c.kwargs["RequestItems"][table_name] for c in calls],
+            [
+                [
+                    {
+                        "PutRequest": {
+                            "Item": test_adapter.convert_to_item(
+                                "p", ["alice", "data1", "read"]
+                            )
+                        }
+                    }
+                ],
+                [{"DeleteRequest": {"Key": {"id": old_item["id"]}}}],
+            ],
+        )
+
+    @patch("boto3.client")
+    def test_migrate_ids_is_idempotent(self, mock_client):
+        test_adapter = adapter.Adapter(
+            table_name=table_name, table_create_table=False, table_id_scheme="blake2b"
+        )
+        item = adapter_item("p", "alice", "data1", "read")
+        item["id"] = {"S": test_adapter.get_id("p", ["alice", "data1", "read"])}
+        mock_client.return_value.scan.return_value = {"Items": [item]}
+
+        self.assertEqual(
+            migrate.migrate_ids(test_adapter), {"scanned": 1, "migrated": 0}
+        )
+        mock_client.return_value.batch_write_item.assert_not_called()
+
+    @patch("boto3.client")
+    def test_migrate_ids_backfills_domain(self, mock_client):
+        test_adapter = adapter.Adapter(
+            table_name=table_name,
+            table_create_table=False,
+            table_id_scheme="blake2b",
+            table_domain_fields={"p": 1},
+        )
+        item = adapter_item("p", "alice", "tenant1", "data1", "read")
+        item["id"] = {
+            "S": test_adapter.get_id("p", ["alice", "tenant1", "data1", "read"])
+        }
+        mock_client.return_value.scan.return_value = {"Items": [item]}
+        mock_client.return_value.batch_write_item.return_value = {}
+
+        self.assertEqual(
+            migrate.migrate_ids(test_adapter), {"scanned": 1, "migrated": 1}
+        )
+        mock_client.return_value.batch_write_item.assert_called_once_with(
+            RequestItems={
+                table_name: [{"PutRequest": {"Item": dict(item, dom={"S": "tenant1"})}}]
+            }
+        )
@@ -0,0 +1,122 @@
+import unittest
+from unittest.mock import patch
+
+from botocore.stub import Stubber
+
+from python_dycasbin import adapter, rate_limit
+
+table_name = "casbin_rule"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.bucket = rate_limit.TokenBucket(10, clock=self.clock)
+
+    def test_reserve_waits_for_missing_tokens(self):
+        self.assertEqual(self.bucket.reserve(10), 0.0)
+        self.assertAlmostEqual(self.bucket.reserve(5), 0.5)
+
+        self.clock.now = 2.0
+        self.assertAlmostEqual(self.bucket.reserve(10), 0.0)
+        self.bucket.adjust(-4)
+        self.assertEqual(self.bucket.reserve(4), 0.0)
+        self.assertEqual(self.bucket.get_stats()["waits"], 1)
+
+    def test_rate_adapts(self):
+        self.bucket.throttled()
+        self.bucket.throttled()
+        self.assertEqual(self.bucket.rate, 5)
+        self.assertEqual(self.bucket.get_stats()["throttles"], 2)
+
+        self.clock.now = 0.5
+        self.bucket.succeeded()
+        self.assertEqual(self.bucket.rate, 5)
+
+        self.clock.now = 1.5
+        self.bucket.succeeded()
+        self.assertEqual(self.bucket.rate, 6)
+
+        for second in range(2, 20):
+            self.clock.now = second
+            self.bucket.throttled()
+
+        self.assertEqual(self.bucket.rate, 0.5)
+
+
+class TestAdapterRateLimit(unittest.TestCase):
+    def setUp(self):
+        self.adapter = adapter.Adapter(
+            table_name=table_name,
+            table_create_table=False,
+            table_rate_limit=True,
+            table_write_capacity=10,
+            table_gsi_write_capacity=20,
+            aws_region_name="us-east-1",
+            aws_access_key_id="anything",
+            aws_secret_access_key="anything",
+        )
+        self.stubber = Stubber(self.adapter._get_db_handler())
+        self.stubber.activate()
+        self.addCleanup(self.stubber.deactivate)
+        patcher = patch("python_dycasbin.rate_limit.time.sleep")
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+        # sleeps are mocked, so the buckets must not refill while the test runs
+        write = self.adapter.rate_limiter.write
+        write.clock = lambda: write._updated
+
+    def test_writes_are_paced_to_capacity(self):
+        for units in (25.0, 5.0):
+            self.stubber.add_response(
+                "batch_write_item",
+                {
+                    "UnprocessedItems": {},
+                    "ConsumedCapacity": [
+                        {"TableName": table_name, "CapacityUnits": units}
+                    ],
+                },
+            )
+
+        self.adapter.write_max_workers = 1
+        self.adapter.add_policies(
+            "p", "p", [["user{}".format(i), "data1", "read"] for i in range(30)]
+        )
+
+        self.stubber.assert_no_pending_responses()
+        delays = [call.args[0] for call in self.sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertAlmostEqual(delays[0], 1.5, places=2)
+        self.assertAlmostEqual(delays[1], 2.0, places=2)
+        self.assertEqual(self.adapter.rate_limiter.get_stats()["write"]["rate"], 10)
+        self.assertNotIn(
+            "read", self.adapter.rate_limiter.get_stats().keys() - {"read"}
+        )
+
+    def test_unprocessed_items_slow_writes_down(self):
+        unprocessed = {
+            table_name: [{"DeleteRequest": {"Key": {"id": {"S": "a"}}}}],
+        }
+        self.stubber.add_response("batch_write_item", {"UnprocessedItems": unprocessed})
+        self.stubber.add_response("batch_write_item", {"UnprocessedItems": {}})
+        self.adapter.write_backoff_base = 0
+
+        with patch("python_dycasbin.adapter.time.sleep"):
+            self.adapter.remove_policies("p", "p", [["alice", "data1", "read"]])
+
+        self.stubber.assert_no_pending_responses()
+        stats = self.adapter.rate_limiter.get_stats()["write"]
+        self.assertEqual(stats["throttles"], 1)
+        self.assertEqual(stats["rate"], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import casbin
+
+from python_dycasbin import adapter, buffer, migrate, snapshot
+from tests.unit.helpers import adapter_item
+
+table_name = "casbin_rule"
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.snapshot_path = os.path.join(self.tmpdir.name, "policy.snapshot")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        rules = [
+            ("p", ["alice", "data1", "read"]),
+            ("p", ["bob", "data1", "réad, write"]),
+            ("g", ["alice", "admin"]),
+        ]
+        snapshot.write_snapshot(self.snapshot_path, "v1", rules)
+        self.assertEqual(snapshot.read_snapshot(self.snapshot_path), ("v1", rules))
+
+    def test_read_missing_or_corrupt(self):
+        self.assertIsNone(snapshot.read_snapshot(self.snapshot_path))
+        with open(self.snapshot_path, "wb") as f:
+            f.write(b"not a snapshot")
+        self.assertIsNone(snapshot.read_snapshot(self.snapshot_path))
+
+    @patch("boto3.client")
+    def test_load_from_current_snapshot(self, mock_client):
+        mock_client.return_value.get_item.return_value = {
+            "Item": {"id": {"S": adapter.VERSION_ITEM_ID}, "version": {"S": "v1"}}
+        }
+        snapshot.write_snapshot(
+            self.snapshot_path, "v1", [("p", ["alice", "data1", "read"])]
+        )
+        test_adapter = snapshot.SnapshotAdapter(
+            adapter.Adapter(table_name=table_name, table_create_table=False),
+            self.snapshot_path,
+        )
+        e = casbin.Enforcer("tests/e2e/rbac_model.conf", test_adapter)
+
+        mock_client.return_value.scan.assert_not_called()
+        self.assertEqual(e.get_policy(), [["alice", "data1", "read"]])
+
+    @patch("boto3.client")
+    def test_refetch_stale_snapshot(self, mock_client):
+        mock_client.return_value.get_item.return_value = {
+            "Item": {"id": {"S": adapter.VERSION_ITEM_ID}, "version": {"S": "v2"}}
+        }
+        mock_client.return_value.scan.return_value = {
+            "Items": [
+                {"id": {"S": adapter.VERSION_ITEM_ID}, "version": {"S": "v2"}},
+                adapter_item("p", "bob", "data2", "write"),
+            ]
+        }
+        snapshot.write_snapshot(
+            self.snapshot_path, "v1", [("p", ["alice", "data1", "read"])]
+        )
+        test_adapter = snapshot.SnapshotAdapter(
+            adapter.Adapter(table_name=table_name, table_create_table=False),
+            self.snapshot_path,
+        )
+        e = casbin.Enforcer("tests/e2e/rbac_model.conf", test_adapter)
+
+        self.assertEqual(e.get_policy(), [["bob", "data2", "write"]])
+        self.assertEqual(
+            snapshot.read_snapshot(self.snapshot_path),
+            ("v2", [("p", ["bob", "data2", "write"])]),
+        )
+
+    @patch("boto3.client")
+    def test_write_bumps_version(self, mock_client):
+        test_adapter = snapshot.SnapshotAdapter(
+            adapter.Adapter(table_name=table_name, table_create_table=False),
+            self.snapshot_path,
+        )
+        test_adapter.add_policy("p", "p", ["alice", "data1", "read"])
+
+        self.assertEqual(mock_client.return_value.put_item.call_count, 2)
+        marker = mock_client.return_value.put_item.call_args.kwargs["Item"]
+        self.assertEqual(marker["id"], {"S": adapter.VERSION_ITEM_ID})
+
+    @patch("boto3.client")
+    def test_load_after_filtered_load_is_unfiltered(self, mock_client):
+        mock_client.return_value.get_item.return_value = {
+            "Item": {"id": {"S": adapter.VERSION_ITEM_ID}, "version": {"S": "v1"}}
+        }
+        mock_client.return_value.scan.return_value = {"Items": []}
+        mock_client.return_value.batch_write_item.return_value = {}
+        snapshot.write_snapshot(
+            self.snapshot_path, "v1", [("p", ["alice", "data1", "read"])]
+        )
+        test_adapter = snapshot.SnapshotAdapter(
+            adapter.Adapter(table_name=table_name, table_create_table=False),
+            self.snapshot_path,
+        )
+        e = casbin.Enforcer("tests/e2e/rbac_model.conf", test_adapter)
+        e.load_filtered_policy(adapter.Filter(ptype=["p"], v0=["alice"]))
+        self.assertTrue(test_adapter.is_filtered())
+
+        e.load_policy()
+
+        self.assertFalse(test_adapter.is_filtered())
+        e.save_policy()
+
+    @patch("boto3.client")
+    def test_expired_snapshot_is_refetched(self, mock_client):
+        mock_client.return_value.get_item.return_value = {
+            "Item": {"id": {"S": adapter.VERSION_ITEM_ID}, "version": {"S": "v1"}}
+        }
+        mock_client.return_value.scan.return_value = {
+            "Items": [adapter_item("p", "bob", "data2", "write")]
+        }
+        snapshot.write_snapshot(
+            self.snapshot_path, "v1", [("p", ["alice", "data1", "read"])]
+        )
+        os.utime(self.snapshot_path, (0, 0))
+        test_adapter = snapshot.SnapshotAdapter(
+            adapter.Adapter(table_name=table_name, table_create_table=False),
+            self.snapshot_path,
+            snapshot_max_age=3600,
+        )
+        e = casbin.Enforcer("tests/e2e/rbac_model.conf", test_adapter)
+
+        self.assertEqual(e.get_policy(), [["bob", "data2", "write"]])
+
+    @patch("boto3.client")
+    def test_writers_outside_the_wrapper_bump_version(self, mock_client):
+        mock_client.return_value.batch_write_item.return_value = {}
+        mock_client.return_value.scan.return_value = {
+            "Items": [
+                {"id": {"S": adapter.VERSION_ITEM_ID}, "version": {"S": "v1"}},
+                adapter_item("p", "alice", "data1", "read"),
+            ]
+        }
+        test_adapter = adapter.Adapter(
+            table_name=table_name,
+            table_create_table=False,
+            table_id_scheme="blake2b",
+            table_version_marker=True,
+        )
+
+        test_adapter.remove_policies("p", "p", [["alice", "data1", "read"]] * 30)
+        self.assertEqual(mock_client.return_value.put_item.call_count, 1)
+
+        migrate.migrate_ids(test_adapter)
+        self.assertEqual(mock_client.return_value.put_item.call_count, 2)
+
+        write_behind = buffer.WriteBehindAdapter(test_adapter, start=False)
+        write_behind.add_policy("p", "p", ["bob", "data2", "write"])
+        write_behind.flush()
+        self.assertEqual(mock_client.return_value.put_item.call_count, 3)
+        marker = mock_client.return_value.put_item.call_args.kwargs["Item"]
+        self.assertEqual(marker["id"], {"S": adapter.VERSION_ITEM_ID})
+
+
+if __name__ == "__main__":
+    unittest.main()
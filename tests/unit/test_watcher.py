@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import casbin
+
+from python_dycasbin import adapter, watcher
+from tests.unit.helpers import adapter_item
+
+table_name = "casbin_rule"
+
+
+class FakeStreamReader(watcher.StreamReader):
+    def __init__(self):
+        self.records = []
+
+    def get_records(self):
+        records, self.records = self.records, []
+        return records
+
+
+class TestStreamWatcher(unittest.TestCase):
+    @patch("boto3.client")
+    def setUp(self, mock_client):
+        mock_client.return_value.scan.return_value = {"Items": []}
+        test_adapter = adapter.Adapter(table_name=table_name, table_create_table=False)
+        self.e = casbin.Enforcer("tests/e2e/rbac_model.conf", test_adapter)
+        self.reader = FakeStreamReader()
+        self.watcher = watcher.StreamWatcher(self.e, self.reader, start=False)
+        self.e.set_watcher(self.watcher)
+
+    def test_apply_insert_and_remove(self):
+        self.reader.records = [
+            {
+                "eventName": "INSERT",
+                "dynamodb": {"NewImage": adapter_item("p", "admin", "data1", "read")},
+            },
+            {
+                "eventName": "INSERT",
+                "dynamodb": {"NewImage": adapter_item("g", "alice", "admin")},
+            },
+        ]
+        self.assertEqual(self.watcher.poll(), 2)
+        self.assertTrue(self.e.enforce("alice", "data1", "read"))
+
+        self.reader.records = [
+            {
+                "eventName": "REMOVE",
+                "dynamodb": {"OldImage": adapter_item("g", "alice", "admin")},
+            },
+        ]
+        self.watcher.poll()
+        self.assertFalse(self.e.enforce("alice", "data1", "read"))
+        self.assertEqual(self.e.get_policy(), [["admin", "data1", "read"]])
+
+    def test_ignores_duplicates_and_bookkeeping_items(self):
+        record = {
+            "eventName": "INSERT",
+            "dynamodb": {"NewImage": adapter_item("p", "bob", "data2", "write")},
+        }
+        self.reader.records = [
+            record,
+            record,
+            {"eventName": "INSERT", "dynamodb": {"NewImage": {"id": {"S": "x"}}}},
+        ]
+        self.watcher.poll()
+        self.assertEqual(self.e.get_policy(), [["bob", "data2", "write"]])
+
+    def test_resync_on_stream_error(self):
+        calls = []
+        self.reader.get_records = MagicMock(side_effect=RuntimeError("expired"))
+        self.reader.start = MagicMock(side_effect=lambda: calls.append("start"))
+
+        def reload():
+            calls.append("reload")
+            self.watcher._stop.set()
+
+        self.watcher.set_update_callback(reload)
+        self.watcher.interval = 0
+        self.watcher._run()
+        self.assertEqual(calls, ["start", "reload"])
+
+    def test_failed_reload_is_retried(self):
+        self.reader.get_records = MagicMock(side_effect=RuntimeError("expired"))
+        reloads = []
+
+        def reload():
+            reloads.append(len(reloads))
+
+            if len(reloads) == 1:
+                raise RuntimeError("down")
+
+            self.watcher._stop.set()
+
+        self.watcher.set_update_callback(reload)
+        self.watcher.interval = 0
+
+        with self.assertLogs(watcher.logger, "ERROR") as logs:
+            self.watcher._run()
+
+        self.assertEqual(len(reloads), 2)
+        self.assertEqual(len(logs.records), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()